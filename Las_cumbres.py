@@ -1,106 +1,110 @@
 from fastapi import FastAPI, Form
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.requests import Request
 import math
-from fastapi.staticfiles import StaticFiles
 import logging
+import numpy as np
+from functools import partial
 
-logging.basicConfig(level=logging.INFO)
+import etc_cache
+import etc_engine
+import etc_logging
+import etc_metrics
+import etc_serving
+import etc_solver
+import etc_store
+import instrument_profiles
+
+etc_logging.setup_logging()
 
 app = FastAPI()
+app.add_middleware(etc_metrics.MetricsMiddleware)
 templates = Jinja2Templates(directory="templates")
+etc_serving.precompile_templates(templates)
+
+app.mount("/static", etc_serving.CachedStaticFiles(directory="static"), name="static")
+
+# index_2.html tidak punya variabel: dirender sekali menjadi bytes (plus gzip/brotli)
+index_page = etc_serving.StaticPage(lambda: templates.get_template("index_2.html").render())
+index_page.prepare()
+
+# Data teleskop, CCD, zeropoint dan koefisien ekstingsi ada di instruments_las_cumbres.json,
+# dikompilasi menjadi InstrumentProfile per (teleskop, CCD, filter).
+# Hasil kalibrasi (calibration.json) ikut dipakai; ekstingsi di sini dihitung k·(X-1),
+# jadi zeropoint kalibrasi digeser ke airmass 1.
+profiles = instrument_profiles.ProfileRegistry(
+    "instruments_las_cumbres.json", calibration_path="calibration.json", reference_airmass=1.0
+)
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
-
-# Data teleskop dan CCD
-telescopes = {
-    "GSO": {"aperture": 0.254, "pixel_scale": 0.57, "gain": 1.0, "read_noise": 3.0, "dark_current": 0.0},
-    "Celestron C11": {"aperture": 0.28, "pixel_scale": 0.389, "gain": 1.0, "read_noise": 2.0, "dark_current": 0.0},
-}
-
-ccds = {
-    "ZWO ASI 178MM": {"quantum_efficiency": 0.75, "read_noise": 3.0, "pixel_size": 2.4, "dark_current": 0.0},
-    "ZWO ASI 2600 MM Pro": {"quantum_efficiency": 0.91, "read_noise": 1.5, "pixel_size": 3.76, "dark_current": 0.0022},
-    "QHY 174 GPS": {"quantum_efficiency": 0.65, "read_noise": 2.0, "pixel_size": 5.86, "dark_current": 0.0},
-}
-
-# Kombinasi OTA dan CCD dengan zeropoint
-combinations = {
-    ("GSO", "ZWO ASI 178MM"): {"zeropoint": 25.12},
-    ("GSO", "ZWO ASI 2600 MM Pro"): {"zeropoint": 25.45},
-    ("GSO", "QHY 174 GPS"): {"zeropoint": 24.78},
-    ("Celestron C11", "ZWO ASI 178MM"): {"zeropoint": 25.23},
-    ("Celestron C11", "ZWO ASI 2600 MM Pro"): {"zeropoint": 25.56},
-    ("Celestron C11", "QHY 174 GPS"): {"zeropoint": 24.89},
-}
-
-# Koefisien ekstingsi
-k = {"U": 0.25, "B": 0.21, "V": 1.21, "R": 0.21, "I": 0.21, "Clear": 0.21}
+# Cache hasil per (endpoint, profil, input yang dibulatkan); dikosongkan saat profil dimuat ulang
+result_cache = etc_metrics.register(etc_cache.ResultCache("las_cumbres"))
+profiles.add_listener(lambda state: result_cache.clear())
+
+# Perhitungan dan rendering dijalankan di thread pool terbatas (503 jika penuh, 504 jika timeout)
+compute_pool = etc_metrics.register(etc_serving.ComputePool("las_cumbres"))
+
+# Hasil perhitungan masuk store SQLite yang sama dengan main2_24_march (source "las_cumbres/...")
+store = etc_metrics.register(etc_store.Store(name="las_cumbres"))
+
+def record_result(profile, endpoint, **row):
+    store.record(profile, [row], f"las_cumbres/{endpoint}", profiles.calibration_version)
 
 # Fungsi untuk menghitung flux bintang
 def calculate_flux(magnitude, zeropoint):
-    return 10 ** (-0.4 * (magnitude - zeropoint))
-
-# Fungsi untuk menghitung SNR
-def calculate_snr(telescope, ccd, magnitude, exposure_time, fwhm, airmass, filter_name, sky_brightness):
-    telescope_data = telescopes[telescope]
-    ccd_data = ccds[ccd]
-    zeropoint = combinations[(telescope, ccd)]["zeropoint"]
-
-    aperture_area = math.pi * (telescope_data["aperture"] / 2) ** 2
-    pixel_scale = ccd_data["pixel_size"] / 1000  # Konversi dari micrometer ke mm
-    read_noise = ccd_data["read_noise"]
-    dark_current = ccd_data["dark_current"]
-    quantum_efficiency = ccd_data["quantum_efficiency"]
-
-    extinction = k[filter_name]
-    extinction_correction = extinction * (airmass - 1)
+    return 10 ** (-0.4 * (np.asarray(magnitude, dtype=float) - zeropoint))
+
+def _signal_rates(telescope, ccd, magnitude, fwhm, airmass, filter_name, sky_brightness):
+    # Bagian yang sama untuk calculate_snr dan calculate_exposure_time (bisa berupa array)
+    profile = profiles.get(telescope, ccd, filter_name)
+    zeropoint = profile.zeropoint
+    aperture_area = profile.aperture_area
+    pixel_scale = profile.pixel_scale  # arcsec/pixel dari focal length
+    quantum_efficiency = profile.quantum_efficiency
+
+    extinction = profile.extinction_coefficient
+    extinction_correction = extinction * (np.asarray(airmass, dtype=float) - 1)
     flux_star = calculate_flux(magnitude + extinction_correction, zeropoint) * aperture_area * quantum_efficiency
     flux_sky = calculate_flux(sky_brightness, zeropoint) * aperture_area * quantum_efficiency
 
-    aperture_diameter = fwhm
+    aperture_diameter = np.asarray(fwhm, dtype=float)
     aperture_area_arcsec = math.pi * (aperture_diameter / 2) ** 2
     num_pixels = aperture_area_arcsec / (pixel_scale ** 2)
+    return flux_star, flux_sky, num_pixels, profile.read_noise, profile.dark_current
 
-    signal_star = flux_star * exposure_time
-    signal_sky = flux_sky * num_pixels * exposure_time
-    noise_read = num_pixels * (read_noise ** 2)
-    noise_dark = num_pixels * dark_current * exposure_time
-
-    total_noise = math.sqrt(signal_star + signal_sky + noise_read + noise_dark)
-    snr = signal_star / total_noise
-    return snr
+# Fungsi untuk menghitung SNR
+def calculate_snr(telescope, ccd, magnitude, exposure_time, fwhm, airmass, filter_name, sky_brightness):
+    flux_star, flux_sky, num_pixels, read_noise, dark_current = _signal_rates(
+        telescope, ccd, magnitude, fwhm, airmass, filter_name, sky_brightness
+    )
+    return etc_engine.calculate_snr(flux_star, flux_sky, read_noise, dark_current, num_pixels, exposure_time)
 
 # Fungsi untuk menghitung waktu eksposur
 def calculate_exposure_time(telescope, ccd, magnitude, snr_target, fwhm, airmass, filter_name, sky_brightness):
-    telescope_data = telescopes[telescope]
-    ccd_data = ccds[ccd]
-    zeropoint = combinations[(telescope, ccd)]["zeropoint"]
-
-    aperture_area = math.pi * (telescope_data["aperture"] / 2) ** 2
-    pixel_scale = ccd_data["pixel_size"] / 1000  # Konversi dari micrometer ke mm
-    read_noise = ccd_data["read_noise"]
-    dark_current = ccd_data["dark_current"]
-    quantum_efficiency = ccd_data["quantum_efficiency"]
-
-    extinction = k[filter_name]
-    extinction_correction = extinction * (airmass - 1)
-    flux_star = calculate_flux(magnitude + extinction_correction, zeropoint) * aperture_area * quantum_efficiency
-    flux_sky = calculate_flux(sky_brightness, zeropoint) * aperture_area * quantum_efficiency
-
-    aperture_diameter = fwhm
-    aperture_area_arcsec = math.pi * (aperture_diameter / 2) ** 2
-    num_pixels = aperture_area_arcsec / (pixel_scale ** 2)
+    flux_star, flux_sky, num_pixels, read_noise, dark_current = _signal_rates(
+        telescope, ccd, magnitude, fwhm, airmass, filter_name, sky_brightness
+    )
 
     signal_sky = flux_sky * num_pixels
     noise_read = num_pixels * (read_noise ** 2)
     noise_dark = num_pixels * dark_current
 
-    total_noise = math.sqrt(signal_sky + noise_read + noise_dark)
-    exposure_time = (snr_target ** 2 * total_noise ** 2) / (flux_star ** 2)
+    total_noise = np.sqrt(signal_sky + noise_read + noise_dark)
+    exposure_time = (np.asarray(snr_target, dtype=float) ** 2 * total_noise ** 2) / (flux_star ** 2)
     return exposure_time
 
+# Fungsi untuk menghitung limiting magnitude (mode 'm' di ETC LCO)
+def calculate_limiting_magnitude(telescope, ccd, snr_target, exposure_time, fwhm, airmass, filter_name, sky_brightness):
+    # Magnitude 0 di zenith memberi flux_zero; signal lain tidak bergantung magnitude
+    flux_zero, flux_sky, num_pixels, read_noise, dark_current = _signal_rates(
+        telescope, ccd, 0.0, fwhm, airmass, filter_name, sky_brightness
+    )
+    flux_star = etc_engine.calculate_limiting_signal(
+        flux_sky, read_noise, dark_current, num_pixels, exposure_time, snr_target
+    )
+    magnitude = -2.5 * np.log10(flux_star / flux_zero)
+    return magnitude
+
 def calculate_snr_and_exposure(magnitude, zeropoint, sky_brightness, aperture_area, pixel_scale, read_noise, dark_current, snr_target, filter_extinction, airmass):
     # Koreksi magnitudo untuk airmass
     mag_at_airmass = magnitude + (airmass - 1.0) * filter_extinction
@@ -116,32 +120,13 @@ def calculate_snr_and_exposure(magnitude, zeropoint, sky_brightness, aperture_ar
     Nas = math.pi / 4 * aperture_diameter_arcsec ** 2  # Area aperture dalam arcsec²
     Npix = Nas / (pixel_scale ** 2)  # Jumlah piksel dalam aperture
 
-    # Hitung noise dari dark current dan read noise
-    NeDark = Npix * dark_current  # Noise dari dark current
-    NeRon = Npix * (read_noise ** 2)  # Noise dari read noise
-
-    # Iterasi untuk menghitung exposure time
-    t = 1.0  # Waktu eksposur awal dalam detik
-    while True:
-        # Hitung sinyal dari objek dan latar belakang selama waktu eksposur
-        NeObj = Nobj * t
-        NeBkgd = Nbkgd * t
-
-        # Hitung SNR
-        S_Nt = NeObj / math.sqrt(NeObj + NeBkgd + NeDark * t + NeRon)
-
-        # Jika SNR target tercapai, keluar dari loop
-        if S_Nt >= snr_target:
-            break
-
-        # Tambahkan waktu eksposur
-        t += 1
-
-    return S_Nt, t
+    # Exposure time dari solusi tertutup, dibatasi 3600 detik (loop lama tidak punya batas)
+    solution = etc_solver.solve_exposure_time(Nobj, Nbkgd / Npix, read_noise, dark_current, Npix, snr_target)
+    return float(solution["snr"]), float(solution["exposure_time"])
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
-    return templates.TemplateResponse("index_2.html", {"request": request})
+    return index_page.response(request)
 
 @app.post("/calculate_exposure", response_class=HTMLResponse)
 async def calculate_exposure(
@@ -155,8 +140,19 @@ async def calculate_exposure(
     filter_name: str = Form(...),
     sky_brightness: float = Form(...),
 ):
-    exposure_time = calculate_exposure_time(telescope, ccd, magnitude, snr_target, fwhm, airmass, filter_name, sky_brightness)
-    return templates.TemplateResponse("result_2.html", {
+    profile = profiles.get(telescope, ccd, filter_name)
+    inputs = result_cache.quantize(
+        magnitude=magnitude, snr_target=snr_target, fwhm=fwhm, airmass=airmass, sky_brightness=sky_brightness
+    )
+    exposure_time = await compute_pool.run(
+        result_cache.get_or_compute, "exposure", profile, inputs,
+        partial(calculate_exposure_time, telescope, ccd, filter_name=filter_name)
+    )
+    record_result(
+        profile, "calculate_exposure", magnitude=magnitude, sky_brightness=sky_brightness, airmass=airmass,
+        fwhm=fwhm, snr=snr_target, exposure_time=exposure_time,
+    )
+    return await compute_pool.run(templates.TemplateResponse, "result_2.html", {
         "request": request,
         "telescope": telescope,
         "ccd": ccd,
@@ -181,9 +177,20 @@ async def calculate_snr_endpoint(
     filter_name: str = Form(...),
     sky_brightness: float = Form(...),
 ):
-    logging.info(f"Received data: telescope={telescope}, ccd={ccd}, magnitude={magnitude}")
-    snr = calculate_snr(telescope, ccd, magnitude, exposure_time, fwhm, airmass, filter_name, sky_brightness)
-    return templates.TemplateResponse("result_2.html", {
+    logging.info("Received data", extra={"fields": {"telescope": telescope, "ccd": ccd, "magnitude": magnitude}})
+    profile = profiles.get(telescope, ccd, filter_name)
+    inputs = result_cache.quantize(
+        magnitude=magnitude, exposure_time=exposure_time, fwhm=fwhm, airmass=airmass, sky_brightness=sky_brightness
+    )
+    snr = await compute_pool.run(
+        result_cache.get_or_compute, "snr", profile, inputs,
+        partial(calculate_snr, telescope, ccd, filter_name=filter_name)
+    )
+    record_result(
+        profile, "calculate_snr", magnitude=magnitude, sky_brightness=sky_brightness, airmass=airmass,
+        fwhm=fwhm, snr=snr, exposure_time=exposure_time,
+    )
+    return await compute_pool.run(templates.TemplateResponse, "result_2.html", {
         "request": request,
         "telescope": telescope,
         "ccd": ccd,
@@ -207,25 +214,27 @@ async def calculate_snr_and_exposure_endpoint(
     filter: str = Form(...),
     airmass: float = Form(...),
 ):
-    # Ambil data teleskop dan CCD
-    telescope_data = telescopes[telescope]
-    ccd_data = ccds[ccd]
-    combination_data = combinations[(telescope, ccd)]
-
-    # Ambil parameter dari teleskop dan CCD
-    aperture_area = math.pi * (telescope_data["aperture"] / 2) ** 2
-    pixel_scale = ccd_data["pixel_size"] / 1000 / 206.265  # Konversi dari micrometer ke arcseconds
-    read_noise = ccd_data["read_noise"]
-    dark_current = ccd_data["dark_current"]
-    zeropoint = combination_data["zeropoint"]
-    filter_extinction = k[filter]
+    # Ambil parameter dari profil teleskop + CCD + filter
+    profile = profiles.get(telescope, ccd, filter)
+
+    def compute(magnitude, sky_brightness, snr_target, airmass):
+        return calculate_snr_and_exposure(
+            magnitude, profile.zeropoint, sky_brightness, profile.aperture_area, profile.pixel_scale,
+            profile.read_noise, profile.dark_current, snr_target, profile.extinction_coefficient, airmass
+        )
 
     # Hitung SNR dan waktu eksposur
-    snr, exposure_time = calculate_snr_and_exposure(
-        magnitude, zeropoint, sky_brightness, aperture_area, pixel_scale, read_noise, dark_current, snr_target, filter_extinction, airmass
+    inputs = result_cache.quantize(
+        magnitude=magnitude, sky_brightness=sky_brightness, snr_target=snr_target, airmass=airmass
     )
+    snr, exposure_time = await compute_pool.run(result_cache.get_or_compute, "snr_and_exposure", profile, inputs, compute)
 
-    return templates.TemplateResponse("result_2.html", {
+    record_result(
+        profile, "calculate_snr_and_exposure", magnitude=magnitude, sky_brightness=sky_brightness,
+        airmass=airmass, snr=snr, exposure_time=exposure_time,
+    )
+
+    return await compute_pool.run(templates.TemplateResponse, "result_2.html", {
         "request": request,
         "telescope": telescope,
         "ccd": ccd,
@@ -238,6 +247,53 @@ async def calculate_snr_and_exposure_endpoint(
         "exposure_time": exposure_time,
     })
 
+@app.post("/calculate_limiting_magnitude", response_class=HTMLResponse)
+async def calculate_limiting_magnitude_endpoint(
+    request: Request,
+    telescope: str = Form(...),
+    ccd: str = Form(...),
+    snr_target: float = Form(...),
+    exposure_time: float = Form(...),
+    fwhm: float = Form(...),
+    airmass: float = Form(...),
+    filter_name: str = Form(...),
+    sky_brightness: float = Form(...),
+):
+    profile = profiles.get(telescope, ccd, filter_name)
+    inputs = result_cache.quantize(
+        snr_target=snr_target, exposure_time=exposure_time, fwhm=fwhm, airmass=airmass, sky_brightness=sky_brightness
+    )
+    magnitude = await compute_pool.run(
+        result_cache.get_or_compute, "limiting_magnitude", profile, inputs,
+        partial(calculate_limiting_magnitude, telescope, ccd, filter_name=filter_name)
+    )
+    record_result(
+        profile, "calculate_limiting_magnitude", magnitude=magnitude, sky_brightness=sky_brightness,
+        airmass=airmass, fwhm=fwhm, snr=snr_target, exposure_time=exposure_time,
+    )
+    return await compute_pool.run(templates.TemplateResponse, "result_2.html", {
+        "request": request,
+        "telescope": telescope,
+        "ccd": ccd,
+        "magnitude": round(float(magnitude), 2),
+        "exposure_time": exposure_time,
+        "fwhm": fwhm,
+        "airmass": airmass,
+        "filter": filter_name,
+        "sky_brightness": sky_brightness,
+        "snr": snr_target,
+    })
+
+@app.on_event("shutdown")
+def shutdown_pool():
+    compute_pool.shutdown()
+    if not store.flush(etc_store.SHUTDOWN_FLUSH_TIMEOUT):
+        logging.warning("Hasil yang antre belum selesai ditulis ke store saat shutdown")
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(etc_metrics.render_metrics(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run("Las_cumbres:app", host="127.0.0.1", port=8000, reload=True)
\ No newline at end of file
+    # ETC_RELOAD=1 untuk development, ETC_WORKERS=N untuk beberapa worker (lihat README)
+    etc_serving.run("Las_cumbres:app")
\ No newline at end of file
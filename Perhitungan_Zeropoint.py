@@ -1,48 +1,80 @@
-import math
-
-# Data umum
-mag_katalog = 10.72
-flux_pengamatan = 525248  # ADU
-F0 = 3.63e-9  # erg/s/cm²/Hz
-wavelength = 550e-9  # meter
-h = 6.626e-34  # Planck constant (J·s)
-c = 3e8  # Speed of light (m/s)
-
-# Teleskop dan CCD data
-telescopes = {
-    "GSO": {"aperture": 0.254},
-    "Celestron C11": {"aperture": 0.28},
-}
-
-ccds = {
-    "ZWO ASI 178MM": {"gain": 1.5, "quantum_efficiency": 0.75},
-    "ZWO ASI 2600 MM Pro": {"gain": 1.0, "quantum_efficiency": 0.91},
-    "QHY 174 GPS": {"gain": 2.0, "quantum_efficiency": 0.65},
-}
-
-# Hitung fluks katalog
-flux_katalog = F0 * 10 ** (-0.4 * mag_katalog)
-
-# Energi per foton
-energy_per_photon = (h * c / wavelength) * 1e7  # erg
-
-# Perhitungan zeropoint untuk setiap kombinasi
-results = []
-for telescope_name, telescope_data in telescopes.items():
-    aperture_area = math.pi * (telescope_data["aperture"] / 2) ** 2  # m²
-    for ccd_name, ccd_data in ccds.items():
-        gain = ccd_data["gain"]
-        qe = ccd_data["quantum_efficiency"]
-
-        # Fluks pengamatan dalam erg/s/cm²/Hz
-        flux_pengamatan_erg = (flux_pengamatan * gain * energy_per_photon) / (qe * aperture_area)
-
-        # Hitung zeropoint
-        zeropoint = -2.5 * math.log10(flux_pengamatan_erg / flux_katalog)
-
-        # Simpan hasil
-        results.append((telescope_name, ccd_name, zeropoint))
-
-# Tampilkan hasil
-for telescope, ccd, zeropoint in results:
-    print(f"Telescope: {telescope}, CCD: {ccd}, Zeropoint (filter V): {zeropoint:.2f}")
\ No newline at end of file
+import argparse
+import csv
+import sys
+import time
+
+import calibration
+import instrument_profiles
+
+# Kalibrasi zeropoint dan ekstingsi dari pengukuran bintang standar semalam.
+# Input: CSV pengukuran (telescope, ccd, filter, catalog_mag, flux [ADU], exposure_time [s],
+# airmass, opsional mag_error) dan/atau output IRAF phot (--phot) dengan katalog ID -> magnitude.
+# Hasil ditulis ke file kalibrasi berversi yang otomatis dimuat ulang oleh kedua app.
+#
+# Contoh:
+#   python Perhitungan_Zeropoint.py standar_malam_ini.csv
+#   python Perhitungan_Zeropoint.py --phot phot_output.txt --catalog katalog.csv \
+#       --telescope "Celestron C11" --ccd "QHY 174 GPS" --filter V --exposure-time 10 --airmass 1.15
+
+
+def read_catalog(path):
+    # CSV katalog dengan kolom id dan magnitude
+    with open(path, newline="", encoding="utf-8") as f:
+        return {int(row["id"]): float(row["magnitude"]) for row in csv.DictReader(f)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kalibrasi zeropoint dan koefisien ekstingsi")
+    parser.add_argument("measurements", nargs="*", help="CSV pengukuran bintang standar")
+    parser.add_argument("--phot", action="append", default=[], help="output IRAF apphot.phot")
+    parser.add_argument("--catalog", help="CSV katalog (id, magnitude) untuk --phot")
+    parser.add_argument("--telescope")
+    parser.add_argument("--ccd")
+    parser.add_argument("--filter")
+    parser.add_argument("--exposure-time", type=float, help="dipakai jika ITIME di file phot kosong")
+    parser.add_argument("--airmass", type=float, help="dipakai jika XAIRMASS di file phot kosong")
+    parser.add_argument("--config", default="instruments.json")
+    parser.add_argument("--output", default="calibration.json")
+    parser.add_argument("--clip", type=float, default=calibration.CLIP_SIGMA, help="batas sigma clipping")
+    parser.add_argument("--dry-run", action="store_true", help="tampilkan hasil tanpa menulis file")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    parts = [calibration.read_measurements_csv(path) for path in args.measurements]
+    if args.phot:
+        if not (args.catalog and args.telescope and args.ccd and args.filter):
+            parser.error("--phot membutuhkan --catalog, --telescope, --ccd dan --filter")
+        catalog = read_catalog(args.catalog)
+        for path in args.phot:
+            parts.append(calibration.measurements_from_phot(
+                path, catalog, args.telescope, args.ccd, args.filter, args.exposure_time, args.airmass
+            ))
+    if not parts:
+        parser.error("Tidak ada input pengukuran")
+    measurements = calibration.concatenate_measurements(parts)
+    if len(measurements["flux"]) == 0:
+        sys.exit("Tidak ada pengukuran yang valid")
+
+    # Ekstingsi awal (untuk kelompok dengan satu airmass) dari config, bukan dari kalibrasi lama
+    profiles = instrument_profiles.compile_profiles(instrument_profiles.load_config(args.config))
+    results = calibration.calibrate(measurements, profiles, clip=args.clip)
+    elapsed = time.perf_counter() - start
+
+    for r in results:
+        extinction_note = " (tetap dari config)" if r["fixed_extinction"] else f" ± {r['extinction_error']:.3f}"
+        print(
+            f"Telescope: {r['telescope']}, CCD: {r['ccd']}, Filter: {r['filter']}, "
+            f"Zeropoint: {r['zeropoint']:.3f} ± {r['zeropoint_error']:.3f}, "
+            f"k: {r['extinction']:.3f}{extinction_note}, "
+            f"rms: {r['rms']:.3f}, bintang: {r['n_used']}/{r['n_total']}"
+        )
+    print(f"{len(measurements['flux'])} pengukuran, {len(results)} kombinasi, {elapsed:.2f} detik")
+
+    if not args.dry_run:
+        source = ", ".join(args.measurements + args.phot)
+        written = calibration.write_calibration(results, args.output, source=source)
+        print(f"Kalibrasi versi {written['version']} ditulis ke {args.output}")
+
+
+if __name__ == "__main__":
+    main()
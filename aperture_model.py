@@ -0,0 +1,164 @@
+import math
+from functools import lru_cache
+
+import numpy as np
+
+# Model aperture fotometri pada grid piksel detektor.
+# Fraksi flux bintang di dalam aperture lingkaran (encircled energy) untuk PSF Gaussian
+# atau Moffat, dengan jumlah piksel yang benar-benar masuk aperture (piksel yang pusatnya
+# di dalam lingkaran, bintang di pusat piksel). Untuk FWHM kecil (efek pikselisasi besar)
+# nilainya diambil dari tabel yang dihitung sekali per profil, untuk FWHM besar dipakai
+# rumus kontinu. Semua ukuran dalam piksel: fwhm_pixels = FWHM / pixel_scale.
+
+PSF_PROFILES = ("gaussian", "moffat")
+MOFFAT_BETA = 2.5
+TABLE_FWHM = np.geomspace(0.5, 8.0, 48)  # FWHM (piksel) di tabel; di atasnya pakai rumus kontinu
+TABLE_MAX_RADIUS = 4.0 * TABLE_FWHM[-1]  # piksel
+SUBSAMPLE = 8  # sub-piksel per sumbu untuk integrasi Moffat
+RADIUS_GRID = np.linspace(0.25, 4.0, 76)  # kandidat radius (dalam FWHM) untuk solver
+
+
+def _sigma(fwhm):
+    return np.asarray(fwhm, dtype=float) / (2 * math.sqrt(2 * math.log(2)))
+
+
+def _moffat_alpha(fwhm, beta):
+    return np.asarray(fwhm, dtype=float) / (2 * np.sqrt(2 ** (1 / beta) - 1))
+
+
+def continuous_encircled_energy(fwhm, radius, psf="gaussian", beta=MOFFAT_BETA):
+    """
+    Fraksi flux di dalam radius untuk PSF kontinu (tanpa pikselisasi).
+    Gaussian sama dengan ETC.radial_integrate_gauss di ETC LCO.
+    """
+    radius = np.asarray(radius, dtype=float)
+    if psf == "gaussian":
+        return 1 - np.exp(-radius ** 2 / (2 * _sigma(fwhm) ** 2))
+    if psf == "moffat":
+        return 1 - (1 + (radius / _moffat_alpha(fwhm, beta)) ** 2) ** (1 - beta)
+    raise ValueError(f"PSF {psf} tidak dikenal, pilih dari {', '.join(PSF_PROFILES)}")
+
+
+@lru_cache(maxsize=4)
+def _lattice(max_radius=TABLE_MAX_RADIUS):
+    # Piksel di sekitar pusat (sampai max_radius), diurutkan berdasarkan jarak pusat piksel
+    n = int(math.ceil(max_radius))
+    i, j = np.meshgrid(np.arange(-n, n + 1), np.arange(-n, n + 1), indexing="ij")
+    distance2 = (i ** 2 + j ** 2).ravel()
+    order = np.argsort(distance2, kind="stable")
+    keep = distance2[order] <= max_radius ** 2
+    return i.ravel()[order][keep], j.ravel()[order][keep], distance2[order][keep]
+
+
+def _pixel_fluxes(fwhm, psf, beta, max_radius=TABLE_MAX_RADIUS):
+    # Flux PSF (ternormalisasi) yang jatuh di setiap piksel lattice
+    i, j, _ = _lattice(max_radius)
+    if psf == "gaussian":
+        # Gaussian separable: integral per piksel = hasil kali dua selisih erf
+        sigma = float(_sigma(fwhm))
+        n = int(np.abs(i).max())
+        edges = (np.arange(-n, n + 2) - 0.5) / (sigma * math.sqrt(2))
+        cdf = 0.5 * (1 + np.array([math.erf(e) for e in edges]))
+        per_axis = np.diff(cdf)
+        return per_axis[i + n] * per_axis[j + n]
+    # Moffat: rata-rata SUBSAMPLE x SUBSAMPLE titik dalam setiap piksel
+    alpha = float(_moffat_alpha(fwhm, beta))
+    offsets = (np.arange(SUBSAMPLE) + 0.5) / SUBSAMPLE - 0.5
+    dx, dy = np.meshgrid(offsets, offsets, indexing="ij")
+    x = i[:, None] + dx.ravel()[None, :]
+    y = j[:, None] + dy.ravel()[None, :]
+    surface = (beta - 1) / (math.pi * alpha ** 2) * (1 + (x ** 2 + y ** 2) / alpha ** 2) ** (-beta)
+    return surface.mean(axis=1)
+
+
+@lru_cache(maxsize=8)
+def lookup_table(psf="gaussian", beta=MOFFAT_BETA):
+    """
+    Tabel encircled energy [fwhm, jumlah piksel] (cumulative sum flux piksel urut jarak).
+    Dihitung sekali per (psf, beta), setelah itu lookup O(1).
+    """
+    if psf not in PSF_PROFILES:
+        raise ValueError(f"PSF {psf} tidak dikenal, pilih dari {', '.join(PSF_PROFILES)}")
+    table = np.empty((TABLE_FWHM.size, _lattice()[2].size))
+    for row, fwhm in enumerate(TABLE_FWHM):
+        np.cumsum(_pixel_fluxes(fwhm, psf, beta), out=table[row])
+    table.setflags(write=False)
+    return table
+
+
+def pixels_in_aperture(radius):
+    """
+    Jumlah piksel yang pusatnya di dalam lingkaran radius (piksel), bintang di pusat piksel.
+    Di luar tabel dipakai luas lingkaran.
+    """
+    radius = np.asarray(radius, dtype=float)
+    distance2 = _lattice()[2]
+    count = np.searchsorted(distance2, radius ** 2, side="right")
+    return np.where(radius <= TABLE_MAX_RADIUS, np.maximum(count, 1), np.pi * radius ** 2)
+
+
+def encircled_energy(fwhm, radius, psf="gaussian", beta=MOFFAT_BETA):
+    """
+    Fraksi flux bintang di dalam aperture (piksel pusat-di-dalam) untuk array fwhm dan radius
+    (keduanya dalam piksel, di-broadcast). Interpolasi linear terhadap log FWHM di tabel.
+    """
+    fwhm, radius = np.broadcast_arrays(np.asarray(fwhm, dtype=float), np.asarray(radius, dtype=float))
+    table = lookup_table(psf, beta)
+    distance2 = _lattice()[2]
+
+    in_table = (fwhm >= TABLE_FWHM[0]) & (fwhm <= TABLE_FWHM[-1]) & (radius <= TABLE_MAX_RADIUS)
+    count = np.clip(np.searchsorted(distance2, radius ** 2, side="right"), 1, distance2.size)
+    position = np.interp(np.log(fwhm), np.log(TABLE_FWHM), np.arange(TABLE_FWHM.size))
+    lower = np.clip(np.floor(position).astype(int), 0, TABLE_FWHM.size - 2)
+    weight = position - lower
+    tabulated = table[lower, count - 1] * (1 - weight) + table[lower + 1, count - 1] * weight
+
+    continuous = continuous_encircled_energy(fwhm, radius, psf, beta)
+    return np.where(in_table, tabulated, continuous)
+
+
+def peak_fraction(fwhm, psf="gaussian", beta=MOFFAT_BETA):
+    """
+    Fraksi flux bintang di piksel paling terang (bintang di pusat piksel, kasus terburuk
+    untuk saturasi). Dari kolom pertama tabel; untuk FWHM di atas tabel dipakai
+    kecerahan pusat PSF kontinu x luas satu piksel.
+    """
+    fwhm = np.asarray(fwhm, dtype=float)
+    central = encircled_energy(np.clip(fwhm, TABLE_FWHM[0], TABLE_FWHM[-1]), 0.0, psf, beta)
+    if psf == "gaussian":
+        surface = 1 / (2 * math.pi * _sigma(fwhm) ** 2)
+    else:
+        surface = (beta - 1) / (math.pi * _moffat_alpha(fwhm, beta) ** 2)
+    return np.where(fwhm <= TABLE_FWHM[-1], central, surface)
+
+
+def optimal_aperture(signal_star, signal_sky, read_noise, dark_current, exposure_time, fwhm,
+                     psf="gaussian", beta=MOFFAT_BETA, radius_grid=RADIUS_GRID):
+    """
+    Radius aperture (piksel) yang memaksimalkan SNR untuk setiap target.
+    signal_star: e-/s total bintang, signal_sky: e-/s/piksel, fwhm dalam piksel.
+    Kandidat radius radius_grid x FWHM dievaluasi sekaligus (target x kandidat).
+    """
+    signal_star, signal_sky, exposure_time, fwhm = (
+        np.asarray(a, dtype=float)[..., None]
+        for a in np.broadcast_arrays(signal_star, signal_sky, exposure_time, fwhm)
+    )
+    radius = fwhm * radius_grid
+    num_pixels = pixels_in_aperture(radius)
+    fraction = encircled_energy(fwhm, radius, psf, beta)
+
+    signal = signal_star * fraction * exposure_time
+    variance = signal + (signal_sky + dark_current) * num_pixels * exposure_time + read_noise ** 2 * num_pixels
+    snr = signal / np.sqrt(variance)
+
+    best = np.argmax(snr, axis=-1)[..., None]
+
+    def pick(values):
+        return np.take_along_axis(np.broadcast_to(values, snr.shape), best, axis=-1)[..., 0]
+
+    return {
+        "radius": pick(radius),
+        "num_pixels": pick(num_pixels),
+        "encircled_energy": pick(fraction),
+        "snr": pick(snr),
+    }
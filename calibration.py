@@ -0,0 +1,215 @@
+import csv
+import datetime
+import json
+import os
+import shutil
+
+import numpy as np
+
+import iraf_phot
+
+# Kalibrasi zeropoint dan koefisien ekstingsi dari banyak bintang standar.
+# Model (konvensi zeropoint yang sama dengan etc_engine):
+#   signal [e-/s] = aperture_area * QE * 10^(-0.4 (m_katalog + k X - ZP))
+# sehingga untuk setiap pengukuran
+#   y = m_katalog - m_instrumen = ZP - k X,  m_instrumen = -2.5 log10(flux * gain / (t * area * QE))
+# Semua kelompok (teleskop, CCD, filter) di-fit sekaligus dengan normal equation
+# (np.bincount), lalu titik outlier dibuang dengan sigma clipping per kelompok.
+
+MEASUREMENT_FIELDS = ("telescope", "ccd", "filter", "catalog_mag", "flux", "exposure_time", "airmass")
+CLIP_SIGMA = 3.0
+MAX_ITERATIONS = 10
+MIN_POINTS_FOR_EXTINCTION = 3
+
+
+def read_measurements_csv(path):
+    """
+    Membaca CSV pengukuran (kolom MEASUREMENT_FIELDS, opsional mag_error) menjadi dict kolom
+    """
+    columns = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        missing = [name for name in MEASUREMENT_FIELDS if name not in (reader.fieldnames or ())]
+        if missing:
+            raise ValueError(f"Kolom {', '.join(missing)} tidak ada di {path}")
+        names = list(MEASUREMENT_FIELDS) + (["mag_error"] if "mag_error" in reader.fieldnames else [])
+        for name in names:
+            columns[name] = []
+        for row in reader:
+            for name in names:
+                columns[name].append(row[name])
+    return _as_arrays(columns)
+
+
+def _as_arrays(columns):
+    result = {}
+    for name, values in columns.items():
+        if name in ("telescope", "ccd", "filter"):
+            result[name] = np.asarray(values, dtype=str)
+        else:
+            result[name] = np.asarray(values, dtype=float)
+    return result
+
+
+def measurements_from_phot(source, catalog, telescope, ccd, filter_name, exposure_time=None, airmass=None):
+    """
+    Pengukuran dari output IRAF phot: ID dicocokkan dengan catalog {ID: magnitude}.
+    exposure_time/airmass dipakai jika ITIME/XAIRMASS tidak diisi di header image.
+    Untuk beberapa aperture dipakai aperture terbesar.
+    """
+    columns = {name: [] for name in MEASUREMENT_FIELDS + ("mag_error",)}
+    for records in iraf_phot.iter_chunks(source):
+        good = iraf_phot.good_mask(records, flags=("PIER",))
+        flux, mag_error = records["FLUX"], records["MERR"]
+        if flux.ndim > 1:
+            good, flux, mag_error = good[:, -1], flux[:, -1], mag_error[:, -1]
+        catalog_mag = np.array([catalog.get(int(i), np.nan) for i in records["ID"]])
+        itime = records["ITIME"] if exposure_time is None else np.full(len(records), float(exposure_time))
+        xairmass = records["XAIRMASS"] if airmass is None else np.full(len(records), float(airmass))
+        use = good & np.isfinite(catalog_mag) & np.isfinite(itime) & np.isfinite(xairmass) & (flux > 0)
+        count = int(use.sum())
+        columns["telescope"].extend([telescope] * count)
+        columns["ccd"].extend([ccd] * count)
+        columns["filter"].extend([filter_name] * count)
+        columns["catalog_mag"].extend(catalog_mag[use])
+        columns["flux"].extend(flux[use])
+        columns["exposure_time"].extend(itime[use])
+        columns["airmass"].extend(xairmass[use])
+        columns["mag_error"].extend(mag_error[use])
+    return _as_arrays(columns)
+
+
+def concatenate_measurements(parts):
+    names = set.intersection(*(set(part) for part in parts))
+    return {name: np.concatenate([part[name] for part in parts]) for name in names}
+
+
+def fit_groups(group_index, airmass, y, weights, fixed_extinction, clip=CLIP_SIGMA, max_iter=MAX_ITERATIONS):
+    """
+    Least squares y = ZP - k X untuk semua kelompok sekaligus dengan sigma clipping.
+    Kelompok dengan rentang airmass terlalu sempit (atau < 3 titik) memakai
+    fixed_extinction[kelompok] dan hanya ZP yang di-fit.
+    """
+    n_groups = len(fixed_extinction)
+    used = np.ones(len(y), dtype=bool)
+
+    for _ in range(max_iter + 1):
+        w = weights * used
+        count = np.bincount(group_index, used, n_groups)
+        S = np.bincount(group_index, w, n_groups)
+        Sx = np.bincount(group_index, w * airmass, n_groups)
+        Sy = np.bincount(group_index, w * y, n_groups)
+        Sxx = np.bincount(group_index, w * airmass ** 2, n_groups)
+        Sxy = np.bincount(group_index, w * airmass * y, n_groups)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            det = S * Sxx - Sx ** 2
+            free = (count >= MIN_POINTS_FOR_EXTINCTION) & (det > 1e-6 * S ** 2)
+            slope = np.where(free, (S * Sxy - Sx * Sy) / det, -fixed_extinction)
+            intercept = (Sy - slope * Sx) / S
+
+            residual = y - intercept[group_index] - slope[group_index] * airmass
+            n_params = np.where(free, 2, 1)
+            dof = np.maximum(count - n_params, 1)
+            sigma = np.sqrt(np.bincount(group_index, used * residual ** 2, n_groups) / dof)
+
+        limit = clip * sigma[group_index]
+        new_used = (np.abs(residual) <= limit) | (limit == 0)
+        if np.array_equal(new_used, used):
+            break
+        used = new_used
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        chi2 = np.bincount(group_index, weights * used * residual ** 2, n_groups) / dof
+        intercept_error = np.sqrt(np.where(free, Sxx / det, 1 / S) * chi2)
+        slope_error = np.where(free, np.sqrt(S / det * chi2), 0.0)
+
+    return {
+        "zeropoint": intercept,
+        "zeropoint_error": intercept_error,
+        "extinction": -slope,
+        "extinction_error": slope_error,
+        "fixed_extinction": ~free,
+        "rms": sigma,
+        "n_used": count.astype(int),
+        "n_total": np.bincount(group_index, minlength=n_groups),
+        "used": used,
+    }
+
+
+def calibrate(measurements, profiles, clip=CLIP_SIGMA, max_iter=MAX_ITERATIONS):
+    """
+    Zeropoint dan ekstingsi per (teleskop, CCD, filter).
+    profiles: {(teleskop, CCD, filter): InstrumentProfile} untuk gain, area, QE dan ekstingsi awal.
+    """
+    keys = np.stack([measurements["telescope"], measurements["ccd"], measurements["filter"]], axis=1)
+    group_keys, group_index = np.unique(keys, axis=0, return_inverse=True)
+    group_index = group_index.ravel()
+    group_keys = [tuple(key) for key in group_keys.tolist()]
+
+    unknown = [key for key in group_keys if key not in profiles]
+    if unknown:
+        raise KeyError(f"Kombinasi {unknown[0]} tidak ada di config instrumen")
+    group_profiles = [profiles[key] for key in group_keys]
+
+    # Faktor per kelompok -> per pengukuran
+    gain = np.array([p.gain for p in group_profiles])[group_index]
+    collecting = np.array([p.aperture_area * p.quantum_efficiency for p in group_profiles])[group_index]
+    fixed_extinction = np.array([p.extinction_coefficient for p in group_profiles])
+
+    instrumental = -2.5 * np.log10(measurements["flux"] * gain / (measurements["exposure_time"] * collecting))
+    y = measurements["catalog_mag"] - instrumental
+    mag_error = measurements.get("mag_error")
+    if mag_error is None:
+        weights = np.ones(len(y))
+    else:
+        weights = np.where(mag_error > 0, 1 / np.maximum(mag_error, 1e-3) ** 2, 1.0)
+
+    fit = fit_groups(group_index, measurements["airmass"], y, weights, fixed_extinction, clip, max_iter)
+
+    results = []
+    for i, (telescope, ccd, filter_name) in enumerate(group_keys):
+        results.append({
+            "telescope": telescope,
+            "ccd": ccd,
+            "filter": filter_name,
+            "zeropoint": round(float(fit["zeropoint"][i]), 4),
+            "zeropoint_error": round(float(fit["zeropoint_error"][i]), 4),
+            "extinction": round(float(fit["extinction"][i]), 4),
+            "extinction_error": round(float(fit["extinction_error"][i]), 4),
+            "fixed_extinction": bool(fit["fixed_extinction"][i]),
+            "rms": round(float(fit["rms"][i]), 4),
+            "n_used": int(fit["n_used"][i]),
+            "n_total": int(fit["n_total"][i]),
+        })
+    return results
+
+
+def write_calibration(results, path, source=None):
+    """
+    Menulis file kalibrasi dengan nomor versi baru (file lama disimpan sebagai <nama>.v<N>.json).
+    Penulisan atomik supaya app yang sedang memuat ulang tidak membaca file setengah jadi.
+    """
+    version = 0
+    if os.path.exists(path):
+        previous = load_calibration(path)
+        version = previous.get("version", 0)
+        root, ext = os.path.splitext(path)
+        shutil.copyfile(path, f"{root}.v{version}{ext}")
+    calibration = {
+        "version": version + 1,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "source": source,
+        "zeropoint_airmass": 0.0,
+        "results": results,
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(calibration, f, indent=4)
+    os.replace(tmp_path, path)
+    return calibration
+
+
+def load_calibration(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,190 @@
+import asyncio
+
+import numpy as np
+
+import etc_engine
+import throughput
+
+# Batch API: daftar target (JSON array atau NDJSON) dihitung per chunk dengan
+# engine vektor lalu dikirim balik sebagai NDJSON selama proses berjalan.
+
+try:
+    import orjson
+
+    def dumps(obj):
+        return orjson.dumps(obj)
+
+    loads = orjson.loads
+except ImportError:  # orjson opsional, fallback ke json bawaan
+    import json
+
+    def dumps(obj):
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+    loads = json.loads
+
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+CHUNK_SIZE = 1024
+
+# Kolom input per target dan kolom output yang dikirim balik.
+# temperature (K, opsional) menambahkan offset warna dari model throughput spektral.
+TARGET_FIELDS = ("magnitude", "sky_brightness", "zenith_distance", "fwhm")
+RESULT_FIELDS = (
+    "exposure_time", "snr", "signal_star", "signal_sky", "num_pixels",
+    "noise_star", "noise_sky", "noise_dark", "noise_read", "total_noise",
+)
+# Kolom tambahan yang dikirim jika engine menghasilkannya (engine "lco")
+OPTIONAL_FIELDS = ("peak", "saturated")
+
+
+def is_ndjson(content_type):
+    return content_type.split(";")[0].strip().lower() in NDJSON_MEDIA_TYPES
+
+
+def _iter_ndjson(body):
+    # Baris dipotong satu per satu tanpa membuat list semua baris
+    start = 0
+    while start < len(body):
+        end = body.find(b"\n", start)
+        if end < 0:
+            end = len(body)
+        line = body[start:end]
+        if line.strip():
+            yield line
+        start = end + 1
+
+
+async def read_targets(request):
+    """
+    Membaca target dari body request (NDJSON atau JSON array).
+    Body dibaca sekali sebelum response mulai di-stream (StreamingResponse memakai
+    receive() untuk deteksi disconnect); NDJSON di-parse per baris saat dihitung.
+    """
+    body = await request.body()
+    if is_ndjson(request.headers.get("content-type", "")):
+        return _iter_ndjson(body)
+    targets = loads(body)
+    if not isinstance(targets, list):
+        raise ValueError("Body harus berupa JSON array berisi target")
+    return iter(targets)
+
+
+def parse_target(raw, profiles):
+    target = loads(raw) if isinstance(raw, (bytes, str)) else raw
+    if not isinstance(target, dict):
+        raise ValueError("Target harus berupa object")
+    if target.get("filter") not in profiles:
+        raise ValueError(f"Filter {target.get('filter')} tidak dikenal")
+    missing = [field for field in TARGET_FIELDS if target.get(field) is None]
+    if missing:
+        raise ValueError(f"Field wajib tidak ada: {', '.join(missing)}")
+    if (target.get("snr") is None) == (target.get("exposure_time") is None):
+        raise ValueError("Isi salah satu dari snr atau exposure_time")
+    parsed = {field: float(target[field]) for field in TARGET_FIELDS}
+    for mode in ("snr", "exposure_time"):
+        parsed[mode] = None if target.get(mode) is None else float(target[mode])
+    parsed["filter"] = target["filter"]
+    if target.get("temperature") is not None:
+        parsed["temperature"] = float(target["temperature"])
+        throughput.validate(parsed["filter"], parsed["temperature"])
+    if "id" in target:
+        parsed["id"] = target["id"]
+    return parsed
+
+
+def evaluate_chunk(targets, profiles, engine=etc_engine.evaluate):
+    """
+    Menghitung satu chunk target yang sudah tervalidasi, hasil berupa list dict.
+    profiles berisi InstrumentProfile per filter untuk satu kombinasi teleskop/CCD,
+    engine fungsi dengan signature etc_engine.evaluate (mis. lco_engine.evaluate).
+    """
+    results = [None] * len(targets)
+    groups = {}
+    for i, target in enumerate(targets):
+        mode = "snr" if target["snr"] is not None else "exposure_time"
+        groups.setdefault((mode, target["filter"], "temperature" in target), []).append(i)
+
+    for (mode, filter_name, colored), rows in groups.items():
+        columns = {field: np.array([targets[i][field] for i in rows]) for field in TARGET_FIELDS}
+        if colored:
+            # Lookup tabel throughput (vektor), filter dan temperatur sudah divalidasi parse_target
+            temperature = np.array([targets[i]["temperature"] for i in rows])
+            columns["magnitude"] = columns["magnitude"] + throughput.color_offset(
+                profiles[filter_name], temperature, columns["zenith_distance"]
+            )
+        given = np.array([targets[i][mode] for i in rows])
+        kwargs = {"snr_target": given} if mode == "snr" else {"exposure_time": given}
+        evaluated = engine(profiles[filter_name], **columns, **kwargs)
+        fields = RESULT_FIELDS + tuple(field for field in OPTIONAL_FIELDS if field in evaluated)
+        values = zip(*(evaluated[field].tolist() for field in fields))
+        for i, row in zip(rows, values):
+            result = {"filter": filter_name, "magnitude": targets[i]["magnitude"]}
+            if colored:
+                result["temperature"] = targets[i]["temperature"]
+            if "id" in targets[i]:
+                result["id"] = targets[i]["id"]
+            result.update(zip(fields, row))
+            results[i] = result
+    return results
+
+
+def process_chunk(chunk, profiles, engine=etc_engine.evaluate, on_chunk=None):
+    """
+    Parse, hitung dan encode satu chunk [(index, target mentah)] menjadi bytes NDJSON.
+    Target yang tidak valid menjadi baris error. on_chunk(targets, results) dipanggil dengan
+    target valid dan hasilnya.
+    """
+    parsed = []
+    for i, raw in chunk:
+        try:
+            parsed.append((i, parse_target(raw, profiles)))
+        except (ValueError, TypeError) as e:
+            parsed.append((i, e))
+    valid = [target for _, target in parsed if not isinstance(target, Exception)]
+    results = evaluate_chunk(valid, profiles, engine)
+    if on_chunk is not None and valid:
+        on_chunk(valid, results)
+    evaluated = iter(results)
+    lines = []
+    for i, target in parsed:
+        if isinstance(target, Exception):
+            line = {"index": i, "error": str(target)}
+        else:
+            line = {"index": i, **next(evaluated)}
+        lines.append(dumps(line) + b"\n")
+    return b"".join(lines)
+
+
+async def stream_results(targets, profiles, chunk_size=CHUNK_SIZE, engine=etc_engine.evaluate, on_chunk=None,
+                         run=None):
+    """
+    Menghasilkan baris NDJSON per target, dihitung per chunk.
+    Target yang tidak valid dilaporkan sebagai baris error tanpa menghentikan batch.
+    on_chunk(targets, results) (opsional) dipanggil per chunk dengan target valid dan hasilnya.
+    run(function, *args) (opsional, async, mis. ComputePool.run) menjalankan setiap chunk di luar
+    event loop; tanpa run chunk dihitung langsung.
+    """
+    index = 0
+    chunk = []
+
+    async def flush():
+        pending = list(chunk)
+        chunk.clear()
+        if run is None:
+            return process_chunk(pending, profiles, engine, on_chunk)
+        try:
+            return await run(process_chunk, pending, profiles, engine, on_chunk)
+        except Exception as e:
+            # Response sudah mulai di-stream: chunk yang gagal (mis. pool penuh) dilaporkan per target
+            detail = getattr(e, "detail", None) or str(e)
+            return b"".join(dumps({"index": i, "error": detail}) + b"\n" for i, _ in pending)
+
+    for raw in targets:
+        chunk.append((index, raw))
+        index += 1
+        if len(chunk) >= chunk_size:
+            yield await flush()
+            # Beri kesempatan request lain di event loop di antara chunk
+            await asyncio.sleep(0)
+    if chunk:
+        yield await flush()
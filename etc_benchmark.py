@@ -0,0 +1,427 @@
+import argparse
+import asyncio
+import datetime
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+# Benchmark dan load test ETC.
+#   python etc_benchmark.py run --output benchmarks/latest.json      (micro, endpoint, plot, load)
+#   python etc_benchmark.py load --url http://127.0.0.1:8000         (server yang sedang jalan)
+#   python etc_benchmark.py compare benchmarks/baseline.json benchmarks/latest.json --threshold 0.2
+#   python etc_benchmark.py check-startup                             (budget waktu import app)
+# Setiap hasil berupa {"value", "unit", "better": "lower"|"higher"}; compare menandai hasil
+# yang lebih buruk dari baseline melebihi threshold (relatif) dan keluar dengan kode 1.
+
+SUITES = ("startup", "micro", "endpoints", "plots", "load")
+APPS = ("main2_24_march", "Las_cumbres")
+MAGNITUDES = {"bright": 6.0, "medium": 12.0, "faint": 17.0, "very_faint": 20.0}
+CONCURRENCY = (1, 4, 16, 64)
+TARGET_TIME = 0.02  # detik per pengulangan micro-benchmark
+REPEAT = 7
+THRESHOLD = 0.2
+# Waktu import app (proses baru) maksimal, dan modul berat yang hanya boleh di-import saat dipakai
+IMPORT_BUDGET = float(os.environ.get("ETC_IMPORT_BUDGET", "1.0"))
+HEAVY_MODULES = ("matplotlib", "pyarrow", "scipy", "pandas", "multiprocessing")
+
+TELESCOPE = "Celestron C11"
+CCD = "ZWO ASI 2600 MM Pro"
+FILTER = "V"
+
+
+def _timeit(function, target_time=TARGET_TIME, repeat=REPEAT):
+    # Jumlah panggilan per pengulangan dikalibrasi sampai ~target_time, hasil detik per panggilan
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= target_time or number >= 1 << 20:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(target_time / elapsed) + 1))
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        timings.append((time.perf_counter() - start) / number)
+    return timings
+
+
+def _timing_result(timings, **extra):
+    return {"value": float(np.median(timings)), "min": float(np.min(timings)), "unit": "s", "better": "lower", **extra}
+
+
+def _latency_result(latencies, elapsed, errors):
+    # Persentil dan req/s hanya dari response 200
+    latencies = np.asarray(latencies) if latencies else np.array([np.nan])
+    return {
+        "p50": {"value": float(np.percentile(latencies, 50)), "unit": "s", "better": "lower"},
+        "p99": {"value": float(np.percentile(latencies, 99)), "unit": "s", "better": "lower"},
+        "rps": {"value": int(np.isfinite(latencies).sum()) / elapsed, "unit": "1/s", "better": "higher"},
+        "errors": {"value": errors, "unit": "count", "better": "lower"},
+    }
+
+
+_IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {app}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import(app_name):
+    """
+    Waktu import modul app di proses Python baru (termasuk load profil, template, index) dan
+    modul berat yang ikut ter-import
+    """
+    env = {**os.environ, "ETC_LOG_LEVEL": "WARNING"}
+    output = subprocess.run(
+        [sys.executable, "-c", _IMPORT_PROBE.format(app=app_name, heavy=HEAVY_MODULES)],
+        capture_output=True, text=True, check=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def bench_startup(quick=False):
+    """
+    Waktu cold import kedua app (median beberapa proses baru)
+    """
+    repeat = 3 if quick else 7
+    results = {}
+    for app_name in APPS:
+        probes = [measure_import(app_name) for _ in range(repeat)]
+        results[f"startup.{app_name}.import"] = _timing_result(
+            [probe["elapsed"] for probe in probes], heavy_modules=probes[-1]["heavy"]
+        )
+    return results
+
+
+def check_startup(budget=IMPORT_BUDGET, repeat=3):
+    """
+    List pelanggaran budget: waktu import (median) di atas budget atau modul berat ter-import
+    """
+    problems = []
+    for app_name in APPS:
+        probes = [measure_import(app_name) for _ in range(repeat)]
+        elapsed = float(np.median([probe["elapsed"] for probe in probes]))
+        print(f"{app_name}: import {elapsed * 1000:.0f} ms (budget {budget * 1000:.0f} ms)", file=sys.stderr)
+        if elapsed > budget:
+            problems.append(f"{app_name}: import {elapsed:.2f} s melebihi budget {budget:.2f} s")
+        for module in probes[-1]["heavy"]:
+            problems.append(f"{app_name}: modul berat {module} ter-import saat start")
+    return problems
+
+
+def bench_micro(quick=False):
+    """
+    Fungsi solver di kedua app untuk magnitude terang sampai sangat redup
+    """
+    import Las_cumbres
+    import main2_24_march as main2
+
+    repeat = 3 if quick else REPEAT
+    profile = main2.profiles.get(TELESCOPE, CCD, FILTER)
+    results = {}
+    for label, magnitude in MAGNITUDES.items():
+        signal_star = main2.calculate_signal(magnitude, profile.zeropoint, 0.3, profile.aperture_area, profile.quantum_efficiency)
+        num_pixels = main2.calculate_pixels_in_aperture(2.0, profile.pixel_scale)
+        signal_sky = main2.calculate_signal(19.0, profile.zeropoint, 0.0, profile.aperture_area, profile.quantum_efficiency) / num_pixels
+        args = (signal_star, signal_sky, profile.read_noise, profile.dark_current, num_pixels, 100.0)
+        cases = {
+            "main2.calculate_exposure_time": lambda: main2.calculate_exposure_time(*args),
+            "main2.calculate_exposure_time_analytic": lambda: main2.calculate_exposure_time_analytic(*args),
+            "main2.calculate_snr_and_exposure_logic": lambda: main2.calculate_snr_and_exposure_logic(
+                magnitude, profile.zeropoint, 19.0, profile.aperture_area, profile.pixel_scale,
+                profile.read_noise, profile.dark_current, 100.0, profile.extinction_coefficient, 1.2,
+                profile.quantum_efficiency,
+            ),
+            "las_cumbres.calculate_snr": lambda: Las_cumbres.calculate_snr(
+                TELESCOPE, CCD, magnitude, 60.0, 2.0, 1.2, FILTER, 19.0
+            ),
+            "las_cumbres.calculate_exposure_time": lambda: Las_cumbres.calculate_exposure_time(
+                TELESCOPE, CCD, magnitude, 100.0, 2.0, 1.2, FILTER, 19.0
+            ),
+            "las_cumbres.calculate_snr_and_exposure": lambda: Las_cumbres.calculate_snr_and_exposure(
+                magnitude, profile.zeropoint, 19.0, profile.aperture_area, profile.pixel_scale,
+                profile.read_noise, profile.dark_current, 100.0, profile.extinction_coefficient, 1.2,
+            ),
+        }
+        for name, function in cases.items():
+            try:
+                timings = _timeit(function, repeat=repeat)
+            except ValueError as e:  # mis. exposure time terlalu lama untuk target sangat redup
+                results[f"micro.{name}[{label}]"] = {"error": str(e)}
+                continue
+            results[f"micro.{name}[{label}]"] = _timing_result(timings, magnitude=magnitude)
+    return results
+
+
+def _form(app_name, route, index):
+    # Magnitude berbeda per request (di atas presisi cache) supaya yang diukur perhitungan, bukan cache hit
+    magnitude = 12.0 + (index % 5000) * 0.001
+    if app_name == "main2_24_march":
+        base = {"telescope": TELESCOPE, "ccd": CCD, "filter": FILTER, "magnitude": magnitude,
+                "sky_brightness": 19.0, "zenith_distance": 30.0, "fwhm": 2.0}
+        extra = {
+            "/calculate_exposure": {"snr": 100.0},
+            "/calculate_snr": {"exposure_time": 60.0},
+            "/calculate_snr_and_exposure": {"snr_target": 100.0, "airmass": 1.2},
+        }[route]
+        return {**base, **extra}
+    base = {"telescope": TELESCOPE, "ccd": CCD, "magnitude": magnitude, "sky_brightness": 19.0}
+    extra = {
+        "/calculate_exposure": {"snr_target": 100.0, "fwhm": 2.0, "airmass": 1.2, "filter_name": FILTER},
+        "/calculate_snr": {"exposure_time": 60.0, "fwhm": 2.0, "airmass": 1.2, "filter_name": FILTER},
+        "/calculate_snr_and_exposure": {"snr_target": 100.0, "airmass": 1.2, "filter": FILTER},
+    }[route]
+    return {**base, **extra}
+
+
+ROUTES = ("/calculate_exposure", "/calculate_snr", "/calculate_snr_and_exposure")
+
+
+def _client(app=None, url=None):
+    import httpx
+
+    if url is not None:
+        return httpx.AsyncClient(base_url=url, timeout=60)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=60)
+
+
+async def _endpoint_latency(app_name, app, requests):
+    results = {}
+    async with _client(app) as client:
+        for route in ROUTES:
+            await client.post(route, data=_form(app_name, route, 0))  # warmup
+            latencies = []
+            for i in range(requests):
+                start = time.perf_counter()
+                response = await client.post(route, data=_form(app_name, route, i + 1))
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+            results[f"endpoint.{app_name}{route}"] = _timing_result(latencies, p99=float(np.percentile(latencies, 99)))
+            start = time.perf_counter()
+            for _ in range(requests):
+                (await client.post(route, data=_form(app_name, route, 1))).raise_for_status()
+            results[f"endpoint.{app_name}{route}[cached]"] = _timing_result([(time.perf_counter() - start) / requests])
+        for label, headers in (("index", {}), ("index.gzip", {"Accept-Encoding": "gzip"})):
+            latencies = []
+            for _ in range(requests):
+                start = time.perf_counter()
+                (await client.get("/", headers=headers)).raise_for_status()
+                latencies.append(time.perf_counter() - start)
+            results[f"endpoint.{app_name}/[{label}]"] = _timing_result(latencies)
+    return results
+
+
+def bench_endpoints(quick=False):
+    """
+    Latensi ketiga route POST kedua app lewat client ASGI in-process (tanpa jaringan)
+    """
+    requests = 50 if quick else 300
+    results = {}
+    for app_name in APPS:
+        app = importlib.import_module(app_name).app
+        results.update(asyncio.run(_endpoint_latency(app_name, app, requests)))
+    return results
+
+
+def bench_plots(quick=False):
+    """
+    Waktu menghitung data dan render matplotlib (di proses ini, tanpa process pool dan cache)
+    """
+    import etc_plots
+    import main2_24_march as main2
+
+    repeat = 2 if quick else 5
+    results = {}
+    profiles = main2.profiles.for_combination(TELESCOPE, CCD)
+    for kind in etc_plots.PLOT_KINDS:
+        plot_profiles = profiles if kind == "comparison" else {FILTER: profiles[FILTER]}
+        data = etc_plots.plot_data(kind, plot_profiles, 17.5, 30.0, 2.0, 200.0, 11.5)
+        results[f"plot.data.{kind}"] = _timing_result(_timeit(
+            lambda: etc_plots.plot_data(kind, plot_profiles, 17.5, 30.0, 2.0, 200.0, 11.5), repeat=repeat
+        ))
+        for fmt in etc_plots.MEDIA_TYPES:
+            etc_plots.render(data, fmt)  # import matplotlib + font cache
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                etc_plots.render(data, fmt)
+                timings.append(time.perf_counter() - start)
+            results[f"plot.render.{kind}.{fmt}"] = _timing_result(timings)
+    return results
+
+
+async def _load_level(client, app_name, concurrency, requests):
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            route = ROUTES[i % len(ROUTES)]
+            start = time.perf_counter()
+            try:
+                response = await client.post(route, data=_form(app_name, route, i))
+            except Exception:
+                errors += 1
+                continue
+            if response.status_code != 200:  # 503/504 dari backpressure dihitung terpisah
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return _latency_result(latencies, time.perf_counter() - start, errors)
+
+
+async def _load(app_name, app, url, concurrency_levels, requests):
+    results = {}
+    async with _client(app, url) as client:
+        for concurrency in concurrency_levels:
+            level = await _load_level(client, app_name, concurrency, max(requests, concurrency))
+            for metric, value in level.items():
+                results[f"load.{app_name}.c{concurrency}.{metric}"] = value
+            print(
+                f"c={concurrency:4d}  p50={level['p50']['value'] * 1000:8.2f} ms  "
+                f"p99={level['p99']['value'] * 1000:8.2f} ms  {level['rps']['value']:8.1f} req/s  "
+                f"error={level['errors']['value']}",
+                file=sys.stderr,
+            )
+    return results
+
+
+def bench_load(quick=False, url=None, app_name="main2_24_march", concurrency=CONCURRENCY, requests=None):
+    """
+    Load generator closed-loop: N client bersamaan, campuran ketiga route POST.
+    Tanpa url dipakai app in-process (generator dan server berbagi event loop).
+    """
+    requests = requests or (200 if quick else 1000)
+    app = None if url is not None else importlib.import_module(app_name).app
+    return asyncio.run(_load(app_name, app, url, concurrency, requests))
+
+
+def metadata():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(baseline, current, threshold=THRESHOLD):
+    """
+    Rasio current/baseline per hasil; regresi jika lebih buruk dari threshold (0.2 = 20%)
+    """
+    rows = []
+    for name, base in sorted(baseline["results"].items()):
+        new = current["results"].get(name)
+        if new is None or "value" not in base or "value" not in new:
+            continue
+        if base["value"] == 0:
+            change = 0.0 if new["value"] == 0 else float("inf")
+        else:
+            change = new["value"] / base["value"] - 1
+        worse = change if base.get("better", "lower") == "lower" else -change
+        if base.get("unit") == "count":
+            regression = new["value"] > base["value"]
+        else:
+            regression = worse > threshold
+        rows.append({"name": name, "baseline": base["value"], "current": new["value"],
+                     "change": change, "regression": regression})
+    return rows
+
+
+def _write(results, path):
+    report = {"meta": metadata(), "results": results}
+    if path is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"{len(results)} hasil ditulis ke {path}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark dan load test ETC")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="jalankan suite benchmark")
+    run.add_argument("--suite", action="append", choices=SUITES, help="default semua suite")
+    run.add_argument("--quick", action="store_true", help="pengulangan lebih sedikit")
+    run.add_argument("--output", help="file JSON hasil (default stdout)")
+
+    load = commands.add_parser("load", help="load test dengan concurrency bertahap")
+    load.add_argument("--url", help="server yang sedang jalan (default app in-process)")
+    load.add_argument("--app", default="main2_24_march", choices=APPS)
+    load.add_argument("--concurrency", type=int, nargs="+", default=list(CONCURRENCY))
+    load.add_argument("--requests", type=int, default=1000, help="request per tingkat concurrency")
+    load.add_argument("--output")
+
+    comparison = commands.add_parser("compare", help="bandingkan hasil dengan baseline")
+    comparison.add_argument("baseline")
+    comparison.add_argument("current")
+    comparison.add_argument("--threshold", type=float, default=THRESHOLD)
+
+    startup = commands.add_parser("check-startup", help="cek budget waktu import dan modul berat")
+    startup.add_argument("--budget", type=float, default=IMPORT_BUDGET, help="detik")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        suites = {"startup": bench_startup, "micro": bench_micro, "endpoints": bench_endpoints, "plots": bench_plots, "load": bench_load}
+        results = {}
+        for suite in args.suite or SUITES:
+            start = time.perf_counter()
+            results.update(suites[suite](quick=args.quick))
+            print(f"{suite}: {time.perf_counter() - start:.1f} detik", file=sys.stderr)
+        _write(results, args.output)
+    elif args.command == "load":
+        results = bench_load(url=args.url, app_name=args.app, concurrency=args.concurrency, requests=args.requests)
+        _write(results, args.output)
+    elif args.command == "check-startup":
+        problems = check_startup(args.budget)
+        for problem in problems:
+            print(problem)
+        sys.exit(1 if problems else 0)
+    else:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.current, encoding="utf-8") as f:
+            current = json.load(f)
+        rows = compare(baseline, current, args.threshold)
+        for row in rows:
+            flag = "REGRESI" if row["regression"] else ""
+            print(f"{row['name']:70s} {row['baseline']:12.4g} {row['current']:12.4g} {row['change']:+8.1%} {flag}")
+        regressions = sum(row["regression"] for row in rows)
+        print(f"{len(rows)} dibandingkan, {regressions} regresi (threshold {args.threshold:.0%})")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
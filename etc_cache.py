@@ -0,0 +1,133 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Cache hasil perhitungan ETC (LRU + TTL + batas memori).
+# Key berisi InstrumentProfile (objek baru setiap config dimuat ulang) dan input
+# yang sudah dibulatkan, jadi query yang sama tidak menghitung ulang seluruh rantai
+# flux -> ekstingsi -> solver.
+
+DEFAULT_MAX_ENTRIES = int(os.environ.get("ETC_CACHE_MAX_ENTRIES", "4096"))
+DEFAULT_MAX_BYTES = int(os.environ.get("ETC_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+DEFAULT_TTL = float(os.environ.get("ETC_CACHE_TTL", "3600"))
+DEFAULT_PRECISION = int(os.environ.get("ETC_CACHE_PRECISION", "3"))
+
+
+def _estimate_size(obj):
+    # Perkiraan kasar ukuran objek beserta isi container satu tingkat
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in obj.items())
+    elif isinstance(obj, (tuple, list)):
+        size += sum(sys.getsizeof(item) for item in obj)
+    return size
+
+
+class ResultCache:
+    """
+    Cache LRU dengan TTL dan batas memori, beserta counter hit/miss/eviction
+    """
+
+    def __init__(self, name="results", max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES,
+                 ttl=DEFAULT_TTL, precision=DEFAULT_PRECISION):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.precision = precision
+        self._entries = OrderedDict()  # key -> (expires_at, value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def quantize(self, **inputs):
+        """
+        Membulatkan input numerik ke presisi cache
+        """
+        return {
+            name: round(value, self.precision) if isinstance(value, float) else value
+            for name, value in inputs.items()
+        }
+
+    def make_key(self, namespace, profile, inputs):
+        return (namespace, profile, tuple(sorted(inputs.items())))
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        size = _estimate_size(key) + _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def get_or_compute(self, namespace, profile, inputs, compute):
+        """
+        Ambil hasil dari cache atau hitung dengan compute(**inputs) lalu simpan.
+        inputs sebaiknya sudah melalui quantize() supaya hasil konsisten dengan key.
+        """
+        key = self.make_key(namespace, profile, inputs)
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute(**inputs)
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def render(self):
+        # Dipanggil oleh etc_metrics.render_metrics()
+        stats = self.stats()
+        label = f'{{cache="{self.name}"}}'
+        lines = []
+        for field in ("hits", "misses", "evictions", "expirations"):
+            lines.append(f"# TYPE etc_cache_{field}_total counter")
+            lines.append(f"etc_cache_{field}_total{label} {stats[field]}")
+        for field in ("entries", "bytes"):
+            lines.append(f"# TYPE etc_cache_{field} gauge")
+            lines.append(f"etc_cache_{field}{label} {stats[field]}")
+        return lines
@@ -0,0 +1,446 @@
+import argparse
+import csv
+import io
+import json
+import math
+import os
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+import etc_batch
+import etc_engine
+
+# ETC offline untuk katalog besar (jutaan baris): katalog CSV/Parquet dibaca per chunk baris,
+# setiap chunk dihitung dengan engine vektor (per filter dan mode sekaligus) di process pool,
+# dan hasil ditulis berurutan sesuai input secara bertahap, jadi memori tetap konstan.
+# Setelah setiap chunk ditulis, checkpoint (JSON) menyimpan jumlah chunk, offset byte input CSV
+# dan ukuran output, sehingga --resume melanjutkan dari chunk terakhir yang selesai.
+
+CHUNK_SIZE = 100000  # baris per chunk
+CHECKPOINT_SUFFIX = ".checkpoint.json"
+NUMERIC_INPUTS = etc_batch.TARGET_FIELDS + ("snr", "exposure_time", "temperature")
+OUTPUT_FIELDS = etc_batch.RESULT_FIELDS + etc_batch.OPTIONAL_FIELDS + ("error",)
+FORMATS = ("csv", "parquet")
+
+# State worker (diisi initializer, tidak dikirim ulang per chunk)
+_worker = {}
+_fields = {}  # (engine, id profil) -> kolom hasil
+
+
+def file_format(path, explicit=None):
+    """
+    csv atau parquet dari argumen eksplisit atau ekstensi file
+    """
+    name = explicit or os.path.splitext(path.rstrip("/"))[1].lstrip(".").lower()
+    if name in ("pq", "parq"):
+        name = "parquet"
+    if name not in FORMATS:
+        raise ValueError(f"Format {name or path} tidak didukung ({', '.join(FORMATS)})")
+    return name
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ValueError("Format parquet membutuhkan pyarrow") from None
+    return pyarrow
+
+
+# Pembacaan katalog --------------------------------------------------------------------------
+
+def read_csv_chunks(path, chunk_size=CHUNK_SIZE, offset=0):
+    """
+    Chunk CSV sebagai (kolom {nama: list string}, offset byte setelah chunk, ukuran file).
+    offset > 0 melanjutkan dari posisi tersebut (header tetap dibaca dari awal file).
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header_line = f.readline()
+        header = next(csv.reader([header_line.decode("utf-8-sig")]))
+        if offset:
+            f.seek(offset)
+        # Baris dibaca dari file biner agar tell() tetap valid; csv.reader mengambil baris
+        # tambahan sendiri untuk field ber-quote yang berisi newline
+        reader = csv.reader(line.decode("utf-8") for line in iter(f.readline, b""))
+        while True:
+            rows = []
+            for row in reader:
+                if row:
+                    rows.append(row)
+                if len(rows) >= chunk_size:
+                    break
+            if not rows:
+                return
+            # Baris yang lebih pendek dari header diisi sel kosong
+            width = len(header)
+            rows = [row if len(row) == width else (row + [""] * width)[:width] for row in rows]
+            columns = dict(zip(header, map(list, zip(*rows))))
+            yield columns, f.tell(), size
+
+
+def read_parquet_chunks(path, chunk_size=CHUNK_SIZE, skip_chunks=0):
+    """
+    Chunk Parquet (record batch) sebagai (kolom {nama: array}, indeks chunk berikutnya, jumlah chunk)
+    """
+    pa = _pyarrow()
+    parquet = pa.parquet.ParquetFile(path)
+    total = math.ceil(parquet.metadata.num_rows / chunk_size)
+    for index, batch in enumerate(parquet.iter_batches(batch_size=chunk_size)):
+        if index < skip_chunks:
+            continue
+        columns = {name: batch.column(i).to_numpy(zero_copy_only=False) for i, name in enumerate(batch.schema.names)}
+        yield columns, index + 1, total
+
+
+# Perhitungan per chunk ----------------------------------------------------------------------
+
+def _as_float(values):
+    # Kolom string CSV atau array Parquet -> float; sel kosong/tidak valid menjadi NaN
+    if isinstance(values, np.ndarray) and values.dtype.kind in "fiub":
+        return values.astype(float)
+    try:
+        # Jalur cepat: semua sel angka valid (konversi string -> float di C)
+        return np.array(values, dtype=float)
+    except (TypeError, ValueError):
+        pass
+    result = np.empty(len(values))
+    for i, value in enumerate(values):
+        try:
+            result[i] = float(value) if value not in (None, "") else np.nan
+        except (TypeError, ValueError):
+            result[i] = np.nan
+    return result
+
+
+def result_fields(engine, profiles):
+    """
+    Kolom hasil engine: RESULT_FIELDS ditambah OPTIONAL_FIELDS yang dihasilkannya
+    (dicek sekali dengan satu target contoh), supaya semua chunk punya kolom yang sama
+    """
+    key = (engine, id(profiles))
+    if key not in _fields:
+        profile = next(iter(profiles.values()))
+        probe = engine(profile, np.array([15.0]), np.array([20.0]), np.array([30.0]), np.array([2.0]),
+                       snr_target=np.array([10.0]))
+        _fields[key] = etc_batch.RESULT_FIELDS + tuple(name for name in etc_batch.OPTIONAL_FIELDS if name in probe)
+    return _fields[key]
+
+
+def evaluate_columns(columns, profiles, engine=etc_engine.evaluate, defaults=None):
+    """
+    Hasil satu chunk: kolom input (kecuali yang ditimpa hasil) ditambah RESULT_FIELDS dan error.
+    defaults mengisi kolom input yang tidak ada di katalog (mis. filter, snr, fwhm).
+    Baris tidak valid mendapat pesan di kolom error dan hasil NaN.
+    """
+    import throughput
+
+    defaults = defaults or {}
+    n = len(next(iter(columns.values())))
+
+    def column(name):
+        if name in columns:
+            return columns[name]
+        return [defaults.get(name)] * n
+
+    values = {name: _as_float(column(name)) for name in NUMERIC_INPUTS}
+    filters = np.asarray([str(value) if value not in (None, "") else "" for value in column("filter")])
+    errors = np.full(n, "", dtype=object)
+
+    for name in etc_batch.TARGET_FIELDS:
+        errors[(errors == "") & ~np.isfinite(values[name])] = f"Field {name} tidak ada atau tidak valid"
+    by_snr = np.isfinite(values["snr"])
+    by_exposure = np.isfinite(values["exposure_time"])
+    errors[(errors == "") & (by_snr == by_exposure)] = "Isi salah satu dari snr atau exposure_time"
+    known = np.isin(filters, list(profiles))
+    errors[(errors == "") & ~known] = "Filter tidak dikenal"
+
+    fields = result_fields(engine, profiles)
+    results = {}
+    valid = errors == ""
+    for filter_name in np.unique(filters[valid]).tolist():
+        profile = profiles[filter_name]
+        in_filter = valid & (filters == filter_name)
+        magnitude = values["magnitude"].copy()
+        colored = in_filter & np.isfinite(values["temperature"])
+        if colored.any():
+            try:
+                magnitude[colored] += throughput.color_offset(
+                    profile, values["temperature"][colored], values["zenith_distance"][colored]
+                )
+            except ValueError as e:
+                errors[colored] = str(e)
+                in_filter &= ~colored
+        for mode, rows in (("snr_target", in_filter & by_snr), ("exposure_time", in_filter & ~by_snr)):
+            if not rows.any():
+                continue
+            given = values["snr" if mode == "snr_target" else "exposure_time"][rows]
+            evaluated = engine(
+                profile, magnitude[rows], values["sky_brightness"][rows], values["zenith_distance"][rows],
+                values["fwhm"][rows], **{mode: given},
+            )
+            for name in fields:
+                column_values = np.asarray(evaluated[name])
+                if name not in results:
+                    # Kolom boolean (mis. saturated) disimpan sebagai object agar baris error bisa kosong
+                    results[name] = (
+                        np.full(n, None, dtype=object) if column_values.dtype == bool else np.full(n, np.nan)
+                    )
+                results[name][rows] = column_values
+
+    output = {name: data for name, data in columns.items() if name not in OUTPUT_FIELDS}
+    for name in fields:
+        output[name] = results[name] if name in results else np.full(n, np.nan)
+    output["error"] = errors
+    return output
+
+
+# Penulisan hasil ----------------------------------------------------------------------------
+
+def encode_csv(columns, header=False):
+    """
+    Satu chunk hasil sebagai bytes CSV; NaN dan None menjadi sel kosong
+    """
+    # csv.writer menulis float dengan repr dan None sebagai sel kosong
+    cells = []
+    for values in columns.values():
+        if isinstance(values, np.ndarray) and values.dtype.kind == "f":
+            missing = np.isnan(values)
+            values = values.tolist()
+            for i in np.flatnonzero(missing).tolist():
+                values[i] = None
+        elif isinstance(values, np.ndarray):
+            values = values.tolist()
+        cells.append(values)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(list(columns))
+    writer.writerows(zip(*cells))
+    return buffer.getvalue().encode("utf-8")
+
+
+def part_path(directory, index):
+    return os.path.join(directory, f"part-{index:05d}.parquet")
+
+
+def write_part(directory, index, columns):
+    """
+    Satu chunk hasil sebagai file part-NNNNN.parquet di direktori output
+    """
+    pa = _pyarrow()
+    table = pa.table({
+        name: pa.array(values.tolist() if getattr(values, "dtype", None) == object else values)
+        for name, values in columns.items()
+    })
+    path = part_path(directory, index)
+    pa.parquet.write_table(table, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+
+def _init_worker(profiles, engine, defaults, output_format, output_path):
+    _worker.update(
+        profiles=profiles, engine=engine, defaults=defaults, output_format=output_format, output_path=output_path
+    )
+
+
+def process_chunk(index, columns):
+    """
+    Dijalankan di worker: hitung satu chunk lalu encode (CSV) atau tulis langsung sebagai part (Parquet),
+    sehingga proses utama hanya menyambung bytes berurutan. Hasil: (bytes CSV atau None, baris, error)
+    """
+    result = evaluate_columns(columns, _worker["profiles"], _worker["engine"], _worker["defaults"])
+    errors = int(np.count_nonzero(result["error"] != ""))
+    if _worker["output_format"] == "csv":
+        return encode_csv(result, header=index == 0), len(result["error"]), errors
+    write_part(_worker["output_path"], index, result)
+    return None, len(result["error"]), errors
+
+
+# Checkpoint ---------------------------------------------------------------------------------
+
+def load_checkpoint(path, expected):
+    """
+    Isi checkpoint, ValueError jika dibuat untuk input/output/chunk size yang berbeda
+    """
+    with open(path, encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    for name, value in expected.items():
+        if checkpoint.get(name) != value:
+            raise ValueError(f"Checkpoint {path} dibuat untuk {name}={checkpoint.get(name)!r}, bukan {value!r}")
+    return checkpoint
+
+
+def save_checkpoint(path, checkpoint):
+    # Tulis ke file sementara lalu rename: checkpoint tidak pernah setengah jadi
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(path + ".tmp", path)
+
+
+def run(input_path, output_path, profiles, engine=etc_engine.evaluate, defaults=None, chunk_size=CHUNK_SIZE,
+        workers=None, input_format=None, output_format=None, checkpoint_path=None, resume=False,
+        progress=None):
+    """
+    Hitung seluruh katalog dan tulis hasil berurutan. Mengembalikan ringkasan (chunk, baris, error).
+    progress(info) dipanggil setelah setiap chunk ditulis.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+
+    defaults = defaults or {}
+    input_format = file_format(input_path, input_format)
+    output_format = file_format(output_path, output_format)
+    checkpoint_path = checkpoint_path or output_path.rstrip("/") + CHECKPOINT_SUFFIX
+    identity = {"input": os.path.abspath(input_path), "output": os.path.abspath(output_path), "chunk_size": chunk_size}
+
+    checkpoint = {**identity, "chunks": 0, "rows": 0, "errors": 0, "input_offset": 0, "output_position": 0}
+    if resume and os.path.exists(checkpoint_path):
+        checkpoint = load_checkpoint(checkpoint_path, identity)
+
+    if input_format == "csv":
+        chunks = read_csv_chunks(input_path, chunk_size, checkpoint["input_offset"])
+    else:
+        chunks = read_parquet_chunks(input_path, chunk_size, checkpoint["chunks"])
+    # Output dikembalikan ke keadaan checkpoint: CSV dipotong, part Parquet yang belum tercatat dihapus
+    if output_format == "csv":
+        output = open(output_path, "r+b" if checkpoint["chunks"] else "wb")
+        output.truncate(checkpoint["output_position"])
+        output.seek(checkpoint["output_position"])
+    else:
+        _pyarrow()
+        output = None
+        os.makedirs(output_path, exist_ok=True)
+        for name in os.listdir(output_path):
+            if name.startswith("part-") and name[5:10].isdigit() and int(name[5:10]) >= checkpoint["chunks"]:
+                os.remove(os.path.join(output_path, name))
+
+    started = time.monotonic()
+    rows_at_start = checkpoint["rows"]
+
+    def finish(result, position, total):
+        payload, rows, errors = result
+        if output is not None:
+            output.write(payload)
+            output.flush()
+            checkpoint["output_position"] = output.tell()
+        checkpoint["chunks"] += 1
+        checkpoint["rows"] += rows
+        checkpoint["errors"] += errors
+        if input_format == "csv":
+            checkpoint["input_offset"] = position
+        save_checkpoint(checkpoint_path, checkpoint)
+        if progress is not None:
+            elapsed = time.monotonic() - started
+            progress({
+                "chunks": checkpoint["chunks"], "rows": checkpoint["rows"], "errors": checkpoint["errors"],
+                "fraction": position / total if total else None,
+                "rows_per_second": (checkpoint["rows"] - rows_at_start) / elapsed if elapsed > 0 else None,
+            })
+
+    workers = workers or os.cpu_count() or 1
+    state = (profiles, engine, defaults, output_format, output_path)
+    try:
+        if workers == 1:
+            _init_worker(*state)
+            for index, (columns, position, total) in enumerate(chunks, checkpoint["chunks"]):
+                finish(process_chunk(index, columns), position, total)
+        else:
+            # Maksimal 2 x workers chunk di pool; hasil diambil urut dari depan antrean,
+            # jadi output berurutan dan memori dibatasi
+            with ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker, initargs=state,
+            ) as pool:
+                pending = deque()
+                for index, (columns, position, total) in enumerate(chunks, checkpoint["chunks"]):
+                    if len(pending) >= 2 * workers:
+                        future, done_position, done_total = pending.popleft()
+                        finish(future.result(), done_position, done_total)
+                    pending.append((pool.submit(process_chunk, index, columns), position, total))
+                while pending:
+                    future, done_position, done_total = pending.popleft()
+                    finish(future.result(), done_position, done_total)
+    finally:
+        if output is not None:
+            output.close()
+    return {name: checkpoint[name] for name in ("chunks", "rows", "errors")}
+
+
+def main(argv=None):
+    import instrument_profiles
+    import lco_engine
+
+    parser = argparse.ArgumentParser(description="ETC batch offline untuk katalog target CSV/Parquet")
+    parser.add_argument("input", help="katalog CSV atau Parquet (kolom magnitude, filter, sky_brightness, ...)")
+    parser.add_argument("output", help="hasil CSV atau direktori Parquet")
+    parser.add_argument("--telescope", required=True)
+    parser.add_argument("--ccd", required=True)
+    parser.add_argument("--config", default="instruments.json")
+    parser.add_argument("--calibration", default="calibration.json", help="hasil Perhitungan_Zeropoint.py (dilewati jika tidak ada)")
+    parser.add_argument("--engine", choices=sorted(lco_engine.ENGINES), default="imam")
+    parser.add_argument("--input-format", choices=FORMATS)
+    parser.add_argument("--output-format", choices=FORMATS)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--checkpoint", help=f"file checkpoint (default <output>{CHECKPOINT_SUFFIX})")
+    parser.add_argument("--resume", action="store_true", help="lanjutkan dari checkpoint")
+    parser.add_argument("--quiet", action="store_true", help="tanpa laporan progress")
+    # Default untuk kolom yang tidak ada di katalog
+    parser.add_argument("--filter")
+    parser.add_argument("--snr", type=float)
+    parser.add_argument("--exposure-time", type=float)
+    parser.add_argument("--sky-brightness", type=float)
+    parser.add_argument("--zenith-distance", type=float)
+    parser.add_argument("--fwhm", type=float)
+    args = parser.parse_args(argv)
+
+    profiles = instrument_profiles.ProfileRegistry(args.config, calibration_path=args.calibration).profiles()
+    combination = {key[2]: profile for key, profile in profiles.items() if key[:2] == (args.telescope, args.ccd)}
+    if not combination:
+        try:
+            combination = lco_engine.for_combination(args.telescope, args.ccd)
+        except KeyError as e:
+            parser.error(e.args[0])
+        if os.path.exists(args.calibration):
+            # Instrumen LCO: zeropoint acuan X=1 seperti Las_cumbres.py
+            calibrated = instrument_profiles.apply_calibration(
+                {profile.key: profile for profile in combination.values()},
+                instrument_profiles.load_config(args.calibration), reference_airmass=1.0,
+            )
+            combination = {key[2]: profile for key, profile in calibrated.items()}
+    defaults = {
+        name: value for name, value in (
+            ("filter", args.filter), ("snr", args.snr), ("exposure_time", args.exposure_time),
+            ("sky_brightness", args.sky_brightness), ("zenith_distance", args.zenith_distance), ("fwhm", args.fwhm),
+        ) if value is not None
+    }
+
+    def report(info):
+        fraction = f" {info['fraction']:.1%}" if info["fraction"] is not None else ""
+        speed = f" {info['rows_per_second']:,.0f} baris/s" if info["rows_per_second"] else ""
+        sys.stderr.write(
+            f"\rchunk {info['chunks']}{fraction}: {info['rows']:,} baris, {info['errors']:,} error{speed}   "
+        )
+        sys.stderr.flush()
+
+    try:
+        summary = run(
+            args.input, args.output, combination, engine=lco_engine.get_engine(args.engine), defaults=defaults,
+            chunk_size=args.chunk_size, workers=args.workers, input_format=args.input_format,
+            output_format=args.output_format, checkpoint_path=args.checkpoint, resume=args.resume,
+            progress=None if args.quiet else report,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    if not args.quiet:
+        sys.stderr.write("\n")
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import numpy as np
+
+import aperture_model
+
+# Engine ETC berbasis NumPy.
+# Semua fungsi menerima scalar atau array (magnitude, exposure time, SNR target,
+# zenith distance, FWHM, sky brightness) dan di-broadcast terhadap satu instrumen
+# (InstrumentProfile dari instrument_profiles.py),
+# jadi ribuan target cukup dihitung dalam satu panggilan.
+# Rumus mengikuti endpoint /calculate_exposure di main2_24_march.py.
+
+
+def airmass_from_zenith(zenith_distance):
+    """
+    Airmass plan-parallel (sec z), zenith distance dalam derajat
+    """
+    return 1 / np.cos(np.radians(zenith_distance))
+
+
+def calculate_pixels_in_aperture(fwhm, pixel_scale):
+    """
+    Versi array dari calculate_pixels_in_aperture: radius 1.5 × FWHM, dibatasi 9-100 piksel
+    """
+    radius_pixels = 1.5 * (np.asarray(fwhm, dtype=float) / pixel_scale)
+    area_pixels = np.pi * radius_pixels ** 2
+    return np.clip(np.round(area_pixels), 9, 100)
+
+
+def calculate_signal(magnitude, zeropoint, extinction, aperture_area, quantum_efficiency):
+    """
+    Signal bintang dalam elektron/detik
+    """
+    flux = 10 ** (-0.4 * (np.asarray(magnitude, dtype=float) + extinction - zeropoint))
+    return flux * aperture_area * quantum_efficiency
+
+
+def calculate_sky_signal(sky_brightness, zeropoint, aperture_area, quantum_efficiency, num_pixels):
+    """
+    Signal langit dalam elektron/detik/piksel
+    """
+    flux_sky = 10 ** (-0.4 * (np.asarray(sky_brightness, dtype=float) - zeropoint))
+    return flux_sky * aperture_area * quantum_efficiency / num_pixels
+
+
+def calculate_noise(signal_star, signal_sky, read_noise, dark_current, num_pixels, exposure_time):
+    """
+    Rincian noise (dalam elektron) untuk exposure time tertentu.
+    Variansi bintang, langit, dark dan read noise dijumlahkan lalu diakar.
+    """
+    exposure_time = np.asarray(exposure_time, dtype=float)
+    signal = signal_star * exposure_time
+    variance_sky = signal_sky * num_pixels * exposure_time
+    variance_dark = dark_current * num_pixels * exposure_time
+    variance_read = read_noise ** 2 * num_pixels
+    total_noise = np.sqrt(signal + variance_sky + variance_dark + variance_read)
+    return {
+        "signal": signal,
+        "noise_star": np.sqrt(signal),
+        "noise_sky": np.sqrt(variance_sky),
+        "noise_dark": np.sqrt(variance_dark),
+        "noise_read": np.sqrt(variance_read),
+        "total_noise": total_noise,
+        "snr": signal / total_noise,
+    }
+
+
+def calculate_snr(signal_star, signal_sky, read_noise, dark_current, num_pixels, exposure_time):
+    """
+    SNR untuk exposure time tertentu
+    """
+    return calculate_noise(signal_star, signal_sky, read_noise, dark_current, num_pixels, exposure_time)["snr"]
+
+
+def calculate_snr_legacy(signal_star, signal_sky, read_noise, dark_current, num_pixels, exposure_time):
+    """
+    SNR versi calculate_snr_and_exposure_logic: noise sky, read dan dark
+    masuk sebagai suku yang sudah diakar di dalam akar total noise
+    """
+    exposure_time = np.asarray(exposure_time, dtype=float)
+    signal = signal_star * exposure_time
+    noise_sky = np.sqrt(signal_sky * num_pixels * exposure_time)
+    noise_read = np.sqrt(num_pixels) * read_noise
+    noise_dark = np.sqrt(num_pixels * dark_current * exposure_time)
+    return signal / np.sqrt(signal + noise_sky + noise_read + noise_dark)
+
+
+def calculate_exposure_time(signal_star, signal_sky, read_noise, dark_current, num_pixels, snr_target):
+    """
+    Exposure time untuk mencapai snr_target, formula kuadrat dari Naskah Imam:
+    A t² + B t + C = 0
+    """
+    snr_target = np.asarray(snr_target, dtype=float)
+    A = signal_star ** 2
+    B = -(snr_target ** 2) * (signal_star + signal_sky * num_pixels + dark_current * num_pixels)
+    C = -(snr_target ** 2) * (read_noise ** 2 * num_pixels)
+    # C <= 0 dan A > 0, jadi diskriminan tidak pernah negatif
+    discriminant = B ** 2 - 4 * A * C
+    return (-B + np.sqrt(discriminant)) / (2 * A)
+
+
+def calculate_limiting_signal(signal_sky, read_noise, dark_current, num_pixels, exposure_time, snr_target):
+    """
+    Signal bintang (elektron/detik) yang tepat mencapai snr_target dalam exposure_time.
+    Dari (S t)² = SNR² (S t + V_bg), diselesaikan untuk S t.
+    """
+    exposure_time = np.asarray(exposure_time, dtype=float)
+    snr2 = np.asarray(snr_target, dtype=float) ** 2
+    variance_background = (signal_sky + dark_current) * num_pixels * exposure_time + read_noise ** 2 * num_pixels
+    signal = (snr2 + np.sqrt(snr2 ** 2 + 4 * snr2 * variance_background)) / 2
+    return signal / exposure_time
+
+
+def _finish(result, **extra):
+    # Gabungkan kolom tambahan lalu broadcast semua kolom ke shape yang sama
+    result.update(extra)
+    keys = list(result)
+    return dict(zip(keys, np.broadcast_arrays(*(result[key] for key in keys))))
+
+
+def evaluate(instrument, magnitude, sky_brightness, zenith_distance, fwhm, snr_target=None, exposure_time=None,
+             psf=None, aperture_radius=1.5):
+    """
+    Menghitung SNR / exposure time beserta rincian noise untuk array target.
+    Isi salah satu dari snr_target (hasil: exposure time) atau exposure_time (hasil: SNR).
+    psf ("gaussian"/"moffat") memakai aperture_model: jumlah piksel nyata untuk radius
+    aperture_radius x FWHM dan hanya fraksi flux di dalam aperture yang dihitung.
+    Tanpa psf dipakai aturan lama (9-100 piksel, seluruh flux).
+    Semua input di-broadcast, output berupa dict berisi array dengan shape yang sama.
+    """
+    if (snr_target is None) == (exposure_time is None):
+        raise ValueError("Isi salah satu dari snr_target atau exposure_time")
+
+    extinction = instrument.extinction_coefficient * airmass_from_zenith(zenith_distance)
+    signal_star = calculate_signal(
+        magnitude, instrument.zeropoint, extinction,
+        instrument.aperture_area, instrument.quantum_efficiency,
+    )
+    if psf is None:
+        num_pixels = calculate_pixels_in_aperture(fwhm, instrument.pixel_scale)
+    else:
+        fwhm_pixels = np.asarray(fwhm, dtype=float) / instrument.pixel_scale
+        radius = np.asarray(aperture_radius, dtype=float) * fwhm_pixels
+        num_pixels = aperture_model.pixels_in_aperture(radius)
+        signal_star = signal_star * aperture_model.encircled_energy(fwhm_pixels, radius, psf)
+    signal_sky = calculate_sky_signal(
+        sky_brightness, instrument.zeropoint,
+        instrument.aperture_area, instrument.quantum_efficiency, num_pixels,
+    )
+
+    if snr_target is not None:
+        exposure_time = calculate_exposure_time(
+            signal_star, signal_sky, instrument.read_noise, instrument.dark_current, num_pixels, snr_target
+        )
+
+    result = calculate_noise(
+        signal_star, signal_sky, instrument.read_noise, instrument.dark_current, num_pixels, exposure_time
+    )
+    return _finish(
+        result,
+        exposure_time=np.asarray(exposure_time, dtype=float),
+        signal_star=signal_star,
+        signal_sky=signal_sky,
+        num_pixels=num_pixels,
+        extinction=extinction,
+    )
+
+
+def evaluate_limiting_magnitude(instrument, sky_brightness, zenith_distance, fwhm, snr_target, exposure_time):
+    """
+    Mode kebalikan: magnitude paling redup yang mencapai snr_target dalam exposure_time
+    (setara result = 'm' di ETC.calculate_sme LCO, tapi tanpa loop 0.1 mag)
+    """
+    extinction = instrument.extinction_coefficient * airmass_from_zenith(zenith_distance)
+    num_pixels = calculate_pixels_in_aperture(fwhm, instrument.pixel_scale)
+    signal_sky = calculate_sky_signal(
+        sky_brightness, instrument.zeropoint,
+        instrument.aperture_area, instrument.quantum_efficiency, num_pixels,
+    )
+
+    signal_star = calculate_limiting_signal(
+        signal_sky, instrument.read_noise, instrument.dark_current, num_pixels, exposure_time, snr_target
+    )
+    magnitude = (
+        instrument.zeropoint - extinction
+        - 2.5 * np.log10(signal_star / (instrument.aperture_area * instrument.quantum_efficiency))
+    )
+
+    result = calculate_noise(
+        signal_star, signal_sky, instrument.read_noise, instrument.dark_current, num_pixels, exposure_time
+    )
+    return _finish(
+        result,
+        magnitude=magnitude,
+        exposure_time=np.asarray(exposure_time, dtype=float),
+        signal_star=signal_star,
+        signal_sky=signal_sky,
+        num_pixels=num_pixels,
+        extinction=extinction,
+    )
@@ -0,0 +1,237 @@
+import asyncio
+import math
+
+import numpy as np
+
+import etc_engine
+
+# Perhitungan ulang live per sesi WebSocket: input form dan besaran antara (profil instrumen,
+# airmass, ekstingsi, jumlah piksel, signal bintang/langit) disimpan per sesi sebagai graf
+# dependensi. Jika satu input berubah hanya node yang bergantung padanya yang dihitung ulang,
+# dan ke client hanya dikirim kolom hasil yang berubah (delta). Rumus sama dengan etc_engine.evaluate.
+
+DEBOUNCE = 0.05  # detik: update yang datang dalam jendela ini digabung menjadi satu perhitungan
+MODES = ("exposure", "snr", "limiting_magnitude")
+NUMERIC_INPUTS = ("magnitude", "sky_brightness", "zenith_distance", "fwhm", "snr", "exposure_time")
+TEXT_INPUTS = ("telescope", "ccd", "filter", "mode")
+
+# node: (dependensi, fungsi); argumen fungsi berurutan sesuai dependensi
+NODES = {
+    "airmass": (("zenith_distance",), etc_engine.airmass_from_zenith),
+    "extinction": (("profile", "airmass"), lambda profile, airmass: profile.extinction_coefficient * airmass),
+    "num_pixels": (
+        ("profile", "fwhm"), lambda profile, fwhm: etc_engine.calculate_pixels_in_aperture(fwhm, profile.pixel_scale),
+    ),
+    "signal_star": (
+        ("profile", "magnitude", "extinction"),
+        lambda profile, magnitude, extinction: etc_engine.calculate_signal(
+            magnitude, profile.zeropoint, extinction, profile.aperture_area, profile.quantum_efficiency
+        ),
+    ),
+    "signal_sky": (
+        ("profile", "sky_brightness", "num_pixels"),
+        lambda profile, sky_brightness, num_pixels: etc_engine.calculate_sky_signal(
+            sky_brightness, profile.zeropoint, profile.aperture_area, profile.quantum_efficiency, num_pixels
+        ),
+    ),
+}
+RESULT_DEPENDENCIES = {
+    "exposure": ("profile", "signal_star", "signal_sky", "num_pixels", "snr"),
+    "snr": ("profile", "signal_star", "signal_sky", "num_pixels", "exposure_time"),
+    "limiting_magnitude": ("profile", "extinction", "signal_sky", "num_pixels", "snr", "exposure_time"),
+}
+
+
+def _dependents():
+    # Kebalikan graf: input/node -> node yang harus dihitung ulang jika berubah
+    reverse = {}
+    for name, (dependencies, _) in NODES.items():
+        for dependency in dependencies:
+            reverse.setdefault(dependency, set()).add(name)
+    for dependency in ("telescope", "ccd", "filter"):
+        reverse.setdefault(dependency, set()).add("profile")
+    return reverse
+
+
+DEPENDENTS = _dependents()
+
+
+def parse_update(message):
+    """
+    Pesan client (object JSON) -> dict input tervalidasi; ValueError jika ada nilai tidak valid.
+    Field yang tidak dikenal (mis. field form lain) diabaikan.
+    """
+    if not isinstance(message, dict):
+        raise ValueError("Pesan harus berupa object")
+    update = {}
+    for name, value in message.items():
+        if name not in NUMERIC_INPUTS and name not in TEXT_INPUTS:
+            continue
+        if name in NUMERIC_INPUTS:
+            if value is None or value == "":
+                update[name] = None
+                continue
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Field {name} tidak ada atau tidak valid") from None
+            if not math.isfinite(value):
+                raise ValueError(f"Field {name} tidak ada atau tidak valid")
+            update[name] = value
+        else:
+            if name == "mode" and value not in MODES:
+                raise ValueError(f"mode harus salah satu dari {', '.join(MODES)}")
+            update[name] = None if value in (None, "") else str(value)
+    return update
+
+
+class LiveSession:
+    """
+    State satu sesi: input, nilai node yang masih valid dan hasil terakhir yang dikirim.
+    registry: ProfileRegistry (get dan generation); profil di-resolve ulang jika registry dimuat ulang.
+    """
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.inputs = {"mode": "exposure"}
+        self.values = {}
+        self.sent = {}
+        self.generation = None
+        self.recomputed = []
+
+    def _invalidate(self, name):
+        for dependent in DEPENDENTS.get(name, ()):
+            self.values.pop(dependent, None)
+            self._invalidate(dependent)
+
+    def _get(self, name):
+        if name in self.values:
+            return self.values[name]
+        if name == "profile":
+            missing = [field for field in ("telescope", "ccd", "filter") if self.inputs.get(field) is None]
+            if missing:
+                raise ValueError(f"Field {missing[0]} tidak ada atau tidak valid")
+            value = self.registry.get(self.inputs["telescope"], self.inputs["ccd"], self.inputs["filter"])
+        elif name in NODES:
+            dependencies, function = NODES[name]
+            value = function(*(self._get(dependency) for dependency in dependencies))
+        else:
+            value = self.inputs.get(name)
+            if value is None:
+                raise ValueError(f"Field {name} tidak ada atau tidak valid")
+            return value
+        self.values[name] = value
+        self.recomputed.append(name)
+        return value
+
+    def _result(self):
+        mode = self.inputs["mode"]
+        profile, *values = (self._get(name) for name in RESULT_DEPENDENCIES[mode])
+        result = {}
+        if mode == "exposure":
+            signal_star, signal_sky, num_pixels, snr = values
+            exposure_time = etc_engine.calculate_exposure_time(
+                signal_star, signal_sky, profile.read_noise, profile.dark_current, num_pixels, snr
+            )
+        elif mode == "snr":
+            signal_star, signal_sky, num_pixels, exposure_time = values
+        else:
+            extinction, signal_sky, num_pixels, snr, exposure_time = values
+            signal_star = etc_engine.calculate_limiting_signal(
+                signal_sky, profile.read_noise, profile.dark_current, num_pixels, exposure_time, snr
+            )
+            result["magnitude"] = (
+                profile.zeropoint - extinction
+                - 2.5 * np.log10(signal_star / (profile.aperture_area * profile.quantum_efficiency))
+            )
+        result.update(etc_engine.calculate_noise(
+            signal_star, signal_sky, profile.read_noise, profile.dark_current, num_pixels, exposure_time
+        ))
+        result.update(exposure_time=exposure_time, signal_star=signal_star, signal_sky=signal_sky, num_pixels=num_pixels)
+        return {name: float(value) for name, value in result.items()}
+
+    def update(self, update):
+        """
+        Terapkan input yang berubah lalu hitung ulang node yang terdampak.
+        Hasil: {"changed": kolom hasil yang berubah, "recomputed": node yang dihitung ulang}
+        atau {"error": pesan} jika input belum lengkap/tidak valid.
+        """
+        generation = self.registry.generation
+        if generation != self.generation:
+            # Config/kalibrasi dimuat ulang: profil dan semua turunannya dihitung ulang
+            self.generation = generation
+            self.values.pop("profile", None)
+            self._invalidate("profile")
+        for name, value in update.items():
+            if self.inputs.get(name) != value:
+                self.inputs[name] = value
+                self._invalidate(name)
+        self.recomputed = []
+        try:
+            result = self._result()
+        except KeyError as e:
+            return {"error": e.args[0], "recomputed": self.recomputed}
+        except ValueError as e:
+            return {"error": str(e), "recomputed": self.recomputed}
+        if self.sent.get("mode") != self.inputs["mode"]:
+            # Kolom hasil berbeda per mode: kirim lengkap
+            self.sent = {"mode": self.inputs["mode"]}
+        changed = {name: value for name, value in result.items() if self.sent.get(name) != value}
+        self.sent.update(changed)
+        return {"mode": self.inputs["mode"], "changed": changed, "recomputed": self.recomputed}
+
+
+async def serve(websocket, registry, debounce=DEBOUNCE):
+    """
+    Loop satu koneksi: pesan dibaca oleh task terpisah ke antrean, update yang datang dalam
+    jendela debounce digabung lalu dihitung sekali dan delta hasilnya dikirim
+    """
+    from starlette.websockets import WebSocketDisconnect
+
+    await websocket.accept()
+    session = LiveSession(registry)
+    messages = asyncio.Queue()
+
+    async def read():
+        try:
+            while True:
+                await messages.put(await websocket.receive_json())
+        except (WebSocketDisconnect, ValueError):
+            pass
+        finally:
+            await messages.put(None)
+
+    reader = asyncio.create_task(read())
+    try:
+        while True:
+            message = await messages.get()
+            if message is None:
+                return
+            await asyncio.sleep(debounce)
+            batch = [message]
+            while not messages.empty():
+                batch.append(messages.get_nowait())
+            closed = batch[-1] is None
+            update, seq, error = {}, None, None
+            for item in batch:
+                if item is None:
+                    continue
+                try:
+                    update.update(parse_update(item))
+                except ValueError as e:
+                    error = str(e)
+                if isinstance(item, dict) and "seq" in item:
+                    seq = item["seq"]
+            # Pesan valid lain dalam batch tetap diterapkan; error validasi dikirim bersama hasilnya
+            reply = session.update(update)
+            if error is not None:
+                reply["error"] = error
+            reply["seq"] = seq
+            reply["coalesced"] = len([item for item in batch if item is not None])
+            await websocket.send_json(reply)
+            if closed:
+                return
+    except WebSocketDisconnect:
+        pass
+    finally:
+        reader.cancel()
@@ -0,0 +1,88 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+
+# Logging untuk app ETC: level bisa diatur, log DEBUG di-sampling, dan penulisan
+# ke stdout dilakukan thread QueueListener sehingga handler async tidak ikut
+# menunggu terminal/pipe log.
+
+DEFAULT_LEVEL = os.environ.get("ETC_LOG_LEVEL", "INFO")
+DEFAULT_SAMPLE_RATE = float(os.environ.get("ETC_LOG_SAMPLE_RATE", "0.01"))
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Meloloskan hanya sebagian log DEBUG (sample_rate), level INFO ke atas selalu lolos
+    """
+
+    def __init__(self, sample_rate):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        return random.random() < self.sample_rate
+
+
+class KeyValueFormatter(logging.Formatter):
+    """
+    Format log terstruktur: pesan diikuti field key=value dari extra={"fields": {...}}
+    """
+
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{key}={_format_value(value)}" for key, value in fields.items())
+        return line
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    return str(value)
+
+
+_listener = None
+_settings = None
+
+
+def setup_logging(level=DEFAULT_LEVEL, sample_rate=DEFAULT_SAMPLE_RATE):
+    """
+    Pasang handler root: QueueHandler (non-blocking) -> QueueListener -> stdout
+    """
+    global _listener, _settings
+    if _listener is not None:
+        return
+    _settings = (level, sample_rate)
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(KeyValueFormatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def restart_after_fork():
+    """
+    Dipanggil di proses anak setelah fork (gunicorn post_fork): thread listener
+    milik proses induk tidak ada di anak, jadi queue dan listener dibuat ulang
+    """
+    global _listener
+    if _listener is None:
+        return
+    _listener = None
+    setup_logging(*_settings)
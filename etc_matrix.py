@@ -0,0 +1,156 @@
+import numpy as np
+
+import etc_engine
+import etc_stacking
+
+# Matriks perbandingan instrumen: satu target (atau daftar target) dihitung untuk semua
+# kombinasi (teleskop, CCD, filter) sekaligus. Parameter profil ditumpuk menjadi kolom
+# array [setup, 1] dan input target menjadi baris [1, target], sehingga etc_engine.evaluate
+# (tanpa perubahan) mem-broadcast semuanya menjadi satu operasi array [setup, target].
+# Per target, setup diurutkan: exposure time terpendek (mode snr) atau SNR tertinggi
+# (mode exposure_time), setup yang jenuh ditaruh paling belakang.
+
+STACK_FIELDS = (
+    "zeropoint", "extinction_coefficient", "aperture_area", "quantum_efficiency",
+    "pixel_scale", "read_noise", "dark_current", "saturation_level",
+)
+TARGET_FIELDS = ("magnitude", "sky_brightness", "zenith_distance", "fwhm")
+RESULT_FIELDS = ("exposure_time", "snr", "signal_star", "signal_sky", "num_pixels", "saturation_time")
+MAX_TARGETS = 10000
+DEFAULT_TOP = 10
+
+
+class ProfileStack:
+    """
+    Parameter banyak profil sebagai kolom array [setup, 1], dipakai sebagai instrument etc_engine
+    """
+
+    def __init__(self, profiles):
+        self.keys = [profile.key for profile in profiles]
+        for name in STACK_FIELDS:
+            setattr(self, name, np.array([float(getattr(profile, name)) for profile in profiles])[:, None])
+
+    def __len__(self):
+        return len(self.keys)
+
+
+def stack_profiles(profiles, telescopes=None, ccds=None, filters=None):
+    """
+    ProfileStack dari {(teleskop, CCD, filter): profil}, opsional dibatasi daftar teleskop/CCD/filter
+    """
+    selected = [
+        profile for key, profile in sorted(profiles.items())
+        if (telescopes is None or key[0] in telescopes)
+        and (ccds is None or key[1] in ccds)
+        and (filters is None or key[2] in filters)
+    ]
+    if not selected:
+        raise ValueError("Tidak ada kombinasi teleskop, CCD dan filter yang cocok")
+    return ProfileStack(selected)
+
+
+def parse_targets(raw_targets, snr=None, exposure_time=None):
+    """
+    Daftar target -> dict kolom. Setiap target: magnitude, sky_brightness, zenith_distance, fwhm,
+    opsional id dan snr atau exposure_time (default dari argumen, berlaku untuk semua target)
+    """
+    if isinstance(raw_targets, dict):
+        raw_targets = [raw_targets]
+    if not isinstance(raw_targets, list) or not raw_targets:
+        raise ValueError("targets harus berupa object atau array target")
+    if len(raw_targets) > MAX_TARGETS:
+        raise ValueError(f"Maksimal {MAX_TARGETS} target per request")
+    columns = {name: [] for name in TARGET_FIELDS + ("snr", "exposure_time", "id")}
+    for index, target in enumerate(raw_targets):
+        try:
+            for name in TARGET_FIELDS:
+                columns[name].append(float(target[name]))
+            target_snr = target.get("snr", snr)
+            target_exposure = target.get("exposure_time", exposure_time)
+            if (target_snr is None) == (target_exposure is None):
+                raise ValueError("isi salah satu dari snr atau exposure_time")
+            columns["snr"].append(np.nan if target_snr is None else float(target_snr))
+            columns["exposure_time"].append(np.nan if target_exposure is None else float(target_exposure))
+            columns["id"].append(target.get("id", index))
+        except KeyError as e:
+            raise ValueError(f"Target {index}: field {e.args[0]} tidak ada atau tidak valid") from None
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Target {index} tidak valid: {e}") from None
+    ids = columns.pop("id")
+    parsed = {name: np.array(values, dtype=float) for name, values in columns.items()}
+    parsed["id"] = ids
+    return parsed
+
+
+def evaluate_matrix(stack, targets):
+    """
+    Semua setup x semua target dalam satu broadcast: dict kolom array [setup, target].
+    Target mode snr (exposure time dicari) dan mode exposure_time (SNR dicari) dihitung
+    masing-masing satu kali evaluate.
+    """
+    shape = (len(stack), len(targets["magnitude"]))
+    result = {name: np.full(shape, np.nan) for name in RESULT_FIELDS}
+    by_snr = np.isfinite(targets["snr"])
+    for mode, columns in (("snr_target", by_snr), ("exposure_time", ~by_snr)):
+        if not columns.any():
+            continue
+        rows = {name: targets[name][columns][None, :] for name in TARGET_FIELDS}
+        given = targets["snr" if mode == "snr_target" else "exposure_time"][columns][None, :]
+        evaluated = etc_engine.evaluate(stack, **rows, **{mode: given})
+        evaluated["saturation_time"] = etc_stacking.saturation_time(
+            stack, rows["magnitude"], rows["sky_brightness"], rows["zenith_distance"], rows["fwhm"]
+        )
+        for name in RESULT_FIELDS:
+            result[name][:, columns] = np.broadcast_to(evaluated[name], (shape[0], int(columns.sum())))
+    result["saturated"] = result["exposure_time"] > result["saturation_time"]
+    return result
+
+
+def rank(result, targets):
+    """
+    Urutan setup per target (array [rank, target] berisi indeks setup)
+    """
+    by_snr = np.isfinite(targets["snr"])[None, :]
+    # Kunci urut: jenuh/tidak valid paling belakang, lalu exposure naik (mode snr) atau SNR turun
+    score = np.where(by_snr, result["exposure_time"], -result["snr"])
+    invalid = result["saturated"] | ~np.isfinite(score)
+    return np.lexsort((np.where(np.isfinite(score), score, np.inf), invalid), axis=0)
+
+
+def compare(profiles, raw_targets, snr=None, exposure_time=None, telescopes=None, ccds=None, filters=None,
+            top=DEFAULT_TOP):
+    """
+    Tabel peringkat setup per target: {"setups": jumlah setup, "targets": [{id, mode, ranking}]}
+    dengan ranking berisi top setup teratas (None = semua)
+    """
+    stack = stack_profiles(profiles, telescopes, ccds, filters)
+    targets = parse_targets(raw_targets, snr, exposure_time)
+    result = evaluate_matrix(stack, targets)
+    order = rank(result, targets)
+    if top is not None:
+        order = order[:max(int(top), 1)]
+
+    # Hanya setup yang masuk peringkat yang diambil ([rank, target]), satu kali tolist per kolom;
+    # NaN/inf (mis. saturation_time tanpa data full well) menjadi null di JSON
+    columns = {"saturated": np.take_along_axis(result["saturated"], order, axis=0).T.tolist()}
+    for name in RESULT_FIELDS:
+        values = np.take_along_axis(result[name], order, axis=0).T
+        cells = values.astype(object)
+        cells[~np.isfinite(values)] = None
+        columns[name] = cells.tolist()
+    fields = RESULT_FIELDS + ("saturated",)
+    output = []
+    for j, setup_indices in enumerate(order.T.tolist()):
+        ranking = []
+        for place, i in enumerate(setup_indices):
+            telescope, ccd, filter_name = stack.keys[i]
+            row = {"rank": place + 1, "telescope": telescope, "ccd": ccd, "filter": filter_name}
+            for name in fields:
+                row[name] = columns[name][j][place]
+            ranking.append(row)
+        output.append({
+            "id": targets["id"][j],
+            "mode": "snr" if np.isfinite(targets["snr"][j]) else "exposure_time",
+            "ranking": ranking,
+        })
+    return {"setups": len(stack), "targets": output}
@@ -0,0 +1,170 @@
+import threading
+import time
+from bisect import bisect_left
+
+# Metrik sederhana (counter dan histogram) untuk endpoint /metrics
+# dalam format teks Prometheus.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ITERATION_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64)
+
+
+def _labels_text(labels):
+    if not labels:
+        return ""
+    inner = ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+    return "{" + inner + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple((name, labels[name]) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_labels_text(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._values = {}  # key -> [jumlah per bucket (+Inf terakhir), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, amount=1, **labels):
+        """
+        Catat value; amount > 1 untuk mencatat value yang sama berkali-kali sekaligus
+        """
+        key = tuple((name, labels[name]) for name in self.label_names)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += amount
+            state[1] += value * amount
+            state[2] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, [list(state[0]), state[1], state[2]]) for key, state in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                labels = key + (("le", bound),)
+                lines.append(f"{self.name}_bucket{_labels_text(labels)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels_text(key)} {total}")
+            lines.append(f"{self.name}_count{_labels_text(key)} {count}")
+        return lines
+
+
+REQUEST_COUNT = Counter(
+    "etc_requests_total", "Jumlah request HTTP per endpoint", ("method", "path", "status")
+)
+REQUEST_LATENCY = Histogram(
+    "etc_request_duration_seconds", "Latensi request HTTP per endpoint", ("method", "path")
+)
+SOLVER_ITERATIONS = Histogram(
+    "etc_solver_iterations", "Jumlah iterasi solver exposure time per target", ("noise_model",),
+    buckets=ITERATION_BUCKETS,
+)
+
+METRICS = [REQUEST_COUNT, REQUEST_LATENCY, SOLVER_ITERATIONS]
+
+
+def register(metric):
+    METRICS.append(metric)
+    return metric
+
+
+def _family(sample, families):
+    # Nama family untuk baris sample (histogram: nama_bucket/_sum/_count -> nama)
+    name = sample.split("{", 1)[0].split(" ", 1)[0]
+    if name not in families:
+        for suffix in ("_bucket", "_sum", "_count"):
+            if name.endswith(suffix) and name[:-len(suffix)] in families:
+                return name[:-len(suffix)]
+    return name
+
+
+def render_metrics():
+    """
+    Semua metrik dalam format teks Prometheus (text/plain; version=0.0.4).
+    Beberapa objek bisa melaporkan family yang sama (mis. dua ResultCache dengan label cache
+    berbeda): HELP/TYPE ditulis sekali per family dan semua sample family itu dikelompokkan.
+    """
+    families = {}  # nama -> [baris header, baris sample], urutan kemunculan pertama
+    for metric in METRICS:
+        for line in metric.render():
+            if line.startswith("# "):
+                name = line.split(" ", 3)[2]
+                header, _ = families.setdefault(name, ([], []))
+                if not any(existing.split(" ", 2)[1] == line.split(" ", 2)[1] for existing in header):
+                    header.append(line)
+            else:
+                families.setdefault(_family(line, families), ([], []))[1].append(line)
+    lines = []
+    for header, samples in families.values():
+        lines.extend(header)
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI yang mencatat jumlah request dan histogram latensi per endpoint.
+    Path diambil dari template route (bukan URL mentah) supaya label tidak meledak.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            route = scope.get("route")
+            if route is not None:
+                path = route.path
+            elif scope["path"].startswith("/static/"):
+                path = "/static"
+            else:
+                path = "unmatched"
+            REQUEST_LATENCY.observe(elapsed, method=scope["method"], path=path)
+            REQUEST_COUNT.inc(method=scope["method"], path=path, status=status)
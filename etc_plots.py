@@ -0,0 +1,258 @@
+import asyncio
+import hashlib
+import inspect
+import io
+import json
+import os
+
+import numpy as np
+
+import etc_cache
+import etc_engine
+
+# Plot ETC on-demand (pengganti gambar statis dari "penghitungan plot.py").
+# Data kurva dihitung di proses utama dengan etc_engine (vektor, murah),
+# sedangkan rendering matplotlib (CPU-bound, tidak thread-safe) dijalankan di
+# process pool. matplotlib hanya di-import di dalam worker.
+# Hasil PNG/SVG di-cache dalam bentuk bytes berdasarkan hash parameter.
+
+PLOT_KINDS = ("exposure_vs_magnitude", "snr_vs_exposure", "comparison")
+MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+MAGNITUDE_RANGE = (8, 9, 10, 11, 12, 13, 14, 15, 16)
+EXPOSURE_RANGE = (1, 5, 10, 30, 60, 120, 180, 240, 300)
+# Tick 1-2-5 seperti "penghitungan plot.py", dipilih sesuai rentang data
+EXPOSURE_TICKS = tuple(m * 10.0 ** e for e in range(-3, 5) for m in (1, 2, 5))
+
+DEFAULT_WORKERS = int(os.environ.get("ETC_PLOT_WORKERS", "2"))
+
+plot_cache = etc_cache.ResultCache(
+    "plots",
+    max_entries=int(os.environ.get("ETC_PLOT_CACHE_ENTRIES", "256")),
+    max_bytes=int(os.environ.get("ETC_PLOT_CACHE_BYTES", str(64 * 1024 * 1024))),
+)
+
+_pool = None
+_pending = {}  # key -> asyncio.Future, supaya request yang sama tidak dirender dua kali
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # Di-import di sini supaya start worker server tidak membayar import multiprocessing
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # spawn: worker tidak mewarisi thread (logging listener) dan lock dari proses server
+        _pool = ProcessPoolExecutor(max_workers=DEFAULT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def plot_key(kind, fmt, profiles, params):
+    """
+    Hash parameter plot; profil ikut di-hash sehingga perubahan zeropoint menghasilkan key baru
+    """
+    payload = {
+        "kind": kind,
+        "format": fmt,
+        "params": params,
+        "profiles": {label: profile.as_dict() for label, profile in profiles.items()},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def _series(profile, sky_brightness, zenith_distance, fwhm, snr, magnitude):
+    exposure = etc_engine.evaluate(
+        profile, np.array(MAGNITUDE_RANGE, dtype=float), sky_brightness, zenith_distance, fwhm, snr_target=snr
+    )
+    snr_curve = etc_engine.evaluate(
+        profile, magnitude, sky_brightness, zenith_distance, fwhm, exposure_time=np.array(EXPOSURE_RANGE, dtype=float)
+    )
+    return {
+        "exposure_times": exposure["exposure_time"].tolist(),
+        "snr_values": snr_curve["snr"].tolist(),
+    }
+
+
+def plot_data(kind, profiles, sky_brightness, zenith_distance, fwhm, snr, magnitude):
+    """
+    Menghitung data kurva untuk worker (hanya list/float supaya murah di-pickle).
+    profiles: {label: InstrumentProfile}, satu profil untuk plot tunggal,
+    beberapa profil (mis. per filter) untuk plot comparison.
+    """
+    if kind not in PLOT_KINDS:
+        raise ValueError(f"Jenis plot {kind} tidak dikenal")
+    return {
+        "kind": kind,
+        "magnitudes": list(MAGNITUDE_RANGE),
+        "exposures": list(EXPOSURE_RANGE),
+        "snr": snr,
+        "magnitude": magnitude,
+        "title": ", ".join(sorted({f"{p.telescope} + {p.ccd}" for p in profiles.values()})),
+        "series": {
+            label: _series(profile, sky_brightness, zenith_distance, fwhm, snr, magnitude)
+            for label, profile in profiles.items()
+        },
+    }
+
+
+def _draw_exposure(ax, data, annotate):
+    for label, series in data["series"].items():
+        ax.plot(data["magnitudes"], series["exposure_times"], "-o", linewidth=2, label=label)
+        if annotate:
+            for mag, exp in zip(data["magnitudes"], series["exposure_times"]):
+                ax.annotate(f"{exp:.1f}s", (mag, exp), textcoords="offset points", xytext=(0, 10), ha="center")
+    ax.set_xlabel("Magnitude")
+    ax.set_ylabel("Exposure Time (s)")
+    ax.set_title(f"Exposure Time vs Magnitude (SNR={data['snr']:g})")
+    ax.grid(True)
+    ax.set_yscale("log")
+    values = [t for series in data["series"].values() for t in series["exposure_times"]]
+    ticks = [t for t in EXPOSURE_TICKS if min(values) <= t <= max(values)]
+    ax.set_yticks(ticks)
+    ax.set_yticklabels([f"{t:g}" for t in ticks])
+
+
+def _draw_snr(ax, data, annotate):
+    for label, series in data["series"].items():
+        ax.plot(data["exposures"], series["snr_values"], "-o", linewidth=2, label=label)
+        if annotate:
+            for exp, snr in zip(data["exposures"], series["snr_values"]):
+                ax.annotate(f"{snr:.1f}", (exp, snr), textcoords="offset points", xytext=(0, 10), ha="center")
+    ax.set_xlabel("Exposure Time (s)")
+    ax.set_ylabel("SNR")
+    ax.set_title(f"SNR vs Exposure Time (Magnitude={data['magnitude']:g})")
+    ax.grid(True)
+
+
+def render(data, fmt):
+    """
+    Render data plot menjadi bytes PNG/SVG (dijalankan di worker process)
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.figure import Figure
+
+    kind = data["kind"]
+    if kind == "comparison":
+        fig = Figure(figsize=(14, 6))
+        ax_exposure, ax_snr = fig.subplots(1, 2)
+        _draw_exposure(ax_exposure, data, annotate=False)
+        _draw_snr(ax_snr, data, annotate=False)
+        ax_exposure.legend(title="Filter")
+        ax_snr.legend(title="Filter")
+        fig.suptitle(data["title"])
+    else:
+        fig = Figure(figsize=(8, 6))
+        ax = fig.subplots()
+        if kind == "exposure_vs_magnitude":
+            _draw_exposure(ax, data, annotate=True)
+        else:
+            _draw_snr(ax, data, annotate=True)
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def render_heatmap(data, fmt):
+    """
+    Heatmap + kontur untuk grid sweep 2D (dijalankan di worker process)
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.colors import LogNorm
+    from matplotlib.figure import Figure
+
+    z = np.asarray(data["z"], dtype=float)
+    positive = z[np.isfinite(z) & (z > 0)]
+    log_scale = positive.size > 0 and positive.max() / positive.min() > 100
+    fig = Figure(figsize=(9, 7))
+    ax = fig.subplots()
+    mesh = ax.pcolormesh(
+        data["x"], data["y"], z, shading="auto", cmap="viridis",
+        norm=LogNorm(positive.min(), positive.max()) if log_scale else None,
+    )
+    fig.colorbar(mesh, ax=ax, label=data["output"])
+    if positive.size:
+        if log_scale:
+            levels = [v for v in (1, 3, 10, 30, 100, 300, 1000, 3000) if positive.min() < v < positive.max()]
+        else:
+            levels = 8
+        if levels:
+            contours = ax.contour(data["x"], data["y"], z, levels=levels, colors="white", linewidths=0.8)
+            ax.clabel(contours, fmt="%g", fontsize=8)
+    ax.set_xlabel(data["x_label"])
+    ax.set_ylabel(data["y_label"])
+    ax.set_title(data["title"])
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+async def _render_cached(key, function, build_data, fmt):
+    # Ambil dari cache, gabung dengan render yang sedang berjalan, atau hitung data
+    # (build_data, hanya saat perlu; boleh mengembalikan awaitable, mis. compute pool)
+    # lalu kirim ke process pool
+    image = plot_cache.get(key)
+    if image is not None:
+        return image
+
+    pending = _pending.get(key)
+    if pending is not None:
+        return await asyncio.shield(pending)
+
+    loop = asyncio.get_running_loop()
+
+    async def produce():
+        data = build_data()
+        if inspect.isawaitable(data):
+            data = await data
+        return await loop.run_in_executor(_get_pool(), function, data, fmt)
+
+    future = asyncio.ensure_future(produce())
+    _pending[key] = future
+    try:
+        image = await asyncio.shield(future)
+    finally:
+        _pending.pop(key, None)
+    plot_cache.put(key, image)
+    return image
+
+
+async def render_heatmap_plot(key, fmt, build_data):
+    """
+    Bytes heatmap grid sweep; key dihitung pemanggil dari parameter sweep,
+    build_data() hanya dipanggil jika gambar belum ada di cache (boleh mengembalikan awaitable)
+    """
+    if fmt not in MEDIA_TYPES:
+        raise ValueError(f"Format {fmt} tidak didukung (png atau svg)")
+    return await _render_cached(key, render_heatmap, build_data, fmt)
+
+
+async def render_plot(kind, fmt, profiles, sky_brightness, zenith_distance, fwhm, snr, magnitude):
+    """
+    Bytes gambar plot beserta key-nya (dipakai sebagai ETag); render di process pool jika belum ada di cache
+    """
+    if fmt not in MEDIA_TYPES:
+        raise ValueError(f"Format {fmt} tidak didukung (png atau svg)")
+    params = {
+        "sky_brightness": sky_brightness,
+        "zenith_distance": zenith_distance,
+        "fwhm": fwhm,
+        "snr": snr,
+        "magnitude": magnitude,
+    }
+    key = plot_key(kind, fmt, profiles, params)
+    image = await _render_cached(key, render, lambda: plot_data(kind, profiles, **params), fmt)
+    return image, key
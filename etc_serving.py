@@ -0,0 +1,253 @@
+import asyncio
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+import sys
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+from fastapi.staticfiles import StaticFiles
+
+import aperture_model
+
+try:
+    import brotli
+except ImportError:  # opsional, tanpa brotli hanya gzip
+    brotli = None
+
+# Mode serving produksi.
+# Perhitungan sinkron (solver, engine, rendering template) dijalankan di thread pool,
+# bukan di event loop, sehingga satu request berat tidak menahan client lain.
+# Jumlah request yang dikerjakan + antre dibatasi: jika penuh langsung 503 (backpressure),
+# dan request yang melewati batas waktu dijawab 504. Slot baru dilepas setelah thread
+# benar-benar selesai, jadi request yang timeout tetap dihitung sampai selesai.
+# Kode NumPy melepas GIL; untuk paralelisme penuh jalankan beberapa worker (run / gunicorn_conf.py).
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = int(os.environ.get("ETC_COMPUTE_WORKERS", str(min(8, os.cpu_count() or 1))))
+MAX_QUEUE = int(os.environ.get("ETC_COMPUTE_QUEUE", str(4 * MAX_WORKERS)))
+COMPUTE_TIMEOUT = float(os.environ.get("ETC_COMPUTE_TIMEOUT", "10"))
+RETRY_AFTER = "1"  # detik, header Retry-After untuk 503
+STATIC_MAX_AGE = int(os.environ.get("ETC_STATIC_MAX_AGE", str(7 * 24 * 3600)))
+RELOAD = os.environ.get("ETC_RELOAD") == "1"
+
+
+class ComputePool:
+    """
+    Thread pool dengan batas concurrency dan timeout per request, metrik dalam format Prometheus
+    """
+
+    def __init__(self, name="compute", max_workers=MAX_WORKERS, max_queue=MAX_QUEUE, timeout=COMPUTE_TIMEOUT):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor = None  # dibuat saat dipakai pertama kali (setelah fork worker)
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._completed = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+            return self._executor
+
+    def _release(self, future):
+        with self._lock:
+            self._admitted -= 1
+            self._completed += 1
+
+    async def run(self, function, *args, timeout=None, **kwargs):
+        """
+        Jalankan function(*args, **kwargs) di thread pool.
+        HTTPException 503 jika pool dan antrean penuh, 504 jika melewati timeout (detik).
+        """
+        executor = self._get_executor()
+        with self._lock:
+            if self._admitted >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise HTTPException(
+                    status_code=503, detail="Server sedang penuh, coba lagi", headers={"Retry-After": RETRY_AFTER}
+                )
+            self._admitted += 1
+        try:
+            future = executor.submit(function, *args, **kwargs)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            # Yang masih antre dibatalkan; yang sudah berjalan dibiarkan selesai (thread tidak bisa dihentikan)
+            future.cancel()
+            with self._lock:
+                self._timeouts += 1
+            logger.warning("Compute timeout", extra={"fields": {"function": getattr(function, "__name__", function)}})
+            raise HTTPException(status_code=504, detail=f"Perhitungan melebihi {timeout:g} detik") from None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "admitted": self._admitted,
+                "rejected": self._rejected,
+                "timeouts": self._timeouts,
+                "completed": self._completed,
+            }
+
+    def render(self):
+        stats = self.stats()
+        label = f'{{pool="{self.name}"}}'
+        return [
+            "# HELP etc_compute_in_flight Request komputasi yang sedang berjalan atau antre",
+            "# TYPE etc_compute_in_flight gauge",
+            f"etc_compute_in_flight{label} {stats['admitted']}",
+            "# HELP etc_compute_rejected_total Request yang ditolak (503) karena pool penuh",
+            "# TYPE etc_compute_rejected_total counter",
+            f"etc_compute_rejected_total{label} {stats['rejected']}",
+            "# HELP etc_compute_timeouts_total Request yang melebihi batas waktu (504)",
+            "# TYPE etc_compute_timeouts_total counter",
+            f"etc_compute_timeouts_total{label} {stats['timeouts']}",
+            "# HELP etc_compute_completed_total Perhitungan yang selesai di thread pool",
+            "# TYPE etc_compute_completed_total counter",
+            f"etc_compute_completed_total{label} {stats['completed']}",
+        ]
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    StaticFiles dengan Cache-Control panjang; ETag/Last-Modified (304) sudah dari Starlette
+    """
+
+    def __init__(self, *args, max_age=STATIC_MAX_AGE, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_age = max_age
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = f"public, max-age={self.max_age}"
+        return response
+
+
+_Page = namedtuple("_Page", "version digest variants")
+
+
+def _accepted_encodings(header):
+    # "gzip, br;q=0.5, *;q=0" -> {"gzip", "br"} (q=0 berarti ditolak)
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if name and params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+class StaticPage:
+    """
+    Halaman HTML yang dirender sekali menjadi bytes (plus versi gzip dan brotli),
+    dilayani dengan ETag/304. version() (opsional) dicek setiap request; jika berubah
+    (mis. generation profil instrumen) halaman dirender ulang.
+    """
+
+    def __init__(self, render, version=None):
+        self._render = render
+        self._version = version or (lambda: None)
+        self._lock = threading.Lock()
+        self._page = None
+
+    def _current(self):
+        version = self._version()
+        page = self._page
+        if page is not None and page.version == version:
+            return page
+        with self._lock:
+            if self._page is None or self._page.version != version:
+                body = self._render().encode("utf-8")
+                variants = {"identity": body, "gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+                if brotli is not None:
+                    variants["br"] = brotli.compress(body)
+                digest = hashlib.sha256(body).hexdigest()[:32]
+                self._page = _Page(version, digest, variants)
+            return self._page
+
+    def prepare(self):
+        # Render saat start (ikut preload), bukan di request pertama
+        self._current()
+
+    def response(self, request):
+        page = self._current()
+        accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+        encoding = next((name for name in ("br", "gzip") if name in accepted and name in page.variants), "identity")
+        # ETag per encoding: body yang berbeda tidak boleh berbagi strong ETag
+        etag = f'"{page.digest}"' if encoding == "identity" else f'"{page.digest}-{encoding}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=page.variants[encoding], media_type="text/html", headers=headers)
+
+
+def precompile_templates(templates):
+    """
+    Kompilasi semua template Jinja2 sekali saat start (ikut dibagi worker saat preload).
+    Di luar mode reload, pengecekan mtime file template per request dimatikan.
+    """
+    env = templates.env
+    env.auto_reload = RELOAD
+    for name in env.list_templates(extensions=("html",)):
+        env.get_template(name)
+
+
+def warmup():
+    """
+    Hitung tabel yang mahal sekali di proses master sebelum fork (gunicorn preload_app),
+    sehingga semua worker memakai memori yang sama (copy-on-write)
+    """
+    for psf in aperture_model.PSF_PROFILES:
+        aperture_model.lookup_table(psf)
+
+
+def run(app_path, host=None, port=None):
+    """
+    Launcher dari blok __main__ app. Variabel lingkungan:
+    ETC_WORKERS (default 1), ETC_HOST, ETC_PORT, ETC_RELOAD=1 untuk mode development.
+    Lebih dari satu worker dijalankan lewat gunicorn (gunicorn_conf.py, preload_app) jika terpasang.
+    """
+    import uvicorn
+
+    host = host or os.environ.get("ETC_HOST", "127.0.0.1")
+    port = int(port or os.environ.get("ETC_PORT", "8000"))
+    workers = int(os.environ.get("ETC_WORKERS", "1"))
+    if RELOAD:
+        uvicorn.run(app_path, host=host, port=port, reload=True)
+        return
+    if workers > 1:
+        gunicorn = shutil.which("gunicorn")
+        if gunicorn is not None:
+            config = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gunicorn_conf.py")
+            os.environ.update({"ETC_HOST": host, "ETC_PORT": str(port)})
+            os.execv(gunicorn, [gunicorn, "-c", config, app_path])
+        logger.warning("gunicorn tidak terpasang, memakai uvicorn --workers (profil dimuat di setiap worker)")
+    uvicorn.run(app_path, host=host, port=port, workers=workers)
+
+
+if __name__ == "__main__":
+    run(sys.argv[1] if len(sys.argv) > 1 else "main2_24_march:app")
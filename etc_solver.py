@@ -0,0 +1,100 @@
+import numpy as np
+
+import etc_engine
+import etc_metrics
+
+# Solver exposure time bersama untuk semua kalkulator.
+# Model noise "variance" punya solusi tertutup (formula kuadrat Naskah Imam),
+# model lain diselesaikan dengan Newton yang dijaga bracket [t_min, t_max].
+
+MAX_EXPOSURE_TIME = 3600.0  # 1 jam, batas yang sama dengan loop lama
+MIN_EXPOSURE_TIME = 1e-3  # detik
+TOLERANCE = 1e-3  # presisi exposure time dalam detik
+MAX_ITERATIONS = 60  # Newton + bisection selalu selesai jauh sebelum ini
+
+
+def solve_for_snr(snr_function, snr_target, t_min=MIN_EXPOSURE_TIME, t_max=MAX_EXPOSURE_TIME,
+                  tol=TOLERANCE, max_iter=MAX_ITERATIONS):
+    """
+    Mencari exposure time t sehingga snr_function(t) = snr_target (vektor).
+    snr_function harus naik monoton terhadap t dan menerima array t.
+    Step Newton yang keluar dari bracket diganti bisection, jadi jumlah iterasi
+    dibatasi max_iter. Target yang tidak tercapai sampai t_max diberi t = t_max.
+    """
+    snr_target = np.asarray(snr_target, dtype=float)
+    f_max = snr_function(np.asarray(t_max, dtype=float)) - snr_target
+    f_min = snr_function(np.asarray(t_min, dtype=float)) - snr_target
+    shape = np.broadcast(f_max, f_min).shape
+
+    lo = np.full(shape, float(t_min))
+    hi = np.full(shape, float(t_max))
+    iterations = np.zeros(shape, dtype=int)
+    reachable = np.broadcast_to(f_max >= 0, shape)
+    active = reachable & ~np.broadcast_to(f_min >= 0, shape)
+    t = np.where(active, np.sqrt(lo * hi), np.where(reachable, lo, hi))
+
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        step = 1e-6 * t
+        f = snr_function(t) - snr_target
+        derivative = (snr_function(t + step) - snr_target - f) / step
+        f = np.broadcast_to(f, shape)
+        derivative = np.broadcast_to(derivative, shape)
+
+        lo = np.where(active & (f < 0), t, lo)
+        hi = np.where(active & (f >= 0), t, hi)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t_new = t - f / derivative
+        outside = ~np.isfinite(t_new) | (t_new <= lo) | (t_new >= hi)
+        t_new = np.where(outside, (lo + hi) / 2, t_new)
+
+        converged = (np.abs(t_new - t) < tol) | (hi - lo < tol)
+        iterations += active
+        t = np.where(active, t_new, t)
+        active = active & ~converged
+
+    return {
+        "exposure_time": t,
+        "snr": np.broadcast_to(snr_function(t), shape),
+        "iterations": iterations,
+        "reachable": reachable,
+    }
+
+
+def _record_iterations(iterations, noise_model):
+    values, counts = np.unique(iterations, return_counts=True)
+    for value, count in zip(values.tolist(), counts.tolist()):
+        etc_metrics.SOLVER_ITERATIONS.observe(value, amount=count, noise_model=noise_model)
+
+
+def solve_exposure_time(signal_star, signal_sky, read_noise, dark_current, num_pixels, snr_target,
+                        noise_model="variance", t_max=MAX_EXPOSURE_TIME):
+    """
+    Exposure time untuk snr_target dengan model noise tertentu:
+    - "variance": variansi dijumlahkan (calculate_exposure_time_analytic), solusi tertutup
+    - "legacy": suku noise diakar dulu (calculate_snr_and_exposure_logic), Newton
+    """
+    if noise_model == "variance":
+        t = etc_engine.calculate_exposure_time(
+            signal_star, signal_sky, read_noise, dark_current, num_pixels, snr_target
+        )
+        reachable = t <= t_max
+        t = np.where(reachable, t, t_max)
+        snr = etc_engine.calculate_snr(signal_star, signal_sky, read_noise, dark_current, num_pixels, t)
+        iterations = np.zeros(np.shape(t), dtype=int)
+        _record_iterations(iterations, noise_model)
+        return {
+            "exposure_time": t,
+            "snr": snr,
+            "iterations": iterations,
+            "reachable": reachable,
+        }
+    if noise_model == "legacy":
+        def snr_function(t):
+            return etc_engine.calculate_snr_legacy(signal_star, signal_sky, read_noise, dark_current, num_pixels, t)
+
+        solution = solve_for_snr(snr_function, snr_target, t_max=t_max)
+        _record_iterations(solution["iterations"], noise_model)
+        return solution
+    raise ValueError(f"Model noise {noise_model} tidak dikenal")
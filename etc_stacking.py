@@ -0,0 +1,95 @@
+import numpy as np
+
+import aperture_model
+import etc_engine
+
+# Mode stacking: exposure time total dipecah menjadi N sub-exposure yang masing-masing
+# tidak menjenuhkan piksel paling terang bintang.
+# Puncak piksel (elektron) = flux bintang x fraksi piksel pusat PSF (aperture_model)
+# + sky per piksel + dark, dibandingkan dengan batas saturasi profil (full well / ADC)
+# dikali SATURATION_FRACTION (sisa ruang untuk non-linearitas dan bias).
+# Untuk N frame identik: SNR_stack = sqrt(N) x SNR_frame, read noise masuk sekali per frame.
+# Jumlah frame paling sedikit selalu paling efisien (read noise dan overhead bertambah dengan N),
+# jadi N = ceil((SNR_target / SNR_frame(t_max))²) lalu t_sub diselesaikan untuk SNR_target / sqrt(N).
+
+SATURATION_FRACTION = 0.8
+MAX_SUB_EXPOSURE = 300.0  # detik, batas tracking/guiding satu frame
+MIN_SUB_EXPOSURE = 0.001  # detik, exposure terpendek kamera
+
+
+def peak_rate(profile, signal_star, sky_brightness, fwhm, psf="gaussian"):
+    """
+    Elektron/detik di piksel paling terang: bintang + sky (mag/arcsec² x luas piksel) + dark
+    """
+    fraction = aperture_model.peak_fraction(np.asarray(fwhm, dtype=float) / profile.pixel_scale, psf)
+    sky_pixel = etc_engine.calculate_signal(
+        sky_brightness, profile.zeropoint, 0.0, profile.aperture_area, profile.quantum_efficiency
+    ) * profile.pixel_scale ** 2
+    return signal_star * fraction + sky_pixel + profile.dark_current
+
+
+def saturation_time(profile, magnitude, sky_brightness, zenith_distance, fwhm, psf="gaussian",
+                    saturation_fraction=SATURATION_FRACTION):
+    """
+    Exposure time (detik) sampai puncak piksel mencapai batas saturasi (inf jika tidak diketahui)
+    """
+    extinction = profile.extinction_coefficient * etc_engine.airmass_from_zenith(zenith_distance)
+    signal_star = etc_engine.calculate_signal(
+        magnitude, profile.zeropoint, extinction, profile.aperture_area, profile.quantum_efficiency
+    )
+    rate = peak_rate(profile, signal_star, sky_brightness, fwhm, psf)
+    return profile.saturation_level * saturation_fraction / rate
+
+
+def solve_stack(profile, magnitude, sky_brightness, zenith_distance, fwhm, snr_target, psf="gaussian",
+                max_sub_exposure=MAX_SUB_EXPOSURE, overhead=None, saturation_fraction=SATURATION_FRACTION):
+    """
+    Jumlah dan panjang sub-exposure untuk mencapai snr_target tanpa saturasi, untuk array target.
+    overhead: detik per frame (default readout_time CCD). Target yang sudah jenuh pada
+    MIN_SUB_EXPOSURE ditandai saturated dan hasilnya NaN.
+    """
+    if overhead is None:
+        overhead = profile.readout_time
+    evaluated = etc_engine.evaluate(profile, magnitude, sky_brightness, zenith_distance, fwhm, snr_target=snr_target)
+    signal_star = evaluated["signal_star"]
+    signal_sky = evaluated["signal_sky"]
+    num_pixels = evaluated["num_pixels"]
+    single_exposure = evaluated["exposure_time"]
+    snr_target = np.broadcast_to(np.asarray(snr_target, dtype=float), signal_star.shape)
+
+    rate = peak_rate(profile, signal_star, sky_brightness, fwhm, psf)
+    t_saturation = profile.saturation_level * saturation_fraction / rate
+    t_max = np.minimum(t_saturation, max_sub_exposure)
+    saturated = t_saturation < MIN_SUB_EXPOSURE
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        snr_frame = etc_engine.calculate_snr(
+            signal_star, signal_sky, profile.read_noise, profile.dark_current, num_pixels, t_max
+        )
+        # Toleransi kecil supaya pembulatan float tidak menambah satu frame
+        n_frames = np.maximum(np.ceil((snr_target / snr_frame) ** 2 - 1e-9), 1)
+        n_frames = np.where(saturated, np.nan, n_frames)
+        sub_exposure = etc_engine.calculate_exposure_time(
+            signal_star, signal_sky, profile.read_noise, profile.dark_current, num_pixels,
+            snr_target / np.sqrt(n_frames),
+        )
+        sub_exposure = np.minimum(sub_exposure, t_max)
+        snr = np.sqrt(n_frames) * etc_engine.calculate_snr(
+            signal_star, signal_sky, profile.read_noise, profile.dark_current, num_pixels, sub_exposure
+        )
+
+    total_exposure = n_frames * sub_exposure
+    peak_electrons = rate * sub_exposure
+    return {
+        "n_frames": n_frames,
+        "sub_exposure": sub_exposure,
+        "total_exposure": total_exposure,
+        "wall_clock": total_exposure + n_frames * overhead,
+        "snr": snr,
+        "peak_electrons": peak_electrons,
+        "peak_adu": peak_electrons / profile.adc_gain,
+        "saturation_time": t_saturation,
+        "single_exposure": single_exposure,
+        "single_saturates": (single_exposure > t_saturation) | saturated,
+        "saturated": saturated,
+    }
@@ -0,0 +1,423 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+# Penyimpanan SQLite untuk katalog target, versi profil instrumen/kalibrasi dan hasil
+# perhitungan. Mode WAL: satu penulis dan banyak pembaca dari beberapa worker sekaligus.
+# Setiap thread (per proses worker) memakai koneksinya sendiri; hasil dari request dimasukkan
+# ke antrean dan ditulis thread penulis dengan executemany per batch, jadi request tidak
+# menunggu disk. Query "target mana yang mencapai SNR x dalam < t detik" dijawab dari index
+# covering (profile_id, target_id, snr, exposure_time) dengan paginasi keyset.
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.environ.get("ETC_STORE", "etc_store.sqlite3")
+BUSY_TIMEOUT = 5.0  # detik menunggu lock tulis dari worker lain
+QUEUE_SIZE = 100000  # baris hasil yang boleh antre (semua record); lebih dari itu dibuang (dihitung di metrik)
+WRITE_BATCH = 1000
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+IN_CHUNK = 500  # nilai per klausa IN (batas variabel SQLite)
+SNR_TOLERANCE = 1e-6  # relatif; SNR hasil solver bisa 99.99999... untuk target 100
+FLUSH_TIMEOUT = 2.0  # detik maksimal menunggu hasil yang antre sebelum query
+SHUTDOWN_FLUSH_TIMEOUT = 10.0  # detik maksimal menunggu penulis saat server berhenti
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS targets (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    ra REAL,
+    dec REAL,
+    magnitude REAL,
+    filter TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS targets_magnitude ON targets (magnitude, id);
+
+CREATE TABLE IF NOT EXISTS profile_versions (
+    id INTEGER PRIMARY KEY,
+    telescope TEXT NOT NULL,
+    ccd TEXT NOT NULL,
+    filter TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    calibration_version INTEGER,
+    profile TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    UNIQUE (telescope, ccd, filter, digest)
+);
+
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    profile_id INTEGER NOT NULL REFERENCES profile_versions (id),
+    target_id INTEGER REFERENCES targets (id),
+    source TEXT NOT NULL,
+    magnitude REAL,
+    sky_brightness REAL,
+    airmass REAL,
+    fwhm REAL,
+    snr REAL NOT NULL,
+    exposure_time REAL NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_reach ON results (profile_id, target_id, snr, exposure_time);
+CREATE INDEX IF NOT EXISTS results_profile ON results (profile_id, id);
+CREATE INDEX IF NOT EXISTS results_source ON results (source, id);
+"""
+
+RESULT_COLUMNS = ("magnitude", "sky_brightness", "airmass", "fwhm", "snr", "exposure_time")
+
+
+def profile_digest(profile, calibration_version=None):
+    """
+    Hash isi profil (as_dict) dan versi kalibrasi: versi baru tercatat setiap config atau
+    kalibrasi berubah
+    """
+    text = json.dumps(
+        {"profile": profile.as_dict(), "calibration_version": calibration_version}, sort_keys=True, default=str
+    )
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def _number(value):
+    # NaN/inf tidak disimpan (SQLite menyimpan NaN sebagai NULL, inf tidak berguna untuk query)
+    if value is None:
+        return None
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def _target_name(row):
+    target = row.get("target")
+    if target is None:
+        return None
+    return target.get("name", target.get("id"))
+
+
+def _page_size(limit):
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+
+class Store:
+    """
+    Store SQLite (WAL) dengan koneksi per thread dan thread penulis untuk hasil perhitungan
+    """
+
+    def __init__(self, path=DEFAULT_PATH, name="etc"):
+        self.path = path
+        self.name = name
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._profile_ids = {}
+        self._queue = None
+        self._writer = None
+        self._pid = None
+        self._written = 0
+        self._dropped = 0
+        self._queued_rows = 0
+        self._failed = 0
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def connection(self):
+        """
+        Koneksi milik thread ini (dibuat ulang setelah fork worker)
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    # Versi profil -------------------------------------------------------------------------
+
+    def profile_id(self, profile, calibration_version=None):
+        """
+        id baris profile_versions untuk isi profil dan versi kalibrasi ini (dibuat jika belum ada)
+        """
+        digest = profile_digest(profile, calibration_version)
+        key = (profile.key, digest)
+        profile_id = self._profile_ids.get(key)
+        if profile_id is not None:
+            return profile_id
+        conn = self.connection()
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO profile_versions "
+                "(telescope, ccd, filter, digest, calibration_version, profile, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (*profile.key, digest, calibration_version,
+                 json.dumps(profile.as_dict(), sort_keys=True, default=str), time.time()),
+            )
+            row = conn.execute(
+                "SELECT id FROM profile_versions WHERE telescope = ? AND ccd = ? AND filter = ? AND digest = ?",
+                (*profile.key, digest),
+            ).fetchone()
+        self._profile_ids[key] = row["id"]
+        return row["id"]
+
+    def find_profile_id(self, profile, calibration_version=None):
+        """
+        id versi profil yang sudah tersimpan (tanpa menulis), None jika belum pernah dicatat
+        """
+        digest = profile_digest(profile, calibration_version)
+        key = (profile.key, digest)
+        profile_id = self._profile_ids.get(key)
+        if profile_id is not None:
+            return profile_id
+        row = self.connection().execute(
+            "SELECT id FROM profile_versions WHERE telescope = ? AND ccd = ? AND filter = ? AND digest = ?",
+            (*profile.key, digest),
+        ).fetchone()
+        if row is None:
+            return None
+        self._profile_ids[key] = row["id"]
+        return row["id"]
+
+    def profile_versions(self, telescope, ccd, filter_name=None):
+        """
+        Semua versi profil untuk kombinasi (dan filter), terbaru dulu
+        """
+        sql = "SELECT id, telescope, ccd, filter, digest, calibration_version, created_at FROM profile_versions " \
+              "WHERE telescope = ? AND ccd = ?"
+        args = [telescope, ccd]
+        if filter_name is not None:
+            sql += " AND filter = ?"
+            args.append(filter_name)
+        rows = self.connection().execute(sql + " ORDER BY id DESC", args).fetchall()
+        return [dict(row) for row in rows]
+
+    # Target -------------------------------------------------------------------------------
+
+    def add_targets(self, targets):
+        """
+        Upsert target (dict dengan name/id, opsional ra, dec, magnitude, filter) dalam satu transaksi.
+        Nilai kosong tidak menimpa nilai yang sudah tersimpan. Mengembalikan {name: id}.
+        """
+        now = time.time()
+        rows = []
+        for target in targets:
+            name = target.get("name", target.get("id"))
+            if name is None:
+                raise ValueError("Target harus punya name atau id")
+            rows.append((
+                str(name), _number(target.get("ra")), _number(target.get("dec")),
+                _number(target.get("magnitude")), target.get("filter"), now,
+            ))
+        conn = self.connection()
+        with conn:
+            conn.executemany(
+                "INSERT INTO targets (name, ra, dec, magnitude, filter, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET "
+                "ra = COALESCE(excluded.ra, ra), dec = COALESCE(excluded.dec, dec), "
+                "magnitude = COALESCE(excluded.magnitude, magnitude), filter = COALESCE(excluded.filter, filter), "
+                "updated_at = excluded.updated_at",
+                rows,
+            )
+        return self._target_ids(conn, [row[0] for row in rows])
+
+    def _target_ids(self, conn, names):
+        ids = {}
+        names = list(dict.fromkeys(names))
+        for start in range(0, len(names), IN_CHUNK):
+            chunk = names[start:start + IN_CHUNK]
+            placeholders = ", ".join("?" * len(chunk))
+            for row in conn.execute(f"SELECT name, id FROM targets WHERE name IN ({placeholders})", chunk):
+                ids[row["name"]] = row["id"]
+        return ids
+
+    def targets(self, after=0, limit=PAGE_SIZE, max_magnitude=None):
+        """
+        Halaman katalog target urut id; next dipakai sebagai after untuk halaman berikutnya
+        """
+        sql = "SELECT id, name, ra, dec, magnitude, filter FROM targets WHERE id > ?"
+        args = [int(after)]
+        if max_magnitude is not None:
+            sql += " AND magnitude <= ?"
+            args.append(float(max_magnitude))
+        return self._page(sql + " ORDER BY id LIMIT ?", args, limit)
+
+    # Hasil perhitungan ------------------------------------------------------------------------
+
+    def record(self, profile, rows, source, calibration_version=None):
+        """
+        Antrekan hasil perhitungan untuk satu profil (non-blocking). Setiap row dict berisi
+        RESULT_COLUMNS (yang tidak ada disimpan NULL) dan opsional target (dict untuk add_targets).
+        """
+        rows = list(rows)
+        self._start_writer()
+        # Batas antrean dihitung dalam baris (satu record bisa berisi satu chunk batch)
+        with self._lock:
+            if self._queued_rows + len(rows) > QUEUE_SIZE:
+                self._dropped += len(rows)
+                return
+            self._queued_rows += len(rows)
+        self._queue.put_nowait((profile, calibration_version, source, rows))
+
+    def _start_writer(self):
+        with self._lock:
+            if self._writer is None or self._pid != os.getpid():
+                # Thread penulis tidak ikut tersalin saat fork: dibuat per proses worker
+                self._queue = queue.Queue()
+                self._queued_rows = 0
+                self._pid = os.getpid()
+            elif self._writer.is_alive():
+                return
+            # Thread baru (pertama kali, setelah fork, atau jika penulis sebelumnya mati) memakai antrean yang ada
+            self._writer = threading.Thread(target=self._write_loop, name=f"{self.name}-store", daemon=True)
+            self._writer.start()
+
+    def _write_loop(self):
+        pending = self._queue
+        while True:
+            items = [pending.get()]
+            while len(items) < WRITE_BATCH:
+                try:
+                    items.append(pending.get_nowait())
+                except queue.Empty:
+                    break
+            # Penanda flush (Event) di-set setelah semua hasil yang antre sebelumnya ditulis
+            batch = [item for item in items if not isinstance(item, threading.Event)]
+            try:
+                if batch:
+                    self.write_results(batch)
+            except Exception:
+                # Batch yang gagal (error SQLite atau data tidak valid) dibuang, penulis tetap berjalan
+                with self._lock:
+                    self._failed += sum(len(rows) for _, _, _, rows in batch)
+                logger.exception("Gagal menulis hasil ke store")
+            finally:
+                with self._lock:
+                    self._queued_rows -= sum(len(rows) for _, _, _, rows in batch)
+                for item in items:
+                    if isinstance(item, threading.Event):
+                        item.set()
+                    pending.task_done()
+
+    def write_results(self, batch):
+        """
+        Tulis langsung (tanpa antrean) daftar (profile, calibration_version, source, rows) dalam satu transaksi
+        """
+        targets = [row["target"] for _, _, _, rows in batch for row in rows if _target_name(row) is not None]
+        target_ids = self.add_targets(targets) if targets else {}
+        now = time.time()
+        values = []
+        for profile, calibration_version, source, rows in batch:
+            profile_id = self.profile_id(profile, calibration_version)
+            for row in rows:
+                # Target tanpa name/id: hasil tetap disimpan tanpa target
+                name = _target_name(row)
+                target_id = target_ids[str(name)] if name is not None else None
+                snr, exposure_time = _number(row.get("snr")), _number(row.get("exposure_time"))
+                if snr is None or exposure_time is None:
+                    continue
+                values.append((
+                    profile_id, target_id, source, *(_number(row.get(name)) for name in RESULT_COLUMNS[:4]),
+                    snr, exposure_time, now,
+                ))
+        conn = self.connection()
+        with conn:
+            conn.executemany(
+                "INSERT INTO results (profile_id, target_id, source, magnitude, sky_brightness, airmass, fwhm, "
+                "snr, exposure_time, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                values,
+            )
+        with self._lock:
+            self._written += len(values)
+        return len(values)
+
+    def flush(self, timeout=None):
+        """
+        Tunggu sampai hasil yang antre sebelum pemanggilan ini selesai ditulis (hasil yang masuk
+        sesudahnya tidak ditunggu). False jika timeout (detik) habis lebih dulu.
+        """
+        if self._queue is None or self._pid != os.getpid():
+            return True
+        marker = threading.Event()
+        self._queue.put(marker)
+        return marker.wait(timeout)
+
+    def reachable(self, profile, snr, max_exposure, after=0, limit=PAGE_SIZE, calibration_version=None):
+        """
+        Target yang pernah dihitung dengan profil ini (versi profil dan kalibrasi saat ini) mencapai
+        SNR >= snr dengan exposure_time < max_exposure: baris dengan exposure terpendek per target
+        (beserta SNR baris tersebut), urut id target
+        """
+        limit = _page_size(limit)
+        profile_id = self.find_profile_id(profile, calibration_version)
+        if profile_id is None:
+            return {"items": [], "next": None}
+        sql = (
+            "SELECT t.id, t.name, t.ra, t.dec, t.magnitude, r.exposure_time, r.snr FROM ("
+            "  SELECT target_id, exposure_time, snr FROM ("
+            "    SELECT target_id, exposure_time, snr, ROW_NUMBER() OVER ("
+            "      PARTITION BY target_id ORDER BY exposure_time, snr DESC) AS place FROM results"
+            "    WHERE profile_id = ? AND target_id > ? AND snr >= ? AND exposure_time < ?"
+            "  ) WHERE place = 1 ORDER BY target_id LIMIT ?"
+            ") AS r JOIN targets AS t ON t.id = r.target_id ORDER BY t.id"
+        )
+        minimum_snr = float(snr) * (1 - SNR_TOLERANCE)
+        rows = self.connection().execute(sql, (profile_id, int(after), minimum_snr, float(max_exposure), limit)).fetchall()
+        return self._result_page(rows, limit, "id")
+
+    def history(self, telescope=None, ccd=None, filter_name=None, source=None, before=None, limit=PAGE_SIZE):
+        """
+        Riwayat hasil perhitungan terbaru dulu (paginasi keyset dengan before = id terakhir)
+        """
+        sql = (
+            "SELECT r.id, r.source, p.telescope, p.ccd, p.filter, p.calibration_version, t.name AS target, "
+            "r.magnitude, r.sky_brightness, r.airmass, r.fwhm, r.snr, r.exposure_time, r.created_at "
+            "FROM results AS r JOIN profile_versions AS p ON p.id = r.profile_id "
+            "LEFT JOIN targets AS t ON t.id = r.target_id WHERE r.id < ?"
+        )
+        args = [int(before) if before is not None else 2 ** 63 - 1]
+        for column, value in (("p.telescope", telescope), ("p.ccd", ccd), ("p.filter", filter_name), ("r.source", source)):
+            if value is not None:
+                sql += f" AND {column} = ?"
+                args.append(value)
+        return self._page(sql + " ORDER BY r.id DESC LIMIT ?", args, limit)
+
+    def _page(self, sql, args, limit):
+        limit = _page_size(limit)
+        rows = self.connection().execute(sql, (*args, limit)).fetchall()
+        return self._result_page(rows, limit, "id")
+
+    @staticmethod
+    def _result_page(rows, limit, key):
+        items = [dict(row) for row in rows]
+        return {"items": items, "next": items[-1][key] if len(items) == limit else None}
+
+    def stats(self):
+        with self._lock:
+            return {
+                "written": self._written,
+                "dropped": self._dropped,
+                "failed": self._failed,
+                "queued": self._queued_rows,
+            }
+
+    def render(self):
+        stats = self.stats()
+        label = f'{{store="{self.name}"}}'
+        return [
+            "# HELP etc_store_written_total Hasil perhitungan yang tersimpan di SQLite",
+            "# TYPE etc_store_written_total counter",
+            f"etc_store_written_total{label} {stats['written']}",
+            "# HELP etc_store_dropped_total Hasil yang dibuang karena antrean penulis penuh",
+            "# TYPE etc_store_dropped_total counter",
+            f"etc_store_dropped_total{label} {stats['dropped']}",
+            "# HELP etc_store_failed_total Hasil yang gagal ditulis",
+            "# TYPE etc_store_failed_total counter",
+            f"etc_store_failed_total{label} {stats['failed']}",
+            "# HELP etc_store_queued Baris hasil yang menunggu ditulis",
+            "# TYPE etc_store_queued gauge",
+            f"etc_store_queued{label} {stats['queued']}",
+        ]
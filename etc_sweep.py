@@ -0,0 +1,146 @@
+import io
+import json
+import os
+
+import numpy as np
+
+import etc_engine
+
+# Sweep parameter ETC: grid Cartesian dari beberapa sumbu input (magnitude, exposure time,
+# SNR target, sky brightness, airmass/zenith distance, FWHM) dihitung dengan engine vektor.
+# Grid dipecah per blok sepanjang sumbu pertama supaya memori sementara engine terbatas,
+# hasil dikirim sebagai .npy (atau Arrow IPC jika pyarrow terpasang).
+
+INPUTS = ("magnitude", "exposure_time", "snr", "sky_brightness", "zenith_distance", "airmass", "fwhm")
+OUTPUTS = (
+    "snr", "exposure_time", "signal_star", "signal_sky", "num_pixels",
+    "noise_star", "noise_sky", "noise_dark", "noise_read", "total_noise",
+)
+DTYPES = {"float32": np.float32, "float64": np.float64}
+FORMATS = ("npy", "arrow", "png", "svg")
+MAX_POINTS = int(os.environ.get("ETC_SWEEP_MAX_POINTS", str(5_000_000)))
+CHUNK_POINTS = 1 << 18  # titik per blok engine
+
+
+def axis_values(spec):
+    """
+    Nilai satu sumbu dari {"values": [...]} atau {"start", "stop", "num"} (linspace)
+    """
+    if isinstance(spec, dict) and "values" in spec:
+        values = np.asarray(spec["values"], dtype=float)
+    elif isinstance(spec, dict):
+        num = int(spec.get("num", 50))
+        if num < 1:
+            raise ValueError("num harus >= 1")
+        values = np.linspace(float(spec["start"]), float(spec["stop"]), num)
+    else:
+        values = np.asarray(spec, dtype=float)
+    if values.ndim != 1 or values.size == 0:
+        raise ValueError("Sumbu harus berisi minimal satu nilai")
+    return values
+
+
+def prepare(axes, fixed, output):
+    """
+    Validasi request sweep -> (nama sumbu, nilai sumbu, nilai tetap, mode)
+    """
+    if not axes:
+        raise ValueError("Minimal satu sumbu sweep")
+    unknown = [name for name in list(axes) + list(fixed) if name not in INPUTS]
+    if unknown:
+        raise ValueError(f"Input {unknown[0]} tidak dikenal, pilih dari {', '.join(INPUTS)}")
+    overlap = set(axes) & set(fixed)
+    if overlap:
+        raise ValueError(f"{overlap.pop()} tidak boleh menjadi sumbu dan nilai tetap sekaligus")
+    given = set(axes) | set(fixed)
+    if ("snr" in given) == ("exposure_time" in given):
+        raise ValueError("Isi salah satu dari snr atau exposure_time")
+    if "airmass" in given and "zenith_distance" in given:
+        raise ValueError("Isi salah satu dari airmass atau zenith_distance")
+    if output not in OUTPUTS:
+        raise ValueError(f"Output {output} tidak dikenal, pilih dari {', '.join(OUTPUTS)}")
+
+    names = list(axes)
+    values = [axis_values(axes[name]) for name in names]
+    total = int(np.prod([v.size for v in values], dtype=np.int64))
+    if total > MAX_POINTS:
+        raise ValueError(f"Grid {total} titik melebihi batas {MAX_POINTS}")
+    return names, values, {name: float(value) for name, value in fixed.items()}
+
+
+def _inputs(names, values, fixed, rows):
+    # Sumbu ke-i di-reshape ke dimensi ke-i supaya engine mem-broadcast grid penuh
+    ndim = len(names)
+    inputs = dict(fixed)
+    for i, (name, axis) in enumerate(zip(names, values)):
+        if i == 0:
+            axis = axis[rows]
+        shape = [1] * ndim
+        shape[i] = axis.size
+        inputs[name] = axis.reshape(shape)
+    if "airmass" in inputs:
+        airmass = np.maximum(inputs.pop("airmass"), 1.0)
+        inputs["zenith_distance"] = np.degrees(np.arccos(1.0 / airmass))
+    inputs.setdefault("zenith_distance", 0.0)
+    return inputs
+
+
+def evaluate_grid(profile, names, values, fixed, output="snr", dtype=np.float64):
+    """
+    Output engine pada seluruh grid (shape = panjang tiap sumbu, urutan sesuai names)
+    """
+    shape = tuple(v.size for v in values)
+    result = np.empty(shape, dtype=dtype)
+    row_points = int(np.prod(shape[1:], dtype=np.int64))
+    rows_per_chunk = max(1, CHUNK_POINTS // max(row_points, 1))
+
+    for start in range(0, shape[0], rows_per_chunk):
+        rows = slice(start, min(start + rows_per_chunk, shape[0]))
+        inputs = _inputs(names, values, fixed, rows)
+        evaluated = etc_engine.evaluate(
+            profile, inputs["magnitude"], inputs["sky_brightness"], inputs["zenith_distance"], inputs["fwhm"],
+            snr_target=inputs.get("snr"), exposure_time=inputs.get("exposure_time"),
+        )
+        result[rows] = evaluated[output]
+    return result
+
+
+def required_inputs(names, fixed):
+    missing = [name for name in ("magnitude", "sky_brightness", "fwhm") if name not in names and name not in fixed]
+    if missing:
+        raise ValueError(f"Input wajib tidak ada: {', '.join(missing)}")
+
+
+def to_npy(grid):
+    buffer = io.BytesIO()
+    np.save(buffer, grid, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def to_arrow(grid, names, values, output):
+    """
+    Arrow IPC stream format panjang: satu kolom per sumbu dan satu kolom output
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ValueError("Format arrow membutuhkan pyarrow") from None
+    coordinates = np.meshgrid(*values, indexing="ij")
+    columns = {name: pa.array(coordinate.ravel()) for name, coordinate in zip(names, coordinates)}
+    columns[output] = pa.array(grid.ravel())
+    table = pa.table(columns)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def describe(names, values, output, dtype):
+    # Metadata untuk header response
+    return json.dumps({
+        "axes": names,
+        "shape": [v.size for v in values],
+        "ranges": {name: [float(v[0]), float(v[-1])] for name, v in zip(names, values)},
+        "output": output,
+        "dtype": np.dtype(dtype).name,
+    }, separators=(",", ":"))
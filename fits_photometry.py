@@ -0,0 +1,449 @@
+import argparse
+import csv
+import glob
+import math
+import os
+import sys
+from functools import partial
+
+import numpy as np
+
+import calibration
+import etc_engine
+
+# Fotometri aperture langsung dari frame FITS (pengganti langkah IRAF phot di luar project).
+# Data image dibuka dengan np.memmap tanpa menyalin seluruh frame: hanya cutout di sekitar
+# setiap bintang yang dibaca (fancy indexing), lalu recentroid, sky annulus, jumlah aperture
+# dan error dihitung sekaligus untuk semua bintang dalam satu chunk (array [bintang, y, x]).
+# Parameter default mengikuti phot_output.txt (CBOXWIDTH 5, MAXSHIFT 1, ANNULUS 10, DANNULUS 10,
+# APERTURES 3, ZMAG 25); error memakai rumus IRAF phot, prediksi SNR memakai etc_engine
+# untuk instrumen dan kondisi yang sama.
+
+BLOCK_SIZE = 2880
+CARD_SIZE = 80
+BITPIX_DTYPES = {8: ">u1", 16: ">i2", 32: ">i4", 64: ">i8", -32: ">f4", -64: ">f8"}
+
+APERTURE = 3.0  # piksel
+ANNULUS = 10.0
+DANNULUS = 10.0
+CBOX = 5  # lebar kotak centroid (piksel)
+MAXSHIFT = 1.0
+CENTROID_ITERATIONS = 3
+SKY_CLIP = 3.0
+SKY_ITERATIONS = 3
+ZMAG = 25.0
+STAR_CHUNK = 1024  # bintang per chunk (memori cutout)
+
+FLAG_EDGE = 1  # aperture keluar dari frame
+FLAG_BIG_SHIFT = 2  # pergeseran centroid > MAXSHIFT (BigShift di IRAF)
+FLAG_SATURATED = 4
+FLAG_NO_SKY = 8
+FLAG_NO_FLUX = 16
+
+RESULT_FIELDS = (
+    "id", "x_init", "y_init", "x", "y", "x_shift", "y_shift", "sky", "sky_std", "n_sky",
+    "area", "sum", "flux", "flux_error", "snr", "mag", "mag_error", "peak", "flags",
+    "catalog_mag", "etc_snr", "snr_ratio",
+)
+HEADER_KEYWORDS = {
+    "exposure_time": ("EXPTIME", "EXPOSURE", "ITIME"),
+    "filter": ("FILTER",),
+    "airmass": ("AIRMASS",),
+    "gain": ("GAIN", "EGAIN"),
+    "date": ("DATE-OBS",),
+    "saturation": ("SATURATE", "DATAMAX"),
+    "site": ("SITE", "OBSERVAT"),
+}
+
+
+def _card_value(text):
+    text = text.split(" /", 1)[0].strip() if not text.lstrip().startswith("'") else text.strip()
+    if text.startswith("'"):
+        # String FITS: '' di dalam string berarti satu kutip
+        end = 1
+        while True:
+            end = text.index("'", end)
+            if text[end + 1:end + 2] == "'":
+                end += 2
+                continue
+            return text[1:end].replace("''", "'").rstrip()
+    if text in ("T", "F"):
+        return text == "T"
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text.replace("D", "E"))
+    except ValueError:
+        return text or None
+
+
+def read_header(f):
+    """
+    Header primary HDU sebagai dict dan offset awal data (byte)
+    """
+    header = {}
+    offset = 0
+    while True:
+        block = f.read(BLOCK_SIZE)
+        if len(block) < BLOCK_SIZE:
+            raise ValueError("File FITS terpotong sebelum keyword END")
+        offset += BLOCK_SIZE
+        for start in range(0, BLOCK_SIZE, CARD_SIZE):
+            card = block[start:start + CARD_SIZE].decode("ascii", errors="replace")
+            key = card[:8].strip()
+            if key == "END":
+                return header, offset
+            if card[8:10] == "= ":
+                header[key] = _card_value(card[10:])
+
+
+def open_image(path):
+    """
+    Header dan data image (memmap, read-only, shape [NAXIS2, NAXIS1]) tanpa membaca seluruh frame.
+    BSCALE/BZERO dikembalikan terpisah dan hanya diterapkan pada cutout.
+    """
+    with open(path, "rb") as f:
+        header, offset = read_header(f)
+    if header.get("SIMPLE") is not True:
+        raise ValueError(f"{path} bukan file FITS standar")
+    axes = [header.get(f"NAXIS{i}", 1) for i in range(1, header.get("NAXIS", 0) + 1)]
+    if len(axes) < 2 or any(n != 1 for n in axes[2:]):
+        raise ValueError(f"{path}: hanya image 2 dimensi yang didukung (NAXIS={header.get('NAXIS')})")
+    dtype = BITPIX_DTYPES.get(header.get("BITPIX"))
+    if dtype is None:
+        raise ValueError(f"{path}: BITPIX {header.get('BITPIX')} tidak didukung")
+    data = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(axes[1], axes[0]))
+    scale = (float(header.get("BSCALE", 1.0)), float(header.get("BZERO", 0.0)))
+    return header, data, scale
+
+
+def header_value(header, name, default=None):
+    for key in HEADER_KEYWORDS[name]:
+        if header.get(key) not in (None, ""):
+            return header[key]
+    return default
+
+
+def read_coordinates(path):
+    """
+    Daftar koordinat (mis. starlist.txt): kolom x y [magnitude katalog], koordinat IRAF (piksel pertama = 1).
+    Baris kosong dan komentar # dilewati.
+    """
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            tokens = line.split("#", 1)[0].split()
+            if tokens:
+                rows.append([float(t) for t in tokens[:3]] + [math.nan] * (3 - len(tokens[:3])))
+    if not rows:
+        raise ValueError(f"{path} tidak berisi koordinat")
+    table = np.array(rows)
+    return {"x": table[:, 0], "y": table[:, 1], "catalog_mag": table[:, 2]}
+
+
+def _cutouts(data, scale, x, y, half):
+    # Kotak (2 half + 1)² di sekitar piksel terdekat; piksel di luar frame = NaN
+    rows = np.rint(y).astype(int)[:, None] + np.arange(-half, half + 1)
+    cols = np.rint(x).astype(int)[:, None] + np.arange(-half, half + 1)
+    inside = ((rows >= 0) & (rows < data.shape[0]))[:, :, None] & ((cols >= 0) & (cols < data.shape[1]))[:, None, :]
+    pixels = data[np.clip(rows, 0, data.shape[0] - 1)[:, :, None], np.clip(cols, 0, data.shape[1] - 1)[:, None, :]]
+    pixels = pixels.astype(float) * scale[0] + scale[1]
+    pixels[~inside] = np.nan
+    return pixels, rows[:, half], cols[:, half]
+
+
+def _centroid(pixels, half, cbox, iterations):
+    # Centroid marginal (algoritma "centroid" IRAF): marginal dikurangi rata-ratanya, bagian positif
+    # sebagai bobot. Kotak cbox digeser ke centroid sebelumnya setiap iterasi.
+    n = pixels.shape[0]
+    box = cbox // 2
+    offsets = np.arange(-box, box + 1)
+    dx = np.zeros(n)
+    dy = np.zeros(n)
+    star = np.arange(n)[:, None, None]
+    for _ in range(iterations):
+        cx = np.clip(half + np.rint(dx).astype(int), box, 2 * half - box)
+        cy = np.clip(half + np.rint(dy).astype(int), box, 2 * half - box)
+        sub = pixels[star, (cy[:, None] + offsets)[:, :, None], (cx[:, None] + offsets)[:, None, :]]
+        missing = np.isnan(sub)
+        if missing.any():
+            # Piksel NaN (di luar frame) diisi minimum cutout bintang itu sendiri, bukan seluruh chunk
+            floor = np.where(missing, np.inf, sub).min(axis=(1, 2), keepdims=True)
+            sub = np.where(missing, np.where(np.isfinite(floor), floor, 0.0), sub)
+        marginal_x = sub.sum(axis=1)
+        marginal_y = sub.sum(axis=2)
+        weight_x = np.clip(marginal_x - marginal_x.mean(axis=1, keepdims=True), 0, None)
+        weight_y = np.clip(marginal_y - marginal_y.mean(axis=1, keepdims=True), 0, None)
+        total_x, total_y = weight_x.sum(axis=1), weight_y.sum(axis=1)
+        valid = (total_x > 0) & (total_y > 0)
+        new_dx = cx - half + (weight_x * offsets).sum(axis=1) / np.where(valid, total_x, 1)
+        new_dy = cy - half + (weight_y * offsets).sum(axis=1) / np.where(valid, total_y, 1)
+        dx = np.where(valid, new_dx, dx)
+        dy = np.where(valid, new_dy, dy)
+    return dx, dy
+
+
+def _sky(values, mask):
+    # Sky per bintang: sigma clipping lalu median piksel annulus yang tersisa.
+    # mean/std dari jumlah bermask dan median dari satu sort (nanmedian per baris jauh lebih lambat).
+    for _ in range(SKY_ITERATIONS):
+        count = np.maximum(mask.sum(axis=1), 1)
+        mean = np.where(mask, values, 0.0).sum(axis=1) / count
+        deviation = np.where(mask, values - mean[:, None], 0.0)
+        std = np.sqrt((deviation ** 2).sum(axis=1) / count)
+        mask = mask & (np.abs(deviation) <= SKY_CLIP * std[:, None])
+    count = mask.sum(axis=1)
+    ordered = np.sort(np.where(mask, values, np.inf), axis=1)
+    lower = np.clip((count - 1) // 2, 0, None)[:, None]
+    upper = np.clip(count // 2, 0, None)[:, None]
+    sky = (np.take_along_axis(ordered, lower, axis=1) + np.take_along_axis(ordered, upper, axis=1))[:, 0] / 2
+    mean = np.where(mask, values, 0.0).sum(axis=1) / np.maximum(count, 1)
+    std = np.sqrt((np.where(mask, values - mean[:, None], 0.0) ** 2).sum(axis=1) / np.maximum(count, 1))
+    return np.where(count > 0, sky, np.nan), np.where(count > 0, std, np.nan), count
+
+
+def measure_stars(data, scale, x, y, gain, exposure_time=1.0, aperture=APERTURE,
+                  annulus=ANNULUS, dannulus=DANNULUS, cbox=CBOX, maxshift=MAXSHIFT, saturation=np.inf, zmag=ZMAG):
+    """
+    Fotometri satu chunk bintang. x, y koordinat array (0-based, pusat piksel pertama = 0).
+    Error = sqrt(flux / gain + area sigma_sky² + area² sigma_sky² / n_sky) seperti IRAF phot
+    (sigma_sky dari annulus sudah memuat read noise).
+    """
+    half = int(math.ceil(max(annulus + dannulus, aperture) + maxshift + 1))
+    pixels, row0, col0 = _cutouts(data, scale, x, y, half)
+    with np.errstate(invalid="ignore", all="ignore"):
+        dx, dy = _centroid(pixels, half, cbox, CENTROID_ITERATIONS)
+    xc = col0 + dx
+    yc = row0 + dy
+
+    # Geometri hanya untuk piksel yang bisa terjangkau aperture/annulus dengan pergeseran centroid chunk ini
+    reach = min(math.ceil(max(np.abs(dx).max(), np.abs(dy).max(), 0.0)) + 1, half)
+    grid_y, grid_x = (axis.ravel() for axis in np.mgrid[-half:half + 1, -half:half + 1])
+    radius0 = np.hypot(grid_x, grid_y)
+    flat = pixels.reshape(len(x), -1)
+
+    columns = np.flatnonzero(radius0 <= aperture + 0.5 + reach)
+    distance = np.hypot(grid_x[columns] - dx[:, None], grid_y[columns] - dy[:, None])
+    # Bobot piksel tepi aperture: pendekatan linear luas irisan (1 di dalam, 0 di luar)
+    weight = np.clip(aperture + 0.5 - distance, 0.0, 1.0)
+    values = flat.take(columns, axis=1)
+    in_aperture = weight > 0
+    edge = np.any(in_aperture & np.isnan(values), axis=1)
+    values = np.where(np.isnan(values), 0.0, values)
+    area = weight.sum(axis=1)
+    total = (values * weight).sum(axis=1)
+    peak = np.where(in_aperture, values, -np.inf).max(axis=1)
+
+    columns = np.flatnonzero((radius0 >= annulus - reach) & (radius0 <= annulus + dannulus + reach))
+    distance = np.hypot(grid_x[columns] - dx[:, None], grid_y[columns] - dy[:, None])
+    values = flat.take(columns, axis=1)
+    sky_mask = (distance >= annulus) & (distance <= annulus + dannulus) & ~np.isnan(values)
+    sky, sky_std, n_sky = _sky(values, sky_mask)
+    flux = total - area * sky
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        variance = np.clip(flux, 0, None) / gain + area * sky_std ** 2 + area ** 2 * sky_std ** 2 / n_sky
+        error = np.sqrt(variance)
+        snr = flux / error
+        mag = np.where(flux > 0, zmag - 2.5 * np.log10(flux / exposure_time), np.nan)
+        mag_error = np.where(flux > 0, 2.5 / math.log(10) * error / flux, np.nan)
+
+    flags = (
+        FLAG_EDGE * edge
+        + FLAG_BIG_SHIFT * (np.hypot(dx, dy) > maxshift)
+        + FLAG_SATURATED * (peak >= saturation)
+        + FLAG_NO_SKY * (n_sky == 0)
+        + FLAG_NO_FLUX * ~(flux > 0)
+    )
+    return {
+        # Kembali ke koordinat IRAF (1-based) untuk output
+        "x": xc + 1, "y": yc + 1, "x_shift": xc - x, "y_shift": yc - y,
+        "sky": sky, "sky_std": sky_std, "n_sky": n_sky, "area": area, "sum": total,
+        "flux": flux, "flux_error": error, "snr": snr, "mag": mag, "mag_error": mag_error,
+        "peak": peak, "flags": flags.astype(int),
+    }
+
+
+def etc_prediction(profile, flux, sky, area, exposure_time, airmass, catalog_mag=None, gain=None):
+    """
+    SNR prediksi etc_engine untuk bintang yang sama: signal dari magnitude katalog (jika ada)
+    atau dari flux terukur, sky per piksel dari annulus, jumlah piksel = luas aperture.
+    gain (e-/ADU) = gain yang dipakai saat mengukur frame, default gain profil.
+    """
+    gain = profile.gain if gain is None else gain
+    signal_star = flux * gain / exposure_time
+    if catalog_mag is not None:
+        from_catalog = etc_engine.calculate_signal(
+            catalog_mag, profile.zeropoint, profile.extinction_coefficient * airmass,
+            profile.aperture_area, profile.quantum_efficiency,
+        )
+        signal_star = np.where(np.isfinite(catalog_mag), from_catalog, signal_star)
+    signal_sky = np.clip(sky, 0, None) * gain / exposure_time
+    return etc_engine.calculate_snr(
+        signal_star, signal_sky, profile.read_noise, profile.dark_current, area, exposure_time
+    )
+
+
+def measure_frame(path, coordinates, profile=None, exposure_time=None, airmass=None, gain=None,
+                  aperture=APERTURE, annulus=ANNULUS, dannulus=DANNULUS, cbox=CBOX, maxshift=MAXSHIFT, zmag=ZMAG):
+    """
+    Fotometri semua bintang dari coordinates (read_coordinates) pada satu frame.
+    Nilai header (EXPTIME, AIRMASS, GAIN, SATURATE) dipakai jika argumen tidak diisi;
+    tanpa header gain dipakai gain profil, tanpa profil 1 e-/ADU. Tanpa SATURATE/DATAMAX batas
+    saturasi = saturation_level profil / gain, maksimal 2^adc_bits - 1 ADU.
+    """
+    header, data, scale = open_image(path)
+    exposure_time = float(exposure_time or header_value(header, "exposure_time", 1.0))
+    airmass = float(airmass or header_value(header, "airmass", 1.0))
+    gain = float(gain or header_value(header, "gain") or (profile.gain if profile is not None else 1.0))
+    saturation = header_value(header, "saturation")
+    if saturation is not None:
+        saturation = float(saturation)
+    elif profile is not None:
+        # Batas elektron profil dalam ADU frame ini, tidak melebihi nilai maksimum ADC
+        saturation = profile.saturation_level / gain
+        if profile.adc_bits is not None:
+            saturation = min(saturation, 2 ** profile.adc_bits - 1)
+    else:
+        saturation = np.inf
+
+    x = np.asarray(coordinates["x"], dtype=float) - 1
+    y = np.asarray(coordinates["y"], dtype=float) - 1
+    columns = {}
+    for start in range(0, len(x), STAR_CHUNK):
+        part = measure_stars(
+            data, scale, x[start:start + STAR_CHUNK], y[start:start + STAR_CHUNK], gain,
+            exposure_time=exposure_time, aperture=aperture, annulus=annulus, dannulus=dannulus,
+            cbox=cbox, maxshift=maxshift, saturation=saturation, zmag=zmag,
+        )
+        for name, values in part.items():
+            columns.setdefault(name, []).append(values)
+    result = {name: np.concatenate(parts) for name, parts in columns.items()}
+    result["id"] = np.arange(1, len(x) + 1)
+    result["x_init"], result["y_init"] = x + 1, y + 1
+    result["catalog_mag"] = np.asarray(coordinates.get("catalog_mag", np.full(len(x), np.nan)), dtype=float)
+    if profile is not None:
+        result["etc_snr"] = etc_prediction(
+            profile, result["flux"], result["sky"], result["area"], exposure_time, airmass, result["catalog_mag"],
+            gain,
+        )
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result["snr_ratio"] = result["snr"] / result["etc_snr"]
+    else:
+        result["etc_snr"] = result["snr_ratio"] = np.full(len(x), np.nan)
+    del data  # tutup memmap
+    return {
+        "image": os.path.basename(path),
+        "exposure_time": exposure_time,
+        "airmass": airmass,
+        "gain": gain,
+        "filter": header_value(header, "filter"),
+        "date": header_value(header, "date"),
+        "stars": result,
+    }
+
+
+def measure_frames(paths, coordinates, profile=None, workers=None, **options):
+    """
+    Fotometri banyak frame di process pool (satu frame per task), hasil berurutan sesuai paths
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(paths) == 1:
+        for path in paths:
+            yield measure_frame(path, coordinates, profile, **options)
+        return
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        yield from pool.map(partial(measure_frame, coordinates=coordinates, profile=profile, **options), paths)
+
+
+def measurements(frames, telescope, ccd, filter_name=None, max_flags=0):
+    """
+    Kolom pengukuran untuk calibration.calibrate dari hasil measure_frame
+    (hanya bintang dengan magnitude katalog dan tanpa flag)
+    """
+    columns = {name: [] for name in calibration.MEASUREMENT_FIELDS + ("mag_error",)}
+    for frame in frames:
+        stars = frame["stars"]
+        use = np.isfinite(stars["catalog_mag"]) & (stars["flags"] <= max_flags) & (stars["flux"] > 0)
+        count = int(use.sum())
+        columns["telescope"].extend([telescope] * count)
+        columns["ccd"].extend([ccd] * count)
+        columns["filter"].extend([filter_name or frame["filter"]] * count)
+        columns["catalog_mag"].extend(stars["catalog_mag"][use])
+        # calibration memakai flux dalam ADU dan gain profil
+        columns["flux"].extend(stars["flux"][use])
+        columns["exposure_time"].extend([frame["exposure_time"]] * count)
+        columns["airmass"].extend([frame["airmass"]] * count)
+        columns["mag_error"].extend(stars["mag_error"][use])
+    return {name: np.array(values) for name, values in columns.items()}
+
+
+def write_csv(frames, output):
+    writer = csv.writer(output)
+    writer.writerow(("image",) + RESULT_FIELDS)
+    for frame in frames:
+        stars = frame["stars"]
+        for row in zip(*(stars[name].tolist() for name in RESULT_FIELDS)):
+            writer.writerow((frame["image"],) + tuple(f"{v:.6g}" if isinstance(v, float) else v for v in row))
+
+
+def main(argv=None):
+    import instrument_profiles
+
+    parser = argparse.ArgumentParser(description="Fotometri aperture frame FITS dan perbandingan SNR dengan ETC")
+    parser.add_argument("frames", nargs="+", help="file FITS atau direktori")
+    parser.add_argument("--coords", required=True, help="daftar koordinat x y [magnitude], mis. starlist.txt")
+    parser.add_argument("--config", default="instruments.json")
+    parser.add_argument("--calibration", default="calibration.json", help="hasil Perhitungan_Zeropoint.py (dilewati jika tidak ada)")
+    parser.add_argument("--telescope")
+    parser.add_argument("--ccd")
+    parser.add_argument("--filter", help="default keyword FILTER di header")
+    parser.add_argument("--exposure-time", type=float)
+    parser.add_argument("--airmass", type=float)
+    parser.add_argument("--gain", type=float)
+    parser.add_argument("--aperture", type=float, default=APERTURE)
+    parser.add_argument("--annulus", type=float, default=ANNULUS)
+    parser.add_argument("--dannulus", type=float, default=DANNULUS)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--output", help="CSV hasil (default stdout)")
+    args = parser.parse_args(argv)
+
+    paths = []
+    for item in args.frames:
+        if os.path.isdir(item):
+            paths.extend(sorted(p for ext in ("*.fit", "*.fits", "*.fts") for p in glob.glob(os.path.join(item, ext))))
+        else:
+            paths.append(item)
+    if not paths:
+        parser.error("Tidak ada frame FITS")
+
+    profile = None
+    if args.telescope and args.ccd:
+        profiles = instrument_profiles.ProfileRegistry(args.config, calibration_path=args.calibration).profiles()
+        filter_name = args.filter
+        if filter_name is None:
+            with open(paths[0], "rb") as f:
+                filter_name = header_value(read_header(f)[0], "filter")
+        profile = profiles.get((args.telescope, args.ccd, filter_name))
+        if profile is None:
+            parser.error(f"Kombinasi {args.telescope}, {args.ccd}, {filter_name} tidak ada")
+
+    coordinates = read_coordinates(args.coords)
+    frames = measure_frames(
+        paths, coordinates, profile, workers=args.workers, exposure_time=args.exposure_time,
+        airmass=args.airmass, gain=args.gain, aperture=args.aperture, annulus=args.annulus, dannulus=args.dannulus,
+    )
+    if args.output:
+        with open(args.output, "w", newline="", encoding="utf-8") as f:
+            write_csv(frames, f)
+    else:
+        write_csv(frames, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
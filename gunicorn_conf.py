@@ -0,0 +1,29 @@
+import os
+
+import etc_logging
+import etc_serving
+
+# Konfigurasi gunicorn untuk menjalankan app ETC dengan beberapa worker uvicorn:
+#   gunicorn -c gunicorn_conf.py main2_24_march:app
+#   gunicorn -c gunicorn_conf.py Las_cumbres:app
+# preload_app: modul app (profil instrumen, tabel aperture) di-import sekali di master,
+# worker hasil fork berbagi memori tersebut. Thread pool dan process pool plot dibuat
+# lazy di masing-masing worker.
+
+bind = f"{os.environ.get('ETC_HOST', '127.0.0.1')}:{os.environ.get('ETC_PORT', '8000')}"
+workers = int(os.environ.get("ETC_WORKERS", str(os.cpu_count() or 1)))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# Lebih panjang dari ETC_COMPUTE_TIMEOUT supaya request lambat dijawab 504, bukan worker dibunuh
+timeout = int(etc_serving.COMPUTE_TIMEOUT) + 30
+graceful_timeout = 30
+keepalive = 5
+
+
+def on_starting(server):
+    etc_serving.warmup()
+
+
+def post_fork(server, worker):
+    # Thread QueueListener logging tidak ikut ter-fork
+    etc_logging.restart_after_fork()
@@ -0,0 +1,275 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# Profil instrumen (teleskop + CCD + filter) yang dikompilasi sekali dari file config.
+# Besaran turunan (aperture area, pixel scale, zeropoint per filter) dihitung saat load,
+# bukan di setiap request.
+
+
+class InstrumentProfile:
+    """
+    Parameter satu kombinasi teleskop, CCD dan filter (immutable)
+    """
+    __slots__ = (
+        "telescope", "ccd", "filter",
+        "aperture", "focal_length", "aperture_area",
+        "pixel_size", "pixel_scale",
+        "quantum_efficiency", "read_noise", "dark_current", "gain",
+        "full_well", "adc_bits", "adc_gain", "readout_time",
+        "zeropoint", "extinction_coefficient",
+    )
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            object.__setattr__(self, name, values[name])
+
+    def __setattr__(self, name, value):
+        raise AttributeError("InstrumentProfile tidak bisa diubah")
+
+    def __delattr__(self, name):
+        raise AttributeError("InstrumentProfile tidak bisa diubah")
+
+    def __reduce__(self):
+        # Supaya bisa dikirim ke process pool
+        return (_rebuild_profile, (self.as_dict(),))
+
+    def __repr__(self):
+        return f"InstrumentProfile({self.telescope!r}, {self.ccd!r}, {self.filter!r})"
+
+    @property
+    def key(self):
+        return (self.telescope, self.ccd, self.filter)
+
+    @property
+    def saturation_level(self):
+        """
+        Batas saturasi piksel (elektron): full well atau batas ADC, mana yang lebih kecil.
+        inf jika CCD tidak punya data full_well/adc_bits di config.
+        """
+        limits = [math.inf]
+        if self.full_well is not None:
+            limits.append(self.full_well)
+        if self.adc_bits is not None:
+            limits.append((2 ** self.adc_bits - 1) * self.adc_gain)
+        return min(limits)
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def _rebuild_profile(values):
+    return InstrumentProfile(**values)
+
+
+def compile_profiles(config):
+    """
+    Membuat InstrumentProfile untuk setiap (teleskop, CCD, filter) dari isi config
+    """
+    profiles = {}
+    for combination in config["combinations"]:
+        telescope_name = combination["telescope"]
+        ccd_name = combination["ccd"]
+        telescope_data = config["telescopes"][telescope_name]
+        ccd_data = config["ccds"][ccd_name]
+
+        aperture_area = math.pi * (telescope_data["aperture"] / 2) ** 2  # m²
+        # Plate scale: 206.265 arcsec/mm dibagi focal length (mm), dikali pixel size (µm)
+        pixel_scale = 206.265 * ccd_data["pixel_size"] / (telescope_data["focal_length"] * 1000)  # arcsec/pixel
+
+        for filter_name in config["filters"]:
+            zeropoint = combination.get("zeropoints", {}).get(filter_name, combination["zeropoint"])
+            profile = InstrumentProfile(
+                telescope=telescope_name,
+                ccd=ccd_name,
+                filter=filter_name,
+                aperture=telescope_data["aperture"],
+                focal_length=telescope_data["focal_length"],
+                aperture_area=aperture_area,
+                pixel_size=ccd_data["pixel_size"],
+                pixel_scale=pixel_scale,
+                quantum_efficiency=ccd_data["quantum_efficiency"],
+                read_noise=ccd_data["read_noise"],
+                dark_current=ccd_data["dark_current"],
+                gain=ccd_data.get("gain", 1.0),
+                full_well=ccd_data.get("full_well"),
+                adc_bits=ccd_data.get("adc_bits"),
+                adc_gain=ccd_data.get("adc_gain", ccd_data.get("gain", 1.0)),
+                readout_time=ccd_data.get("readout_time", 0.0),
+                zeropoint=zeropoint,
+                extinction_coefficient=config["extinction"][filter_name],
+            )
+            profiles[profile.key] = profile
+    return profiles
+
+
+def load_config(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def apply_calibration(profiles, calibration, reference_airmass=0.0):
+    """
+    Ganti zeropoint dan ekstingsi dengan hasil file kalibrasi (calibration.py).
+    Zeropoint kalibrasi berlaku pada airmass calibration["zeropoint_airmass"];
+    reference_airmass adalah airmass acuan zeropoint di app (0 untuk k·X, 1 untuk k·(X-1)).
+    """
+    profiles = dict(profiles)
+    shift = reference_airmass - calibration.get("zeropoint_airmass", 0.0)
+    for result in calibration["results"]:
+        key = (result["telescope"], result["ccd"], result["filter"])
+        profile = profiles.get(key)
+        if profile is None:
+            continue
+        values = profile.as_dict()
+        values["zeropoint"] = result["zeropoint"] - result["extinction"] * shift
+        values["extinction_coefficient"] = result["extinction"]
+        profiles[key] = InstrumentProfile(**values)
+    return profiles
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+_State = namedtuple("_State", "profiles telescopes ccds filters combinations mtime generation calibration_version")
+
+
+class ProfileRegistry:
+    """
+    Kumpulan InstrumentProfile dari satu file config, ditambah file kalibrasi
+    (opsional, hasil Perhitungan_Zeropoint.py) yang menimpa zeropoint dan ekstingsi.
+    File dicek ulang (paling sering tiap check_interval detik) dan jika berubah,
+    seluruh profil dikompilasi ulang lalu diganti sekaligus tanpa restart server.
+    """
+
+    def __init__(self, path, check_interval=1.0, calibration_path=None, reference_airmass=0.0):
+        self.path = path
+        self.calibration_path = calibration_path
+        self.reference_airmass = reference_airmass
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._last_check = time.monotonic()
+        self._listeners = []
+        self._failed_mtime = None
+        self._state = self._build(generation=1)
+
+    def _mtimes(self):
+        return (os.stat(self.path).st_mtime_ns, self.calibration_path and _mtime(self.calibration_path))
+
+    def _build(self, generation):
+        mtime = self._mtimes()
+        config = load_config(self.path)
+        profiles = compile_profiles(config)
+        calibration_version = None
+        if mtime[1] is not None:
+            calibration = load_config(self.calibration_path)
+            profiles = apply_calibration(profiles, calibration, self.reference_airmass)
+            calibration_version = calibration.get("version")
+        return _State(
+            profiles=profiles,
+            telescopes=list(config["telescopes"]),
+            ccds=list(config["ccds"]),
+            filters=list(config["filters"]),
+            combinations=[(c["telescope"], c["ccd"]) for c in config["combinations"]],
+            mtime=mtime,
+            generation=generation,
+            calibration_version=calibration_version,
+        )
+
+    def reload(self):
+        """
+        Kompilasi ulang dari file; state lama tetap dipakai jika file tidak valid
+        """
+        with self._lock:
+            state = self._build(self._state.generation + 1)
+            self._state = state  # satu assignment, pembaca melihat state lama atau baru
+        for callback in self._listeners:
+            callback(state)
+        return state
+
+    def add_listener(self, callback):
+        """
+        Daftarkan callback(state) yang dipanggil setiap profil dimuat ulang (mis. membersihkan cache)
+        """
+        self._listeners.append(callback)
+
+    def maybe_reload(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+        try:
+            mtime = self._mtimes()
+        except OSError:
+            return False
+        # File yang sama yang sudah gagal dimuat tidak dicoba (dan di-log) ulang sampai berubah lagi
+        changed = mtime != self._state.mtime and mtime != self._failed_mtime
+        if changed:
+            try:
+                self.reload()
+            except Exception:
+                # Config/kalibrasi tidak valid (bentuk apa pun): state lama tetap dipakai
+                self._failed_mtime = mtime
+                logger.exception("Gagal memuat ulang profil instrumen, profil lama tetap dipakai")
+                return False
+        return changed
+
+    def _current(self):
+        self.maybe_reload()
+        return self._state
+
+    @property
+    def generation(self):
+        return self._current().generation
+
+    @property
+    def calibration_version(self):
+        return self._current().calibration_version
+
+    @property
+    def telescopes(self):
+        return self._current().telescopes
+
+    @property
+    def ccds(self):
+        return self._current().ccds
+
+    @property
+    def filters(self):
+        return self._current().filters
+
+    @property
+    def combinations(self):
+        return self._current().combinations
+
+    def profiles(self):
+        return self._current().profiles
+
+    def get(self, telescope, ccd, filter_name):
+        """
+        Profil untuk (teleskop, CCD, filter); KeyError jika kombinasi tidak valid
+        """
+        profiles = self._current().profiles
+        try:
+            return profiles[(telescope, ccd, filter_name)]
+        except KeyError:
+            raise KeyError(f"Kombinasi {telescope}, {ccd} dan filter {filter_name} tidak valid.") from None
+
+    def for_combination(self, telescope, ccd):
+        """
+        Semua profil (per filter) untuk satu kombinasi teleskop dan CCD
+        """
+        state = self._current()
+        if (telescope, ccd) not in state.combinations:
+            raise KeyError(f"Kombinasi {telescope} dan {ccd} tidak valid.")
+        return {f: state.profiles[(telescope, ccd, f)] for f in state.filters}
@@ -0,0 +1,296 @@
+import mmap
+import os
+import re
+import sys
+
+import numpy as np
+
+# Parser output IRAF apphot.phot (mis. phot_output.txt).
+# Skema kolom dibaca dari header #N/#U/#F, keyword #K (ZMAG, FWHMPSF, APERTURES, ...)
+# disimpan sebagai metadata. Record bintang (beberapa baris bersambung "\") dibaca
+# per chunk menjadi NumPy structured array, file besar dibaca lewat mmap sehingga
+# memori tetap konstan.
+
+CHUNK_SIZE = 4096
+INDEF = b"INDEF"
+INDEF_INT = -2147483647  # INDEFI di IRAF
+ERROR_FLAGS = ("CIER", "SIER", "PIER")
+
+_FORMAT = re.compile(r"%-?(\d+)(?:\.(\d+))?([a-z])")
+
+
+def _format_kind(fmt):
+    match = _FORMAT.fullmatch(fmt)
+    if match is None:
+        raise ValueError(f"Format IRAF {fmt} tidak dikenal")
+    width, _, code = match.groups()
+    if code == "d":
+        return "int", int(width)
+    if code in "fge":
+        return "float", int(width)
+    if code == "b":
+        return "bool", int(width)
+    return "str", int(width)
+
+
+def _keyword_value(text, fmt):
+    kind, _ = _format_kind(fmt)
+    if text == '""':
+        return ""
+    if text == "INDEF":
+        return None
+    if kind == "int":
+        return int(text)
+    if kind == "float":
+        return float(text)
+    if kind == "bool":
+        return text == "yes"
+    return text
+
+
+def _iter_lines(source):
+    # source: path file (dibaca lewat mmap) atau bytes
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield from _split_lines(source)
+        return
+    with open(source, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from _split_lines(mm)
+
+
+def _split_lines(buffer):
+    pos = 0
+    size = len(buffer)
+    while pos < size:
+        end = buffer.find(b"\n", pos)
+        if end == -1:
+            end = size
+        yield bytes(buffer[pos:end]).rstrip(b"\r")
+        pos = end + 1
+
+
+def _continues(line):
+    return line.rstrip().endswith(b"\\")
+
+
+def _strip_continuation(line):
+    line = line.rstrip()
+    return line[:-1] if line.endswith(b"\\") else line
+
+
+class _Schema:
+    """
+    Kolom per grup baris (#N/#U/#F); grup terakhir berulang untuk tiap aperture
+    """
+
+    def __init__(self, groups):
+        self.groups = groups  # list of list (name, unit, fmt)
+        self.n_apertures = None
+        self.dtype = None
+
+    @property
+    def columns(self):
+        return [column for group in self.groups for column in group]
+
+    def build_dtype(self, n_apertures):
+        self.n_apertures = n_apertures
+        fields = []
+        for index, group in enumerate(self.groups):
+            per_aperture = index == len(self.groups) - 1 and n_apertures > 1
+            for name, _, fmt in group:
+                kind, width = _format_kind(fmt)
+                base = {"int": np.int64, "float": np.float64, "bool": np.bool_, "str": f"U{width}"}[kind]
+                fields.append((name, base, (n_apertures,)) if per_aperture else (name, base))
+        self.dtype = np.dtype(fields)
+
+
+def _convert(tokens, fmt):
+    # Konversi satu kolom sekaligus dari array bytes
+    kind, _ = _format_kind(fmt)
+    raw = np.array(tokens, dtype=bytes)
+    indef = raw == INDEF
+    if kind == "float":
+        raw[indef] = b"nan"
+        return raw.astype(np.float64)
+    if kind == "int":
+        raw[indef] = str(INDEF_INT).encode()
+        return raw.astype(np.int64)
+    if kind == "bool":
+        return raw == b"yes"
+    raw[indef] = b""
+    return np.char.decode(raw, "utf-8")
+
+
+def _to_array(schema, rows):
+    """
+    rows: list of list-token per grup -> structured array (konversi per kolom)
+    """
+    records = np.empty(len(rows), dtype=schema.dtype)
+    last = len(schema.groups) - 1
+    for index, group in enumerate(schema.groups):
+        for position, (name, _, fmt) in enumerate(group):
+            if index == last and schema.n_apertures > 1:
+                for aperture in range(schema.n_apertures):
+                    tokens = [row[index + aperture][position] for row in rows]
+                    records[name][:, aperture] = _convert(tokens, fmt)
+            else:
+                records[name] = _convert([row[index][position] for row in rows], fmt)
+    return records
+
+
+def _parse(source, chunk_size, metadata_only=False):
+    """
+    Generator ("metadata", dict) lalu ("records", structured array) per chunk
+    """
+    keywords = {}
+    units = {}
+    groups = []
+    names = units_line = None
+    schema = None
+    rows = []
+    record = []
+    line_number = 0
+
+    for line_number, line in enumerate(_iter_lines(source), start=1):
+        if line.startswith(b"#"):
+            if rows:
+                yield "records", _to_array(schema, rows)
+                rows = []
+            if line.startswith(b"#K"):
+                name, _, rest = line[2:].decode().partition("=")
+                tokens = rest.split()
+                if len(tokens) < 3:
+                    raise ValueError(f"Baris {line_number}: keyword #K tidak valid")
+                fmt = tokens[-1]
+                keywords[name.strip()] = _keyword_value(" ".join(tokens[:-2]), fmt)
+                units[name.strip()] = tokens[-2]
+            elif line.startswith(b"#N"):
+                if schema is not None:
+                    # Header baru setelah data: skema diganti
+                    schema = None
+                    groups = []
+                names = _strip_continuation(line[2:]).split()
+            elif line.startswith(b"#U"):
+                units_line = _strip_continuation(line[2:]).split()
+            elif line.startswith(b"#F"):
+                formats = [f.decode() for f in _strip_continuation(line[2:]).split()]
+                if names is None or len(formats) != len(names):
+                    raise ValueError(f"Baris {line_number}: #F tidak cocok dengan #N")
+                unit_names = units_line if units_line and len(units_line) == len(names) else [b""] * len(names)
+                groups.append([(n.decode(), u.decode(), f) for n, u, f in zip(names, unit_names, formats)])
+                names = units_line = None
+            continue
+
+        if not line.strip():
+            continue
+        if schema is None:
+            if not groups:
+                raise ValueError(f"Baris {line_number}: data sebelum header #N/#F")
+            schema = _Schema(groups)
+            yield "metadata", {
+                "keywords": keywords,
+                "units": units,
+                "columns": [{"name": n, "unit": u, "format": f} for n, u, f in schema.columns],
+            }
+            if metadata_only:
+                return
+
+        record.append(_strip_continuation(line).split())
+        if _continues(line):
+            continue
+
+        # Record lengkap: grup terakhir diulang untuk setiap aperture
+        n_apertures = len(record) - len(schema.groups) + 1
+        if schema.dtype is None:
+            if n_apertures < 1:
+                raise ValueError(f"Baris {line_number}: record terlalu pendek")
+            schema.build_dtype(n_apertures)
+        if n_apertures != schema.n_apertures:
+            raise ValueError(f"Baris {line_number}: jumlah aperture berbeda ({n_apertures})")
+        last = len(schema.groups) - 1
+        for index, tokens in enumerate(record):
+            expected = len(schema.groups[min(index, last)])
+            if len(tokens) != expected:
+                raise ValueError(
+                    f"Baris {line_number}: {len(tokens)} kolom, seharusnya {expected}"
+                )
+        rows.append(record)
+        record = []
+        if len(rows) >= chunk_size:
+            yield "records", _to_array(schema, rows)
+            rows = []
+
+    if record:
+        raise ValueError(f"Baris {line_number}: record terpotong di akhir file")
+    if schema is None:
+        yield "metadata", {
+            "keywords": keywords,
+            "units": units,
+            "columns": [{"name": n, "unit": u, "format": f} for group in groups for n, u, f in group],
+        }
+    if rows:
+        yield "records", _to_array(schema, rows)
+
+
+def read_metadata(source):
+    """
+    Keyword #K (ZMAG, FWHMPSF, APERTURES, ...) beserta unit dan daftar kolom #N/#U/#F
+    """
+    for kind, value in _parse(source, CHUNK_SIZE, metadata_only=True):
+        if kind == "metadata":
+            return value
+    raise ValueError("Header IRAF tidak ditemukan")
+
+
+def iter_chunks(source, chunk_size=CHUNK_SIZE):
+    """
+    Structured array per chunk (maks. chunk_size bintang), memori konstan untuk file besar.
+    INDEF menjadi NaN (float), INDEF_INT (int) atau "" (string).
+    """
+    for kind, value in _parse(source, chunk_size):
+        if kind == "records":
+            yield value
+
+
+def read_phot(source):
+    """
+    Metadata dan seluruh record dalam satu structured array
+    """
+    metadata = None
+    chunks = []
+    for kind, value in _parse(source, CHUNK_SIZE):
+        if kind == "metadata":
+            metadata = value
+        else:
+            chunks.append(value)
+    if metadata is None:
+        raise ValueError("Header IRAF tidak ditemukan")
+    if not chunks:
+        return metadata, np.empty(0)
+    return metadata, np.concatenate(chunks)
+
+
+def good_mask(records, flags=ERROR_FLAGS):
+    """
+    Bintang tanpa error centering/sky/photometry (CIER, SIER, PIER = 0) dan MAG valid.
+    Untuk beberapa aperture, dicek per aperture (shape (n, n_apertures)).
+    flags bisa dipersempit, mis. ("PIER",) untuk menerima warning centering seperti BigShift.
+    """
+    mask = np.isfinite(records["MAG"])
+    for flag in flags:
+        if flag in records.dtype.names:
+            values = records[flag]
+            mask = mask & ((values == 0) if values.ndim == mask.ndim else (values == 0)[:, None])
+    return mask
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "phot_output.txt"
+    metadata, records = read_phot(path)
+    keywords = metadata["keywords"]
+    print(f"ZMAG = {keywords.get('ZMAG')}, FWHMPSF = {keywords.get('FWHMPSF')}, APERTURES = {keywords.get('APERTURES')}")
+    print(f"{len(records)} bintang, {int(np.all(good_mask(records), axis=-1).sum()) if len(records) else 0} tanpa error")
+    for row in records[:10]:
+        print(f"ID {row['ID']}: X={row['XCENTER']:.3f} Y={row['YCENTER']:.3f} FLUX={row['FLUX']} MAG={row['MAG']} PIER={row['PIER']}")
@@ -0,0 +1,252 @@
+import math
+from functools import partial
+
+import numpy as np
+
+import aperture_model
+import etc_batch
+import etc_engine
+import instrument_profiles
+
+# Engine kedua: model ETC.calculate_sme dari "las qumbres ETC.js" (ETC LCO, Pickles & Thomas,
+# zeropoint terukur Harbeck 2023), versi vektor NumPy dengan API yang sama dengan etc_engine.evaluate.
+# Perbedaan model dengan engine "imam" (etc_engine):
+#   - ekstingsi relatif terhadap zenith: k (X - 1), bukan k X
+#   - aperture tetap berdiameter 3 arcsec tanpa kuantisasi piksel (bukan 1.5 x FWHM, 9-100 piksel)
+#   - sky dalam e-/s/arcsec² dikali luas aperture (bukan dibagi jumlah piksel)
+#   - zeropoint LCO sudah dalam e-/s (area dan QE = 1 pada profil LCO)
+# Loop JS (t += 1 detik, magnitude -= 0.1) diganti solusi tertutup; discrete=True membulatkan
+# hasil ke langkah loop JS sehingga angka sama dengan kalkulator LCO.
+
+FILTERS = ("U", "B", "V", "R", "I", "u", "g", "r", "i", "Z", "Y")
+# (teleskop, kamera) sesuai urutan itel di JS
+INSTRUMENTS = (
+    ("LCO 0m4", "SBIG"),
+    ("LCO 1m0", "Sinistro"),
+    ("LCO 0m35", "QHY"),
+    ("LCO 2m0", "Spectral"),
+    ("LCO 2m0", "MuSCAT3"),
+)
+TELESCOPE_APERTURE = (0.4, 1.0, 0.35, 2.0, 2.0)  # meter
+PIXEL_SCALE = (0.57, 0.389, 0.73, 0.304, 0.27)  # arcsec/pixel (ApixelTable)
+GAIN = (1.6, 2.3, 0.7, 7.7, 1.9)  # e-/ADU
+READ_NOISE = (14, 8, 3, 11, 14.5)  # e-
+DARK_CURRENT = (0.02, 0.002, 0.04, 0.002, 0.005)  # e-/pixel/s
+SATURATION_LIMIT = (65000 * 1.6, 10000, 47000, 71000, 462000)  # e- per piksel unbinned
+
+# Hayes & Latham, 2200 m (mag/airmass)
+EXTINCTION = (0.54, 0.23, 0.12, 0.09, 0.04, 0.59, 0.14, 0.08, 0.06, 0.04, 0.03)
+
+# Zeropoint per instrumen dan filter dalam log(e-/s); 0.0 berarti filter tidak tersedia
+ZEROPOINTS = (
+    (18.0, 20.3, 20.7, 21.2, 20.3, 16.11, 21.4, 21.5, 20.75, 19.4, 17.8),  # 0m4 SBIG
+    (21.4, 23.5, 23.5, 23.8, 23.2, 22.45, 24.3, 23.8, 23.5, 22.2, 20.3),  # 1m0 Sinistro
+    (0.0, 21.4, 21.4, 21.2, 20.3, 17.5, 21.8, 21.2, 20.1, 18.4, 0.0),  # 0m35 QHY
+    (21.3, 24.4, 24.6, 24.9, 24.1, 21.4, 25.4, 25.25, 24.75, 23.75, 21.6),  # 2m0 Spectral
+    (0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 25.4, 25.2, 24.5, 24.3, 0.0),  # 2m0 MuSCAT3
+)
+
+# Sky brightness (mag/arcsec²) per fase bulan (0 baru, 1 separuh, 2 purnama) dan filter
+SKY_BRIGHTNESS = (
+    (23.0, 22.5, 21.6, 20.6, 19.8, 23.5, 22.0, 21.1, 20.6, 20.2, 19.4),
+    (20.0, 20.5, 20.3, 20.0, 18.8, 21.0, 20.3, 20.2, 19.7, 19.2, 18.0),
+    (17.0, 17.8, 17.5, 17.4, 17.0, 18.0, 17.6, 17.5, 17.5, 16.8, 16.5),
+)
+MOON_PHASES = {"new": 0, "half": 1, "full": 2}
+
+APERTURE_DIAMETER = 3.0  # arcsec
+LIMITING_START = 30.0  # magnitude awal loop mode 'm'
+MAGNITUDE_STEP = 0.1
+TIME_STEP = 1.0  # detik
+
+
+def sky_brightness(filter_name, moon_phase):
+    """
+    Sky brightness tabel LCO; moon_phase 0/1/2 atau "new"/"half"/"full"
+    """
+    phase = MOON_PHASES.get(moon_phase, moon_phase)
+    if phase not in (0, 1, 2):
+        raise ValueError(f"Fase bulan {moon_phase} tidak dikenal (new, half, full)")
+    if filter_name not in FILTERS:
+        raise ValueError(f"Filter {filter_name} tidak ada di tabel LCO")
+    return SKY_BRIGHTNESS[phase][FILTERS.index(filter_name)]
+
+
+def compile_profiles():
+    """
+    InstrumentProfile untuk setiap instrumen LCO dan filter yang punya zeropoint
+    """
+    profiles = {}
+    for itel, (telescope, ccd) in enumerate(INSTRUMENTS):
+        for ifilt, filter_name in enumerate(FILTERS):
+            zeropoint = ZEROPOINTS[itel][ifilt]
+            if zeropoint == 0.0:
+                continue
+            profile = instrument_profiles.InstrumentProfile(
+                telescope=telescope,
+                ccd=ccd,
+                filter=filter_name,
+                aperture=TELESCOPE_APERTURE[itel],
+                focal_length=None,
+                aperture_area=1.0,  # zeropoint sudah dalam e-/s
+                pixel_size=None,
+                pixel_scale=PIXEL_SCALE[itel],
+                quantum_efficiency=1.0,
+                read_noise=READ_NOISE[itel],
+                dark_current=DARK_CURRENT[itel],
+                gain=GAIN[itel],
+                full_well=SATURATION_LIMIT[itel],
+                adc_bits=None,
+                adc_gain=GAIN[itel],
+                readout_time=0.0,
+                zeropoint=zeropoint,
+                extinction_coefficient=EXTINCTION[ifilt],
+            )
+            profiles[profile.key] = profile
+    return profiles
+
+
+PROFILES = compile_profiles()
+
+
+def for_combination(telescope, ccd):
+    """
+    {filter: InstrumentProfile} untuk satu instrumen LCO; KeyError jika tidak ada
+    """
+    result = {key[2]: profile for key, profile in PROFILES.items() if key[:2] == (telescope, ccd)}
+    if not result:
+        raise KeyError(f"Instrumen LCO {telescope}, {ccd} tidak ada")
+    return result
+
+
+def evaluate(instrument, magnitude, sky_brightness, zenith_distance, fwhm, snr_target=None, exposure_time=None,
+             discrete=False, aperture_diameter=APERTURE_DIAMETER):
+    """
+    Model ETC.calculate_sme untuk array target, mode sama seperti JS:
+    snr_target saja -> exposure time ('e'), exposure_time saja -> SNR ('s'),
+    keduanya -> limiting magnitude ('m', magnitude diabaikan).
+    fwhm (arcsec) hanya dipakai untuk estimasi piksel puncak (PkDN, elektron).
+    """
+    if snr_target is None and exposure_time is None:
+        raise ValueError("Isi snr_target, exposure_time, atau keduanya")
+
+    airmass = etc_engine.airmass_from_zenith(zenith_distance)
+    extinction = instrument.extinction_coefficient * (airmass - 1.0)
+    collecting = instrument.aperture_area * instrument.quantum_efficiency
+    pixel_area = instrument.pixel_scale ** 2
+    num_pixels = math.pi / 4 * aperture_diameter ** 2 / pixel_area
+    # e-/s/piksel dari sky (NbDN per detik); background aperture = signal_sky x num_pixels
+    signal_sky = etc_engine.calculate_signal(sky_brightness, instrument.zeropoint, 0.0, 1.0, collecting) * pixel_area
+    read_noise, dark_current = instrument.read_noise, instrument.dark_current
+
+    if snr_target is not None and exposure_time is not None:
+        signal_star = etc_engine.calculate_limiting_signal(
+            signal_sky, read_noise, dark_current, num_pixels, exposure_time, snr_target
+        )
+        magnitude = instrument.zeropoint - extinction - 2.5 * np.log10(signal_star / collecting)
+        if discrete:
+            # Magnitude pertama dari 30, 29.9, ... yang mencapai SNR
+            steps = np.ceil((LIMITING_START - magnitude) / MAGNITUDE_STEP - 1e-9)
+            magnitude = np.round(LIMITING_START - np.maximum(steps, 0) * MAGNITUDE_STEP, 1)
+            signal_star = etc_engine.calculate_signal(
+                magnitude, instrument.zeropoint, extinction, instrument.aperture_area, instrument.quantum_efficiency
+            )
+    else:
+        magnitude = np.asarray(magnitude, dtype=float)
+        signal_star = etc_engine.calculate_signal(
+            magnitude, instrument.zeropoint, extinction, instrument.aperture_area, instrument.quantum_efficiency
+        )
+        if exposure_time is None:
+            exposure_time = etc_engine.calculate_exposure_time(
+                signal_star, signal_sky, read_noise, dark_current, num_pixels, snr_target
+            )
+            if discrete:
+                # Detik bulat pertama (mulai 1 detik) yang mencapai SNR
+                exposure_time = np.maximum(np.ceil(exposure_time / TIME_STEP - 1e-9) * TIME_STEP, TIME_STEP)
+
+    exposure_time = np.asarray(exposure_time, dtype=float)
+    result = etc_engine.calculate_noise(signal_star, signal_sky, read_noise, dark_current, num_pixels, exposure_time)
+    # Piksel puncak: piksel dianggap lingkaran berdiameter pixel_scale (ETC.radial_integrate_gauss)
+    peak = (
+        signal_star * exposure_time
+        * aperture_model.continuous_encircled_energy(fwhm, instrument.pixel_scale / 2, "gaussian")
+        + signal_sky * exposure_time
+    )
+    return etc_engine._finish(
+        result,
+        exposure_time=exposure_time,
+        magnitude=magnitude,
+        signal_star=signal_star,
+        signal_sky=signal_sky,
+        num_pixels=num_pixels,
+        extinction=extinction,
+        peak=peak,
+        saturated=peak > instrument.saturation_level,
+    )
+
+
+ENGINES = {"imam": etc_engine.evaluate, "lco": evaluate}
+COMPARE_TOLERANCE = 0.1  # selisih relatif yang ditandai
+
+
+def get_engine(name):
+    try:
+        return ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Engine {name} tidak dikenal, pilih dari {', '.join(ENGINES)}") from None
+
+
+def compare(targets, profiles, tolerance=COMPARE_TOLERANCE, discrete=False):
+    """
+    Hitung target batch (format etc_batch) dengan kedua engine dan laporkan selisihnya.
+    Yang dibandingkan: exposure time (target dengan snr) atau SNR (target dengan exposure_time),
+    relative_difference = lco / imam - 1. Ringkasan per filter: median dan maksimum |selisih|.
+    Target yang tidak valid dilaporkan sebagai {"index", "error"}.
+    """
+    parsed, errors = [], []
+    for index, raw in enumerate(targets):
+        try:
+            target = etc_batch.parse_target(raw, profiles)
+        except (ValueError, TypeError) as e:
+            errors.append({"index": index, "error": str(e)})
+            continue
+        target["index"] = index
+        parsed.append(target)
+
+    lco = partial(evaluate, discrete=discrete)
+    imam_results = etc_batch.evaluate_chunk(parsed, profiles, etc_engine.evaluate)
+    lco_results = etc_batch.evaluate_chunk(parsed, profiles, lco)
+
+    rows = []
+    by_filter = {}
+    for target, imam_result, lco_result in zip(parsed, imam_results, lco_results):
+        quantity = "exposure_time" if target["snr"] is not None else "snr"
+        difference = lco_result[quantity] / imam_result[quantity] - 1
+        row = {
+            "index": target["index"],
+            "filter": target["filter"],
+            "magnitude": target["magnitude"],
+            "quantity": quantity,
+            "imam": imam_result[quantity],
+            "lco": lco_result[quantity],
+            "relative_difference": difference,
+            "flagged": abs(difference) > tolerance,
+            "lco_saturated": lco_result["saturated"],
+        }
+        if "id" in target:
+            row["id"] = target["id"]
+        rows.append(row)
+        by_filter.setdefault(target["filter"], []).append(difference)
+
+    summary = {}
+    for filter_name, differences in by_filter.items():
+        differences = np.array(differences)
+        summary[filter_name] = {
+            "count": len(differences),
+            "flagged": int(np.count_nonzero(np.abs(differences) > tolerance)),
+            "median_relative_difference": float(np.median(differences)),
+            "max_abs_relative_difference": float(np.max(np.abs(differences))),
+        }
+    rows.extend(errors)
+    rows.sort(key=lambda row: row["index"])
+    return {"tolerance": tolerance, "discrete": discrete, "results": rows, "summary": summary}
@@ -1,94 +1,125 @@
-from fastapi import FastAPI, Form, Request, HTTPException
-from fastapi.responses import HTMLResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Form, Request, HTTPException, WebSocket
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
+import logging
 import math
-import matplotlib.pyplot as plt
-import uvicorn
+import numpy as np
+from functools import partial
+from typing import Optional
+
+import aperture_model
+import etc_batch
+import etc_cache
+import etc_engine
+import etc_live
+import etc_logging
+import etc_matrix
+import etc_metrics
+import etc_plots
+import etc_serving
+import etc_store
+import etc_solver
+import etc_stacking
+import etc_sweep
+import instrument_profiles
+import lco_engine
+import night_planner
+import noise_simulator
+import sky_background
+import throughput
+
+etc_logging.setup_logging()
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
+app.add_middleware(etc_metrics.MetricsMiddleware)
 
 # Mount static files (CSS, JS, etc.)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", etc_serving.CachedStaticFiles(directory="static"), name="static")
 
-# Setup Jinja2 templates
+# Setup Jinja2 templates (dikompilasi sekali saat start)
 templates = Jinja2Templates(directory="templates")
+etc_serving.precompile_templates(templates)
+
+# Data teleskop, CCD, kombinasi (zeropoint) dan koefisien ekstingsi ada di instruments.json,
+# zeropoint/ekstingsi hasil kalibrasi (Perhitungan_Zeropoint.py) di calibration.json.
+# Dikompilasi sekali menjadi InstrumentProfile per (teleskop, CCD, filter) dan
+# dimuat ulang otomatis jika salah satu file berubah.
+profiles = instrument_profiles.ProfileRegistry("instruments.json", calibration_path="calibration.json")
+
+# Cache hasil per (endpoint, profil, input yang dibulatkan); dikosongkan saat profil dimuat ulang
+result_cache = etc_metrics.register(etc_cache.ResultCache())
+profiles.add_listener(lambda state: result_cache.clear())
+etc_metrics.register(etc_plots.plot_cache)
+
+# Riwayat sky brightness terukur (sky_background.py) per site dan filter; mediannya menjadi
+# default sky_brightness di form dan untuk request yang tidak mengisinya
+sky_history = sky_background.SkyHistory(sky_background.DEFAULT_HISTORY)
+
+# Halaman utama hanya bergantung pada daftar instrumen dan default sky: dirender sekali
+# (plus gzip/brotli) dan dirender ulang hanya jika profil atau riwayat sky berubah
+index_page = etc_serving.StaticPage(
+    lambda: templates.get_template("index.html").render(
+        telescopes=profiles.telescopes, ccds=profiles.ccds, filters=profiles.filters,
+        sky_defaults=sky_history.defaults(sky_background.DEFAULT_SITE),
+    ),
+    version=lambda: (profiles.generation, sky_history.check()),
+)
+index_page.prepare()
+
+# Perhitungan dan rendering dijalankan di thread pool terbatas (503 jika penuh, 504 jika timeout)
+compute_pool = etc_metrics.register(etc_serving.ComputePool())
+
+# Katalog target, versi profil dan hasil perhitungan disimpan di SQLite (ETC_STORE) agar bisa
+# di-query tanpa menghitung ulang; penulisan berjalan di thread penulis store
+store = etc_metrics.register(etc_store.Store())
+
+def record_result(profile, source, **row):
+    # Satu hasil form ke store (non-blocking)
+    store.record(profile, [row], source, profiles.calibration_version)
+
+def get_profile(telescope, ccd, filter):
+    # Validasi kombinasi OTA, CCD dan filter
+    try:
+        return profiles.get(telescope, ccd, filter)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=e.args[0])
 
-# Data teleskop dan CCD
-telescopes = {
-    "GSO": {"aperture": 0.254, "focal_length": 2.0},  
-    "Celestron C11": {"aperture": 0.28, "focal_length": 2.8},
-    "Teleskop Imam": {"aperture": 0.40, "focal_length": 2.8}
-    #"Barride XX": {"aperture": 0.15, "focal_length": 8.0},
-}
-
-# Aperture in meters, focal length in meters
-# barridenya yg versi apa? 
-
-ccds = {
-       "ZWO ASI 178MM": {"quantum_efficiency": 0.75, "read_noise": 3.0, "pixel_size": 2.4, "dark_current": 0},
-    "ZWO ASI 2600 MM Pro": {"quantum_efficiency": 0.91, "read_noise": 1.5, "pixel_size": 3.76, "dark_current": 0.0022},
-    "QHY 174 GPS": {"quantum_efficiency": 0.65, "read_noise": 2.0, "pixel_size": 5.86, "dark_current": 0},
-    "ATIK 383L+": {"quantum_efficiency": 0.60, "read_noise": 5.3, "pixel_size": 5.4, "dark_current": 0.02}  # Tambah ATIK 383L+
-}
-
-# Kombinasi OTA dan CCD dengan zeropoint
-combinations = {
-    ("GSO", "ZWO ASI 178MM"): {"zeropoint": 25.12},
-    ("GSO", "ZWO ASI 2600 MM Pro"): {"zeropoint": 25.45},
-    ("GSO", "QHY 174 GPS"): {"zeropoint": 24.78},
-    ("GSO", "ATIK 383L+"): {"zeropoint": 24.56},  # Tambah kombinasi GSO + ATIK
-    ("Celestron C11", "ZWO ASI 178MM"): {"zeropoint": 25.23},
-    ("Celestron C11", "ZWO ASI 2600 MM Pro"): {"zeropoint": 25.56},
-    ("Celestron C11", "QHY 174 GPS"): {"zeropoint": 24.89},
-    ("Celestron C11", "ATIK 383L+"): {"zeropoint": 24.67}, 
-    ("Teleskop Imam", "QHY 174 GPS"): {"zeropoint": 24.67}  # Tambah kombinasi C11 + ATIK
-}
-
-# Satuan
-# read noise: electron
-# pixel_size: micrometer
-# dark_current noise: electron/s/pixel @ 0 Celcius (diabaikan dulu)
-# di cek lagi angkanya!
-
-
-k = {"U": 0.25, "B": 0.7, "V": 1.21, "R": 0.21, "I": 0.21, "Clear": 0.1} # koefisien ekstingsi
-
-
-# Daftar filter
-filters = ["U", "B", "V", "R", "I", "Clear"]
+def get_combination(telescope, ccd):
+    # Profil per filter untuk kombinasi OTA dan CCD; pesan KeyError diteruskan apa adanya
+    try:
+        return profiles.for_combination(telescope, ccd)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=e.args[0])
+
+def resolve_sky(sky_brightness, filter):
+    # sky_brightness kosong -> median sky terukur untuk filter ini di site server
+    if sky_brightness is not None:
+        return sky_brightness
+    default = sky_history.default(sky_background.DEFAULT_SITE, filter)
+    if default is None:
+        raise HTTPException(status_code=400, detail="Field sky_brightness tidak ada atau tidak valid")
+    return default
+
+def engine_profiles(telescope, ccd):
+    # Profil per filter dari config instrumen, atau dari tabel LCO (mis. "LCO 1m0", "Sinistro")
+    try:
+        return profiles.for_combination(telescope, ccd)
+    except KeyError:
+        return lco_engine.for_combination(telescope, ccd)
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request, "telescopes": telescopes, "ccds": ccds, "filters": filters})
+    return index_page.response(request)
 
 def calculate_exposure_time(signal_star, signal_sky, read_noise, dark_current, num_pixels, snr_target):
     # read_noise dan dark_current harus diambil dari ccd_data
-    exposure_time = 1.0
-    while True:
-        # Signal dalam elektron
-        signal = signal_star * exposure_time
-        
-        # Background noise dalam elektron
-        sky_noise = signal_sky * num_pixels * exposure_time
-        dark_noise = dark_current * num_pixels * exposure_time
-        readout_noise = read_noise * read_noise * num_pixels
-        
-        # Total noise
-        total_noise = math.sqrt(signal + sky_noise + dark_noise + readout_noise)
-        
-        # Calculate SNR
-        snr_calculated = signal / total_noise
-        
-        if snr_calculated >= snr_target:
-            break
-            
-        exposure_time += 1.0
-        
-        if exposure_time > 3600:  # 1 jam
-            raise ValueError("Exposure time terlalu lama")
-            
-    return exposure_time
+    solution = etc_solver.solve_exposure_time(
+        signal_star, signal_sky, read_noise, dark_current, num_pixels, snr_target
+    )
+    if not solution["reachable"]:  # lebih dari 1 jam
+        raise ValueError("Exposure time terlalu lama")
+    return float(solution["exposure_time"])
 
 def calculate_exposure_time_analytic(signal_star, signal_sky, read_noise, dark_current, num_pixels, snr_target):
     """
@@ -99,10 +130,7 @@ def calculate_exposure_time_analytic(signal_star, signal_sky, read_noise, dark_c
     B = -(snr_target**2) * (signal_star + signal_sky*num_pixels + dark_current*num_pixels)
     C = -(snr_target**2) * (read_noise**2 * num_pixels)
     
-    print("\nDebug coefficients:")
-    print(f"A = {A:.2e}")
-    print(f"B = {B:.2e}")
-    print(f"C = {C:.2e}")
+    logger.debug("Debug coefficients", extra={"fields": {"A": A, "B": B, "C": C}})
     
     # Hitung exposure time
     discriminant = B**2 - 4*A*C
@@ -119,49 +147,26 @@ def calculate_exposure_time_analytic(signal_star, signal_sky, read_noise, dark_c
                      read_noise**2 * num_pixels)
     calculated_snr = signal / noise
     
-    print(f"\nVerification:")
-    print(f"Target SNR: {snr_target:.2f}")
-    print(f"Calculated SNR: {calculated_snr:.2f}")
-    print(f"Exposure time: {t:.2f} s")
+    logger.debug("Verification", extra={"fields": {
+        "target_snr": snr_target, "calculated_snr": calculated_snr, "exposure_time": t,
+    }})
     
     return t, calculated_snr  # Return both values to avoid recalculation
 
-@app.post("/calculate_exposure", response_class=HTMLResponse)
-async def calculate_exposure(
-    request: Request,
-    telescope: str = Form(...),
-    ccd: str = Form(...),
-    snr: float = Form(...),
-    magnitude: float = Form(...),
-    filter: str = Form(...),
-    sky_brightness: float = Form(...),
-    zenith_distance: float = Form(...),
-    fwhm: float = Form(...),
-):
-    print("Endpoint /calculate dipanggil")
-    # Validasi kombinasi OTA dan CCD
-    if (telescope, ccd) not in combinations:
-        raise ValueError(f"Kombinasi {telescope} dan {ccd} tidak valid.")
-
-    # Ambil data teleskop, CCD, dan kombinasi
-    telescope_data = telescopes[telescope]
-    ccd_data = ccds[ccd]
-    combination_data = combinations[(telescope, ccd)]
-
-    # Hitung aperture area teleskop (dalam meter persegi)
-    aperture_area = math.pi * (telescope_data["aperture"] / 2) ** 2
+def exposure_result(profile, snr, magnitude, sky_brightness, zenith_distance, fwhm):
+    """
+    Menghitung exposure time untuk SNR target (dipakai /calculate_exposure)
+    """
+    # Profil sudah berisi aperture area, pixel scale dan zeropoint
+    aperture_area = profile.aperture_area
+    quantum_efficiency = profile.quantum_efficiency
+    zeropoint = profile.zeropoint
+    pixel_scale = profile.pixel_scale
 
     # Hitung ekstingsi atmosfer
-    extinction = k[filter] * (1 / math.cos(math.radians(zenith_distance)))
-
-    # Ambil quantum efficiency dari data CCD
-    quantum_efficiency = ccd_data["quantum_efficiency"]
-
-    # Hitung zeropoint dari kombinasi
-    zeropoint = combination_data["zeropoint"]
+    extinction = profile.extinction_coefficient * (1 / math.cos(math.radians(zenith_distance)))
 
     # Hitung jumlah piksel berdasarkan FWHM
-    pixel_scale = 206.265 * ccd_data["pixel_size"] / (telescope_data["focal_length"] * 1000)
     num_pixels = calculate_pixels_in_aperture(fwhm, pixel_scale)
 
     # Hitung flux dan signal
@@ -172,108 +177,152 @@ async def calculate_exposure(
     signal_star = flux_star * aperture_area * quantum_efficiency
     signal_sky = flux_sky * aperture_area * quantum_efficiency / num_pixels
 
-    # Debug print
-    print(f"\nDebug calculations:")
-    print(f"Aperture area: {aperture_area:.2e} m²")
-    print(f"Pixel scale: {pixel_scale:.2f} arcsec/pixel")
-    print(f"Number of pixels: {num_pixels}")
-    print(f"Signal star: {signal_star:.2f} e-/s")
-    print(f"Signal sky: {signal_sky:.2f} e-/s/pixel")
+    # Debug log (di-sampling, lihat etc_logging)
+    logger.debug("Debug calculations", extra={"fields": {
+        "aperture_area_m2": aperture_area,
+        "pixel_scale_arcsec": pixel_scale,
+        "num_pixels": num_pixels,
+        "signal_star_e_s": signal_star,
+        "signal_sky_e_s_pix": signal_sky,
+    }})
 
     # Calculate exposure time
+    exposure_time, verified_snr = calculate_exposure_time_analytic(
+        signal_star,
+        signal_sky,
+        profile.read_noise,
+        profile.dark_current,
+        num_pixels,
+        snr
+    )
+    # Waktu sampai piksel puncak jenuh, untuk peringatan di halaman hasil (lihat /api/v1/stack)
+    saturation_time = float(etc_stacking.saturation_time(profile, magnitude, sky_brightness, zenith_distance, fwhm))
+    return {"exposure_time": exposure_time, "snr": verified_snr, "saturation_time": saturation_time}
+
+@app.post("/calculate_exposure", response_class=HTMLResponse)
+async def calculate_exposure(
+    request: Request,
+    telescope: str = Form(...),
+    ccd: str = Form(...),
+    snr: float = Form(...),
+    magnitude: float = Form(...),
+    filter: str = Form(...),
+    sky_brightness: Optional[float] = Form(None),
+    zenith_distance: float = Form(...),
+    fwhm: float = Form(...),
+):
+    # Ambil profil teleskop + CCD + filter (aperture area, pixel scale, zeropoint sudah dihitung)
+    profile = get_profile(telescope, ccd, filter)
+    sky_brightness = resolve_sky(sky_brightness, filter)
+    inputs = result_cache.quantize(
+        snr=snr, magnitude=magnitude, sky_brightness=sky_brightness, zenith_distance=zenith_distance, fwhm=fwhm
+    )
     try:
-        exposure_time, verified_snr = calculate_exposure_time_analytic(
-            signal_star,
-            signal_sky,
-            ccd_data["read_noise"],
-            ccd_data["dark_current"],
-            num_pixels,
-            snr
+        result = await compute_pool.run(
+            result_cache.get_or_compute, "exposure", profile, inputs, partial(exposure_result, profile)
         )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    
+    record_result(
+        profile, "calculate_exposure", magnitude=magnitude, sky_brightness=sky_brightness,
+        airmass=etc_engine.airmass_from_zenith(zenith_distance), fwhm=fwhm,
+        snr=result["snr"], exposure_time=result["exposure_time"],
+    )
+
     # Tidak perlu verifikasi ulang karena SNR sudah dihitung
-    return templates.TemplateResponse("result.html", {
+    return await compute_pool.run(templates.TemplateResponse, "result.html", {
         "request": request,
         "telescope": telescope,
         "ccd": ccd,
         "magnitude": magnitude,
-        "exposure_time": exposure_time,
-        "snr": verified_snr
+        "exposure_time": result["exposure_time"],
+        "snr": result["snr"],
+        "saturation_time": result["saturation_time"],
     })
 
-@app.post("/calculate_snr", response_class=HTMLResponse)
-async def calculate_snr(
-    request: Request,
-    telescope: str = Form(...),
-    ccd: str = Form(...),
-    magnitude: float = Form(...),
-    exposure_time: float = Form(...),
-    filter: str = Form(...),
-    sky_brightness: float = Form(...),
-    zenith_distance: float = Form(...),
-    fwhm: float = Form(...),  # FWHM sebagai input
-):
-    # Ambil data teleskop dan CCD
-    telescope_data = telescopes[telescope]
-    ccd_data = ccds[ccd]
-
-    # Validasi kombinasi OTA dan CCD
-    if (telescope, ccd) not in combinations:
-        raise ValueError(f"Kombinasi {telescope} dan {ccd} tidak valid.")
-
+def snr_result(profile, magnitude, exposure_time, sky_brightness, zenith_distance, fwhm):
+    """
+    Menghitung SNR untuk exposure time tertentu (dipakai /calculate_snr)
+    """
     # Hitung ekstingsi atmosfer
-    extinction = k[filter] * (1 / math.cos(math.radians(zenith_distance)))
+    extinction = profile.extinction_coefficient * (1 / math.cos(math.radians(zenith_distance)))
 
     # Hitung flux_star menggunakan zeropoint dari kombinasi
-    zeropoint = combinations[(telescope, ccd)]["zeropoint"]
+    zeropoint = profile.zeropoint
     flux_star = 10 ** (-0.4 * (magnitude - zeropoint))
 
-    # Konversi flux ke elektron
-    gain = ccd_data.get("gain", 1.0)  # Default gain = 1.0 e-/ADU jika tidak ada
-    flux_star = flux_star * gain
+    # Flux dari zeropoint sudah dalam foton; gain CCD (e-/ADU) hanya untuk flux terukur dalam ADU
+    # (kalibrasi, fotometri FITS), jadi tidak dikalikan di sini
 
-    # Hitung aperture area teleskop
-    aperture_area = math.pi * (telescope_data["aperture"] / 2) ** 2  # dalam meter^2
+    # Aperture area teleskop (dalam meter^2)
+    aperture_area = profile.aperture_area
 
     # Hitung jumlah foton yang diterima oleh CCD
-    quantum_efficiency = ccd_data["quantum_efficiency"]
+    quantum_efficiency = profile.quantum_efficiency
     signal_star = flux_star * aperture_area * quantum_efficiency  # N_star
 
-    # Hitung sky background
-    flux_sky = 10 ** (-0.4 * sky_brightness)
+    # Hitung sky background (zeropoint yang sama dengan endpoint lain, lihat exposure_result)
+    flux_sky = 10 ** (-0.4 * (sky_brightness - zeropoint))
     signal_sky = flux_sky * aperture_area * quantum_efficiency  # S
 
     # Hitung jumlah piksel berdasarkan FWHM dari input
     aperture_area_arcsec = math.pi * (fwhm / 2) ** 2  # Area lingkaran dalam arcsec²
-    pixel_scale_arcsec = ccd_data["pixel_size"] / 1000 / 206.265  # Konversi pixel_size ke mm, lalu ke arcsec
+    pixel_scale_arcsec = profile.pixel_scale  # arcsec/pixel, sama dengan endpoint lain
     num_pixels = aperture_area_arcsec / (pixel_scale_arcsec ** 2)  # Konversi ke jumlah piksel
     num_pixels = max(num_pixels, 9)  # Minimal 9 piksel
-    print(f"Number of Pixels (p): {num_pixels}")
 
     # Hitung noise sky
     noise_sky = math.sqrt(signal_sky * num_pixels * exposure_time)
-    print(f"Noise Sky: {noise_sky}")
 
     # Hitung noise read
-    read_noise = ccd_data["read_noise"]
+    read_noise = profile.read_noise
     noise_read = math.sqrt(num_pixels) * read_noise
-    print(f"Noise Read: {noise_read}")
 
     # Hitung dark current
-    dark_current = ccd_data["dark_current"]  # e-/s/pixel
+    dark_current = profile.dark_current  # e-/s/pixel
     noise_dark = math.sqrt(num_pixels * dark_current * exposure_time)
-    print(f"Noise Dark: {noise_dark}")
 
     # Hitung total noise
     total_noise = math.sqrt((signal_star * exposure_time) + noise_sky + noise_read + noise_dark)
 
     # Hitung SNR
     snr = (signal_star * exposure_time) / total_noise
-    print(f"SNR: {snr}")
+    logger.debug("SNR calculation", extra={"fields": {
+        "num_pixels": num_pixels, "noise_sky": noise_sky, "noise_read": noise_read,
+        "noise_dark": noise_dark, "snr": snr,
+    }})
+    return {"snr": snr}
+
+@app.post("/calculate_snr", response_class=HTMLResponse)
+async def calculate_snr(
+    request: Request,
+    telescope: str = Form(...),
+    ccd: str = Form(...),
+    magnitude: float = Form(...),
+    exposure_time: float = Form(...),
+    filter: str = Form(...),
+    sky_brightness: Optional[float] = Form(None),
+    zenith_distance: float = Form(...),
+    fwhm: float = Form(...),  # FWHM sebagai input
+):
+    # Ambil profil teleskop + CCD + filter
+    profile = get_profile(telescope, ccd, filter)
+    sky_brightness = resolve_sky(sky_brightness, filter)
+    inputs = result_cache.quantize(
+        magnitude=magnitude, exposure_time=exposure_time, sky_brightness=sky_brightness,
+        zenith_distance=zenith_distance, fwhm=fwhm,
+    )
+    result = await compute_pool.run(
+        result_cache.get_or_compute, "snr", profile, inputs, partial(snr_result, profile)
+    )
+
+    record_result(
+        profile, "calculate_snr", magnitude=magnitude, sky_brightness=sky_brightness,
+        airmass=etc_engine.airmass_from_zenith(zenith_distance), fwhm=fwhm,
+        snr=result["snr"], exposure_time=exposure_time,
+    )
 
-    return templates.TemplateResponse("result.html", {
+    return await compute_pool.run(templates.TemplateResponse, "result.html", {
         "request": request,
         "telescope": telescope,
         "ccd": ccd,
@@ -283,7 +332,7 @@ async def calculate_snr(
         "sky_brightness": sky_brightness,
         "zenith_distance": zenith_distance,
         "fwhm": fwhm,
-        "snr": snr,
+        "snr": result["snr"],
     })
 
 @app.post("/calculate_snr_and_exposure", response_class=HTMLResponse)
@@ -292,33 +341,28 @@ async def calculate_snr_and_exposure_endpoint(
     telescope: str = Form(...),
     ccd: str = Form(...),
     magnitude: float = Form(...),
-    sky_brightness: float = Form(...),
+    sky_brightness: Optional[float] = Form(None),
     snr_target: float = Form(...),
     filter: str = Form(...),
     airmass: float = Form(...),
 ):
-    # Ambil data teleskop dan CCD
-    telescope_data = telescopes[telescope]
-    ccd_data = ccds[ccd]
-    combination_data = combinations[(telescope, ccd)]
-
-    # Ambil parameter dari teleskop dan CCD
-    aperture_area = math.pi * (telescope_data["aperture"] / 2) ** 2
-    pixel_scale = ccd_data["pixel_size"] / 1000  # Konversi dari micrometer ke mm
-    read_noise = ccd_data["read_noise"]
-    dark_current = ccd_data["dark_current"]
-    zeropoint = combination_data["zeropoint"]
-    filter_extinction = k[filter]
-
-    # Perbaikan perhitungan plate scale
-    pixel_scale = 206.265 * ccd_data["pixel_size"] / (telescope_data["focal_length"] * 1000)  # arcsec/pixel
-
-    # Hitung SNR dan waktu eksposur
-    snr, exposure_time = calculate_snr_and_exposure_logic(
-        magnitude, zeropoint, sky_brightness, aperture_area, pixel_scale, read_noise, dark_current, snr_target, filter_extinction, airmass
+    # Ambil parameter dari profil teleskop + CCD + filter
+    profile = get_profile(telescope, ccd, filter)
+    sky_brightness = resolve_sky(sky_brightness, filter)
+    inputs = result_cache.quantize(
+        magnitude=magnitude, sky_brightness=sky_brightness, snr_target=snr_target, airmass=airmass
+    )
+    snr, exposure_time = await compute_pool.run(
+        result_cache.get_or_compute, "snr_and_exposure", profile, inputs,
+        partial(snr_and_exposure_result, profile)
+    )
+
+    record_result(
+        profile, "calculate_snr_and_exposure", magnitude=magnitude, sky_brightness=sky_brightness,
+        airmass=airmass, snr=snr, exposure_time=exposure_time,
     )
 
-    return templates.TemplateResponse("result.html", {
+    return await compute_pool.run(templates.TemplateResponse, "result.html", {
         "request": request,
         "telescope": telescope,
         "ccd": ccd,
@@ -331,33 +375,78 @@ async def calculate_snr_and_exposure_endpoint(
         "exposure_time": exposure_time,
     })
 
+@app.post("/calculate_limiting_magnitude", response_class=HTMLResponse)
+async def calculate_limiting_magnitude(
+    request: Request,
+    telescope: str = Form(...),
+    ccd: str = Form(...),
+    snr: float = Form(...),
+    exposure_time: float = Form(...),
+    filter: str = Form(...),
+    sky_brightness: Optional[float] = Form(None),
+    zenith_distance: float = Form(...),
+    fwhm: float = Form(...),
+):
+    # Magnitude paling redup yang mencapai SNR dalam exposure time tertentu
+    profile = get_profile(telescope, ccd, filter)
+    sky_brightness = resolve_sky(sky_brightness, filter)
+    inputs = result_cache.quantize(
+        sky_brightness=sky_brightness, zenith_distance=zenith_distance, fwhm=fwhm,
+        snr_target=snr, exposure_time=exposure_time,
+    )
+    result = await compute_pool.run(
+        result_cache.get_or_compute, "limiting_magnitude", profile, inputs,
+        partial(etc_engine.evaluate_limiting_magnitude, profile)
+    )
+
+    record_result(
+        profile, "calculate_limiting_magnitude", magnitude=result["magnitude"], sky_brightness=sky_brightness,
+        airmass=etc_engine.airmass_from_zenith(zenith_distance), fwhm=fwhm,
+        snr=result["snr"], exposure_time=exposure_time,
+    )
+
+    return await compute_pool.run(templates.TemplateResponse, "result.html", {
+        "request": request,
+        "telescope": telescope,
+        "ccd": ccd,
+        "magnitude": round(float(result["magnitude"]), 2),
+        "exposure_time": exposure_time,
+        "filter": filter,
+        "sky_brightness": sky_brightness,
+        "zenith_distance": zenith_distance,
+        "fwhm": fwhm,
+        "snr": float(result["snr"]),
+    })
+
+def snr_and_exposure_result(profile, magnitude, sky_brightness, snr_target, airmass):
+    # Parameter profil untuk calculate_snr_and_exposure_logic
+    return calculate_snr_and_exposure_logic(
+        magnitude, profile.zeropoint, sky_brightness, profile.aperture_area, profile.pixel_scale,
+        profile.read_noise, profile.dark_current, snr_target, profile.extinction_coefficient, airmass,
+        profile.quantum_efficiency,
+    )
+
 # Function to calculate SNR and exposure time
 def calculate_snr_and_exposure_logic(
-    magnitude, zeropoint, sky_brightness, aperture_area, pixel_scale, read_noise, dark_current, snr_target, filter_extinction, airmass
+    magnitude, zeropoint, sky_brightness, aperture_area, pixel_scale, read_noise, dark_current, snr_target, filter_extinction, airmass,
+    quantum_efficiency,
 ):
     extinction = filter_extinction * airmass
     flux_star = 10 ** (-0.4 * (magnitude - zeropoint + extinction))
-    quantum_efficiency = 0.9  # Example value, adjust as needed
     signal_star = flux_star * aperture_area * quantum_efficiency
 
-    flux_sky = 10 ** (-0.4 * sky_brightness)
+    # Zeropoint yang sama dengan endpoint lain (lihat snr_result)
+    flux_sky = 10 ** (-0.4 * (sky_brightness - zeropoint))
     signal_sky = flux_sky * aperture_area * quantum_efficiency
 
     num_pixels = max(9, (1.5 / pixel_scale) ** 2 * math.pi)  # Example aperture area in pixels
-    exposure_time = 1.0
 
-    while True:
-        noise_sky = math.sqrt(signal_sky * num_pixels * exposure_time)
-        noise_read = math.sqrt(num_pixels) * read_noise
-        noise_dark = math.sqrt(num_pixels * dark_current * exposure_time)
-        total_noise = math.sqrt((signal_star * exposure_time) + noise_sky + noise_read + noise_dark)
-
-        snr = (signal_star * exposure_time) / total_noise
-        if snr >= snr_target or exposure_time > 3600:
-            break
-        exposure_time += 1.0
-
-    return snr, exposure_time
+    # Model noise lama (suku noise diakar dulu) tidak punya solusi tertutup,
+    # jadi pakai solver Newton; dibatasi 3600 detik seperti loop sebelumnya
+    solution = etc_solver.solve_exposure_time(
+        signal_star, signal_sky, read_noise, dark_current, num_pixels, snr_target, noise_model="legacy"
+    )
+    return float(solution["snr"]), float(solution["exposure_time"])
 
 # Perbaikan perhitungan area aperture dengan Gaussian PSF
 def calculate_pixels_in_aperture(fwhm, pixel_scale):
@@ -368,12 +457,10 @@ def calculate_pixels_in_aperture(fwhm, pixel_scale):
     area_pixels = math.pi * radius_pixels**2
     num_pixels = max(min(round(area_pixels), 100), 9)  # Batasi antara 9-100 piksel
     
-    print(f"Aperture calculation:")
-    print(f"FWHM: {fwhm:.2f} arcsec")
-    print(f"Pixel scale: {pixel_scale:.2f} arcsec/pixel")
-    print(f"Radius: {radius_pixels:.2f} pixels")
-    print(f"Area: {area_pixels:.2f} pixels²")
-    print(f"Final pixels: {num_pixels}")
+    logger.debug("Aperture calculation", extra={"fields": {
+        "fwhm_arcsec": fwhm, "pixel_scale_arcsec": pixel_scale,
+        "radius_pixels": radius_pixels, "area_pixels2": area_pixels, "num_pixels": num_pixels,
+    }})
     
     return num_pixels
 
@@ -385,10 +472,517 @@ def calculate_signal(magnitude, zeropoint, extinction, aperture_area, quantum_ef
     signal = flux * aperture_area * quantum_efficiency
     return signal
 
-if __name__ == "__main__":
-    uvicorn.run(
-        "main2_24_march:app",
-        host="127.0.0.1",
-        port=8000,
-        reload=True
+@app.websocket("/ws/live")
+async def live_calculation(websocket: WebSocket):
+    """
+    Perhitungan live untuk form: client mengirim object JSON berisi input yang berubah
+    (telescope, ccd, filter, mode, magnitude, sky_brightness, zenith_distance, fwhm, snr,
+    exposure_time, opsional seq), server membalas kolom hasil yang berubah saja
+    """
+    await etc_live.serve(websocket, profiles)
+
+@app.post("/api/v1/batch")
+async def calculate_batch(request: Request, telescope: str, ccd: str, engine: str = "imam"):
+    """
+    Batch ETC untuk daftar target (JSON array atau NDJSON), hasil di-stream sebagai NDJSON.
+    Tiap target: magnitude, filter, sky_brightness, zenith_distance, fwhm dan snr atau exposure_time.
+    engine: imam (default) atau lco (model ETC LCO, tambahan kolom peak dan saturated).
+    """
+    try:
+        combination_profiles = engine_profiles(telescope, ccd)
+        evaluate = lco_engine.get_engine(engine)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=e.args[0])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        targets = await etc_batch.read_targets(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def record_chunk(valid, results):
+        # Hasil per filter ke store; target dengan id masuk katalog target
+        rows = {}
+        for target, result in zip(valid, results):
+            row = {
+                "magnitude": target["magnitude"], "sky_brightness": target["sky_brightness"],
+                "airmass": etc_engine.airmass_from_zenith(target["zenith_distance"]), "fwhm": target["fwhm"],
+                "snr": result["snr"], "exposure_time": result["exposure_time"],
+            }
+            if target.get("id") is not None:
+                row["target"] = {"name": target["id"], "magnitude": target["magnitude"], "filter": target["filter"]}
+            rows.setdefault(target["filter"], []).append(row)
+        for filter_name, filter_rows in rows.items():
+            store.record(combination_profiles[filter_name], filter_rows, f"batch/{engine}", profiles.calibration_version)
+
+    return StreamingResponse(
+        etc_batch.stream_results(
+            targets, combination_profiles, engine=evaluate, on_chunk=record_chunk, run=compute_pool.run
+        ),
+        media_type="application/x-ndjson",
+    )
+
+@app.post("/api/v1/matrix")
+async def instrument_matrix(request: Request):
+    """
+    Bandingkan semua kombinasi teleskop x CCD x filter untuk satu atau banyak target (JSON object):
+    targets (object atau array: magnitude, sky_brightness, zenith_distance, fwhm, opsional id,
+    snr atau exposure_time), opsional snr / exposure_time default, telescopes, ccds, filters
+    (membatasi setup) dan top (jumlah setup per target, null = semua).
+    Hasil: peringkat setup per target (exposure time terpendek atau SNR tertinggi).
+    """
+    try:
+        body = etc_batch.loads(await request.body())
+        targets = body["targets"]
+        # Tabel bisa berisi puluhan ribu baris: di-serialisasi langsung (tanpa jsonable_encoder)
+        content = await compute_pool.run(
+            lambda: etc_batch.dumps(etc_matrix.compare(
+                profiles.profiles(), targets,
+                snr=body.get("snr"), exposure_time=body.get("exposure_time"),
+                telescopes=body.get("telescopes"), ccds=body.get("ccds"), filters=body.get("filters"),
+                top=body.get("top", etc_matrix.DEFAULT_TOP),
+            ))
+        )
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Field {e.args[0]} tidak ada atau tidak valid")
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(content=content, media_type="application/json")
+
+@app.post("/api/v1/compare")
+async def compare_engines(request: Request):
+    """
+    Bandingkan engine imam dan lco untuk daftar target (JSON object):
+    telescope, ccd (config instrumen atau tabel LCO), targets (format batch; sky_brightness boleh
+    diganti moon_phase new | half | full dari tabel LCO), opsional tolerance (selisih relatif), discrete.
+    """
+    try:
+        body = etc_batch.loads(await request.body())
+        telescope, ccd = body["telescope"], body["ccd"]
+        targets = body["targets"]
+        for target in targets:
+            if (isinstance(target, dict) and target.get("sky_brightness") is None and "moon_phase" in target
+                    and target.get("filter") in lco_engine.FILTERS):
+                target["sky_brightness"] = lco_engine.sky_brightness(target.get("filter"), target["moon_phase"])
+        tolerance = float(body.get("tolerance", lco_engine.COMPARE_TOLERANCE))
+        discrete = bool(body.get("discrete", False))
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Field {e.args[0]} tidak ada atau tidak valid")
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        combination_profiles = engine_profiles(telescope, ccd)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=e.args[0])
+
+    return await compute_pool.run(lco_engine.compare, targets, combination_profiles, tolerance, discrete)
+
+@app.get("/api/v1/throughput")
+async def throughput_info(
+    telescope: str,
+    ccd: str,
+    filter: str,
+    temperature: float = throughput.REFERENCE_TEMPERATURE,
+    zenith_distance: float = 0.0,
+):
+    """
+    Model throughput spektral untuk sumber blackbody: zeropoint dan ekstingsi efektif,
+    laju elektron untuk magnitude 0 dan offset warna terhadap zeropoint config
+    """
+    profile = get_profile(telescope, ccd, filter)
+    try:
+        return throughput.describe(profile, temperature, zenith_distance)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/v1/sky")
+async def sky_info(site: str = sky_background.DEFAULT_SITE, filter: Optional[str] = None, limit: int = 20):
+    """
+    Default sky brightness (median pengukuran terakhir) per filter untuk satu site,
+    plus pengukuran terakhir jika filter diisi
+    """
+    result = {"site": site, "defaults": sky_history.defaults(site)}
+    if filter is not None:
+        result["filter"] = filter
+        result["default"] = sky_history.default(site, filter)
+        result["records"] = sky_history.records(site, filter, max(limit, 1))
+    return result
+
+@app.post("/api/v1/simulate")
+async def simulate_noise(request: Request):
+    """
+    Simulasi Monte Carlo noise fotometri untuk satu target (JSON object):
+    telescope, ccd, filter, magnitude, exposure_time, opsional sky_brightness, zenith_distance, fwhm,
+    frames (maks ETC_SIMULATION_MAX_FRAMES), seed, psf, aperture_radius (x FWHM), sky (known | annulus).
+    SNR terukur dibandingkan dengan prediksi rumus jumlah variansi dan rumus legacy.
+    """
+    try:
+        body = etc_batch.loads(await request.body())
+        profile = get_profile(body["telescope"], body["ccd"], body["filter"])
+        frames = int(body.get("frames", 10000))
+        if not 2 <= frames <= noise_simulator.MAX_FRAMES:
+            raise ValueError(f"frames harus 2-{noise_simulator.MAX_FRAMES}, pakai noise_simulator.py untuk lebih")
+        args = (
+            profile, float(body["magnitude"]), float(body.get("sky_brightness", 20.0)),
+            float(body.get("zenith_distance", 30.0)), float(body.get("fwhm", 2.0)), float(body["exposure_time"]),
+        )
+        options = {
+            "n_frames": frames,
+            "seed": int(body.get("seed", 0)),
+            "psf": body.get("psf", "gaussian"),
+            "aperture_radius": float(body.get("aperture_radius", 1.5)),
+            "sky": body.get("sky", "known"),
+        }
+        # Validasi input sebelum masuk pool
+        noise_simulator.prepare(*args, psf=options["psf"], aperture_radius=options["aperture_radius"], sky=options["sky"])
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Field {e.args[0]} tidak ada atau tidak valid")
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return await compute_pool.run(
+        noise_simulator.simulate, *args, **options, timeout=noise_simulator.SIMULATION_TIMEOUT
+    )
+
+@app.post("/api/v1/plan")
+async def plan_night(request: Request):
+    """
+    Jadwal satu malam untuk daftar target (JSON object):
+    telescope, ccd, date (YYYY-MM-DD, tanggal lokal awal malam), targets [{id, ra, dec, magnitude, filter}],
+    opsional site {latitude, longitude}, min_altitude, twilight, snr, sky_brightness, fwhm,
+    n_exposures, overhead (detik per target).
+    """
+    try:
+        body = etc_batch.loads(await request.body())
+        combination_profiles = get_combination(body["telescope"], body["ccd"])
+        targets = night_planner.parse_targets(body["targets"])
+        site = {**night_planner.DEFAULT_SITE, **body.get("site", {})}
+        sky_brightness = float(body.get("sky_brightness", 20.0))
+        fwhm = float(body.get("fwhm", 2.0))
+        snr_target = float(body.get("snr", 100.0))
+        plan = await compute_pool.run(
+            night_planner.plan_night, combination_profiles, targets, body["date"], site=site,
+            min_altitude=float(body.get("min_altitude", night_planner.MIN_ALTITUDE)),
+            twilight=float(body.get("twilight", night_planner.TWILIGHT_ALTITUDE)),
+            sky_brightness=sky_brightness,
+            fwhm=fwhm,
+            snr_target=snr_target,
+            n_exposures=int(body.get("n_exposures", 1)),
+            overhead=float(body.get("overhead", night_planner.OVERHEAD)),
+        )
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Field {e.args[0]} tidak ada atau tidak valid")
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Rekomendasi (target terjadwal) masuk store bersama koordinat target (id unik, dicek parse_targets)
+    index = {target_id: i for i, target_id in enumerate(targets["id"])}
+    rows = {}
+    for item in plan["scheduled"]:
+        i = index[item["id"]]
+        rows.setdefault(item["filter"], []).append({
+            "target": {
+                "name": item["id"], "ra": targets["ra"][i], "dec": targets["dec"][i],
+                "magnitude": targets["magnitude"][i], "filter": item["filter"],
+            },
+            "magnitude": targets["magnitude"][i], "sky_brightness": sky_brightness,
+            "airmass": item["best_airmass"], "fwhm": fwhm, "snr": snr_target, "exposure_time": item["exposure_time"],
+        })
+    for filter_name, filter_rows in rows.items():
+        store.record(combination_profiles[filter_name], filter_rows, "plan", profiles.calibration_version)
+    return plan
+
+@app.post("/api/v1/targets")
+async def add_targets(request: Request):
+    """
+    Tambah/perbarui katalog target (JSON array atau NDJSON): name (atau id), opsional ra, dec
+    (derajat atau sexagesimal), magnitude, filter
+    """
+    try:
+        rows = []
+        for raw in await etc_batch.read_targets(request):
+            target = etc_batch.loads(raw) if isinstance(raw, (bytes, str)) else raw
+            if not isinstance(target, dict):
+                raise ValueError("Target harus berupa object")
+            target = dict(target)
+            if target.get("ra") is not None:
+                target["ra"] = night_planner.parse_angle(target["ra"], hours=True)
+            if target.get("dec") is not None:
+                target["dec"] = night_planner.parse_angle(target["dec"])
+            rows.append(target)
+        ids = await compute_pool.run(store.add_targets, rows)
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"count": len(ids)}
+
+@app.get("/api/v1/targets")
+async def list_targets(after: int = 0, limit: int = etc_store.PAGE_SIZE, max_magnitude: Optional[float] = None):
+    """
+    Katalog target per halaman (after = next dari halaman sebelumnya)
+    """
+    return await compute_pool.run(store.targets, after, limit, max_magnitude)
+
+@app.get("/api/v1/reachable")
+async def reachable_targets(
+    telescope: str, ccd: str, filter: str, snr: float, max_exposure: float,
+    after: int = 0, limit: int = etc_store.PAGE_SIZE,
+):
+    """
+    Target tersimpan yang mencapai SNR >= snr dalam exposure_time < max_exposure dengan profil
+    (versi saat ini) teleskop + CCD + filter, dari hasil yang sudah dihitung (batch, plan, form)
+    """
+    profile = get_profile(telescope, ccd, filter)
+    # Hasil yang sudah antre di thread penulis saat request masuk ikut terlihat (ditunggu terbatas)
+    await compute_pool.run(store.flush, etc_store.FLUSH_TIMEOUT)
+    return await compute_pool.run(
+        store.reachable, profile, snr, max_exposure, after, limit, profiles.calibration_version
     )
+
+@app.get("/api/v1/history")
+async def calculation_history(
+    telescope: Optional[str] = None, ccd: Optional[str] = None, filter: Optional[str] = None,
+    source: Optional[str] = None, before: Optional[int] = None, limit: int = etc_store.PAGE_SIZE,
+):
+    """
+    Riwayat hasil perhitungan terbaru dulu (before = next dari halaman sebelumnya)
+    """
+    return await compute_pool.run(store.history, telescope, ccd, filter, source, before, limit)
+
+@app.get("/api/v1/profile_versions")
+async def profile_versions(telescope: str, ccd: str, filter: Optional[str] = None):
+    """
+    Versi profil instrumen/kalibrasi yang pernah dipakai untuk hasil tersimpan
+    """
+    return await compute_pool.run(store.profile_versions, telescope, ccd, filter)
+
+@app.post("/api/v1/optimal_aperture")
+async def optimal_aperture(request: Request):
+    """
+    Radius aperture yang memaksimalkan SNR untuk setiap target (JSON object):
+    telescope, ccd, exposure_time, opsional psf (gaussian | moffat), beta,
+    targets [{magnitude, filter, sky_brightness, zenith_distance, fwhm}].
+    """
+    try:
+        body = etc_batch.loads(await request.body())
+        combination_profiles = get_combination(body["telescope"], body["ccd"])
+        exposure_time = float(body["exposure_time"])
+        psf = body.get("psf", "gaussian")
+        beta = float(body.get("beta", aperture_model.MOFFAT_BETA))
+        targets = body["targets"]
+        filters = [target["filter"] for target in targets]
+        columns = {
+            name: np.array([float(target[name]) for target in targets])
+            for name in ("magnitude", "sky_brightness", "zenith_distance", "fwhm")
+        }
+        unknown = [f for f in set(filters) if f not in combination_profiles]
+        if unknown:
+            raise ValueError(f"Filter {unknown[0]} tidak dikenal")
+        if psf not in aperture_model.PSF_PROFILES:
+            raise ValueError(f"PSF {psf} tidak dikenal")
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Field {e.args[0]} tidak ada atau tidak valid")
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    filters = np.array(filters)
+
+    def compute():
+        results = [None] * len(targets)
+        for filter_name in np.unique(filters):
+            mask = filters == filter_name
+            profile = combination_profiles[filter_name]
+            extinction = profile.extinction_coefficient * etc_engine.airmass_from_zenith(columns["zenith_distance"][mask])
+            signal_star = etc_engine.calculate_signal(
+                columns["magnitude"][mask], profile.zeropoint, extinction, profile.aperture_area, profile.quantum_efficiency
+            )
+            # Sky per piksel dari mag/arcsec² dikali luas piksel
+            signal_sky = etc_engine.calculate_signal(
+                columns["sky_brightness"][mask], profile.zeropoint, 0.0, profile.aperture_area, profile.quantum_efficiency
+            ) * profile.pixel_scale ** 2
+            best = aperture_model.optimal_aperture(
+                signal_star, signal_sky, profile.read_noise, profile.dark_current, exposure_time,
+                columns["fwhm"][mask] / profile.pixel_scale, psf=psf, beta=beta,
+            )
+            for position, index in enumerate(np.flatnonzero(mask).tolist()):
+                results[index] = {
+                    "radius_pixels": round(float(best["radius"][position]), 3),
+                    "radius_arcsec": round(float(best["radius"][position] * profile.pixel_scale), 3),
+                    "num_pixels": float(best["num_pixels"][position]),
+                    "encircled_energy": round(float(best["encircled_energy"][position]), 4),
+                    "snr": round(float(best["snr"][position]), 2),
+                }
+        return results
+
+    results = await compute_pool.run(compute)
+    return {"psf": psf, "exposure_time": exposure_time, "results": results}
+
+@app.post("/api/v1/stack")
+async def stack(request: Request):
+    """
+    Rencana sub-exposure tanpa saturasi untuk setiap target (JSON object):
+    telescope, ccd, targets [{id, magnitude, filter, opsional snr, sky_brightness, zenith_distance, fwhm}],
+    opsional default snr, sky_brightness, zenith_distance, fwhm, psf, max_sub_exposure,
+    overhead (detik per frame, default readout CCD), saturation_fraction.
+    """
+    try:
+        body = etc_batch.loads(await request.body())
+        combination_profiles = get_combination(body["telescope"], body["ccd"])
+        psf = body.get("psf", "gaussian")
+        if psf not in aperture_model.PSF_PROFILES:
+            raise ValueError(f"PSF {psf} tidak dikenal")
+        defaults = {"snr": 100.0, "sky_brightness": 20.0, "zenith_distance": 30.0, "fwhm": 2.0}
+        defaults.update({name: body[name] for name in defaults if name in body})
+        targets = body["targets"]
+        filters = np.array([target["filter"] for target in targets])
+        columns = {name: np.array([float(target.get(name, default)) for target in targets]) for name, default in defaults.items()}
+        columns["magnitude"] = np.array([float(target["magnitude"]) for target in targets])
+        unknown = [f for f in set(filters.tolist()) if f not in combination_profiles]
+        if unknown:
+            raise ValueError(f"Filter {unknown[0]} tidak dikenal")
+        options = {
+            "psf": psf,
+            "max_sub_exposure": float(body.get("max_sub_exposure", etc_stacking.MAX_SUB_EXPOSURE)),
+            "overhead": None if body.get("overhead") is None else float(body["overhead"]),
+            "saturation_fraction": float(body.get("saturation_fraction", etc_stacking.SATURATION_FRACTION)),
+        }
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Field {e.args[0]} tidak ada atau tidak valid")
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def compute():
+        results = [None] * len(targets)
+        for filter_name in np.unique(filters):
+            mask = filters == filter_name
+            plan = etc_stacking.solve_stack(
+                combination_profiles[filter_name], columns["magnitude"][mask], columns["sky_brightness"][mask],
+                columns["zenith_distance"][mask], columns["fwhm"][mask], columns["snr"][mask], **options
+            )
+            for position, index in enumerate(np.flatnonzero(mask).tolist()):
+                row = {"id": targets[index].get("id", index), "filter": str(filter_name)}
+                for name, values in plan.items():
+                    value = values[position]
+                    if values.dtype == bool:
+                        row[name] = bool(value)
+                    elif name == "n_frames":
+                        row[name] = int(value) if np.isfinite(value) else None
+                    else:
+                        row[name] = round(float(value), 3) if np.isfinite(value) else None
+                results[index] = row
+        return results
+
+    results = await compute_pool.run(compute)
+    wall_clock = sum(row["wall_clock"] for row in results if row["wall_clock"] is not None)
+    return {"psf": psf, "results": results, "total_wall_clock": round(wall_clock, 1)}
+
+@app.post("/api/v1/sweep")
+async def sweep(request: Request):
+    """
+    Sweep grid Cartesian untuk satu profil (JSON object):
+    telescope, ccd, filter, axes {nama: {start, stop, num} | {values}}, fixed {nama: nilai},
+    output (default snr atau exposure_time), format npy | arrow | png | svg, dtype float32 | float64.
+    png/svg berupa heatmap + kontur (tepat dua sumbu).
+    """
+    try:
+        body = etc_batch.loads(await request.body())
+        profile = get_profile(body["telescope"], body["ccd"], body["filter"])
+        axes = body["axes"]
+        fixed = body.get("fixed", {})
+        default_output = "exposure_time" if "snr" in axes or "snr" in fixed else "snr"
+        output = body.get("output", default_output)
+        fmt = body.get("format", "npy")
+        if fmt not in etc_sweep.FORMATS:
+            raise ValueError(f"Format {fmt} tidak didukung ({', '.join(etc_sweep.FORMATS)})")
+        dtype = etc_sweep.DTYPES[body.get("dtype", "float64")]
+        names, values, fixed = etc_sweep.prepare(axes, fixed, output)
+        etc_sweep.required_inputs(names, fixed)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Field {e.args[0]} tidak ada atau tidak valid")
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    headers = {"X-Sweep": etc_sweep.describe(names, values, output, dtype)}
+    if fmt in etc_plots.MEDIA_TYPES:
+        if len(names) != 2:
+            raise HTTPException(status_code=400, detail="Heatmap membutuhkan tepat dua sumbu")
+        key = etc_plots.plot_key("heatmap", fmt, {profile.filter: profile}, {
+            "axes": {name: v.tolist() for name, v in zip(names, values)}, "fixed": fixed, "output": output,
+        })
+
+        def heatmap_data():
+            grid = etc_sweep.evaluate_grid(profile, names, values, fixed, output)
+            return {
+                # Sumbu pertama di sumbu y (baris grid), sumbu kedua di sumbu x
+                "x": values[1], "y": values[0], "z": grid,
+                "x_label": names[1], "y_label": names[0], "output": output,
+                "title": f"{profile.telescope} + {profile.ccd}, filter {profile.filter}",
+            }
+
+        # Grid dihitung di compute pool seperti format lain, bukan di event loop
+        image = await etc_plots.render_heatmap_plot(key, fmt, lambda: compute_pool.run(heatmap_data))
+        return Response(content=image, media_type=etc_plots.MEDIA_TYPES[fmt], headers=headers)
+
+    grid = await compute_pool.run(etc_sweep.evaluate_grid, profile, names, values, fixed, output, dtype)
+    if fmt == "npy":
+        return Response(content=etc_sweep.to_npy(grid), media_type="application/octet-stream", headers=headers)
+    try:
+        content = etc_sweep.to_arrow(grid, names, values, output)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(content=content, media_type="application/vnd.apache.arrow.stream", headers=headers)
+
+@app.get("/plot")
+async def plot(
+    request: Request,
+    telescope: str,
+    ccd: str,
+    filter: str = "V",
+    kind: str = "exposure_vs_magnitude",
+    format: str = "png",
+    sky_brightness: Optional[float] = None,
+    zenith_distance: float = 30.0,
+    fwhm: float = 2.0,
+    snr: float = 200.0,
+    magnitude: float = 11.5,
+):
+    """
+    Plot exposure time vs magnitude, SNR vs exposure time, atau comparison (semua filter)
+    untuk kombinasi instrumen apa saja. Rendering di process pool, hasil di-cache.
+    Tanpa sky_brightness dipakai sky terukur untuk filter ini, lalu 17.5 mag/arcsec².
+    """
+    if sky_brightness is None:
+        sky_brightness = sky_history.default(sky_background.DEFAULT_SITE, filter) or 17.5
+    if kind == "comparison":
+        plot_profiles = get_combination(telescope, ccd)
+    else:
+        plot_profiles = {filter: get_profile(telescope, ccd, filter)}
+
+    try:
+        image, key = await etc_plots.render_plot(
+            kind, format, plot_profiles, sky_brightness, zenith_distance, fwhm, snr, magnitude
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=3600"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=image, media_type=etc_plots.MEDIA_TYPES[format], headers=headers)
+
+@app.on_event("shutdown")
+def shutdown_pools():
+    etc_plots.shutdown()
+    noise_simulator.shutdown()
+    compute_pool.shutdown()
+    if not store.flush(etc_store.SHUTDOWN_FLUSH_TIMEOUT):
+        logger.warning("Hasil yang antre belum selesai ditulis ke store saat shutdown")
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Latensi, jumlah request dan iterasi solver dalam format Prometheus
+    return PlainTextResponse(etc_metrics.render_metrics(), media_type="text/plain; version=0.0.4")
+
+if __name__ == "__main__":
+    # ETC_RELOAD=1 untuk development, ETC_WORKERS=N untuk beberapa worker (lihat README)
+    etc_serving.run("main2_24_march:app")
@@ -0,0 +1,284 @@
+import datetime
+import math
+import re
+
+import numpy as np
+
+import etc_engine
+
+# Perencanaan malam pengamatan: altitude/airmass semua target pada grid waktu per menit
+# dihitung sekaligus (array target x waktu), waktu sideris dan posisi Matahari dihitung
+# offline (rumus presisi rendah Astronomical Almanac, cukup untuk penjadwalan).
+# Exposure time tiap target dihitung engine ETC pada airmass terbaiknya, lalu target
+# disusun ke dalam jadwal secara greedy.
+
+# Observatorium Bosscha, Lembang
+DEFAULT_SITE = {"latitude": -6.8245, "longitude": 107.6157}
+TWILIGHT_ALTITUDE = -18.0  # astronomical twilight
+MIN_ALTITUDE = 30.0  # derajat, setara airmass ~2
+STEP_MINUTES = 1
+OVERHEAD = 60.0  # detik per target (slew + setting)
+
+_SEXAGESIMAL = re.compile(r"^\s*([+-]?)(\d+)[:\sh]+(\d+)[:\sm]+([\d.]+)s?\s*$")
+
+
+def parse_angle(value, hours=False):
+    """
+    Sudut dalam derajat dari angka (derajat) atau string "hh:mm:ss" / "dd:mm:ss"
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _SEXAGESIMAL.match(str(value))
+    if match is None:
+        return float(value)
+    sign, a, b, c = match.groups()
+    angle = int(a) + int(b) / 60 + float(c) / 3600
+    angle = -angle if sign == "-" else angle
+    return angle * 15 if hours else angle
+
+
+def julian_date(unix_time):
+    return np.asarray(unix_time, dtype=float) / 86400.0 + 2440587.5
+
+
+def local_sidereal_time(jd, longitude):
+    """
+    Local sidereal time (derajat) dari GMST, longitude positif ke timur
+    """
+    gmst = 280.46061837 + 360.98564736629 * (jd - 2451545.0)
+    return np.mod(gmst + longitude, 360.0)
+
+
+def sun_position(jd):
+    """
+    RA dan Dec Matahari (derajat), presisi ~0.01 derajat
+    """
+    n = jd - 2451545.0
+    mean_longitude = np.radians(280.460 + 0.9856474 * n)
+    mean_anomaly = np.radians(357.528 + 0.9856003 * n)
+    ecliptic_longitude = mean_longitude + np.radians(1.915) * np.sin(mean_anomaly) + np.radians(0.020) * np.sin(2 * mean_anomaly)
+    obliquity = np.radians(23.439 - 0.0000004 * n)
+    ra = np.degrees(np.arctan2(np.cos(obliquity) * np.sin(ecliptic_longitude), np.cos(ecliptic_longitude)))
+    dec = np.degrees(np.arcsin(np.sin(obliquity) * np.sin(ecliptic_longitude)))
+    return np.mod(ra, 360.0), dec
+
+
+def altitude(ra, dec, lst, latitude):
+    """
+    Altitude (derajat); ra/dec dan lst di-broadcast, mis. (N, 1) terhadap (1, T)
+    """
+    hour_angle = np.radians(lst - ra)
+    lat = math.radians(latitude)
+    dec = np.radians(dec)
+    sin_alt = math.sin(lat) * np.sin(dec) + math.cos(lat) * np.cos(dec) * np.cos(hour_angle)
+    return np.degrees(np.arcsin(np.clip(sin_alt, -1.0, 1.0)))
+
+
+def night_grid(date, site=DEFAULT_SITE, twilight=TWILIGHT_ALTITUDE, step_minutes=STEP_MINUTES):
+    """
+    Grid waktu (unix time) malam yang dimulai pada tanggal lokal `date`,
+    hanya saat Matahari di bawah altitude twilight
+    """
+    if isinstance(date, str):
+        date = datetime.date.fromisoformat(date)
+    # Mulai tengah hari waktu matahari lokal, 24 jam ke depan
+    noon = datetime.datetime(date.year, date.month, date.day, 12, tzinfo=datetime.timezone.utc)
+    start = noon.timestamp() - site["longitude"] / 15.0 * 3600.0
+    times = start + np.arange(0, 24 * 60, step_minutes) * 60.0
+
+    jd = julian_date(times)
+    sun_ra, sun_dec = sun_position(jd)
+    sun_altitude = altitude(sun_ra, sun_dec, local_sidereal_time(jd, site["longitude"]), site["latitude"])
+    dark = np.flatnonzero(sun_altitude < twilight)
+    if dark.size == 0:
+        return times[:0]
+    # Satu malam bersambung (dari senja sampai fajar)
+    return times[dark[0]:dark[-1] + 1]
+
+
+def airmass_grid(ra, dec, times, site=DEFAULT_SITE):
+    """
+    Altitude dan airmass (sec z, sama dengan engine) untuk semua target x waktu.
+    Airmass = inf saat target di bawah horizon.
+    """
+    ra = np.radians(np.asarray(ra, dtype=float))[:, None]
+    dec = np.radians(np.asarray(dec, dtype=float))[:, None]
+    lst = np.radians(local_sidereal_time(julian_date(times), site["longitude"]))[None, :]
+    lat = math.radians(site["latitude"])
+    # cos(LST - RA) diuraikan supaya fungsi trigonometri hanya dihitung per target dan per waktu,
+    # bukan per elemen grid
+    cos_hour_angle = np.cos(lst) * np.cos(ra) + np.sin(lst) * np.sin(ra)
+    sin_alt = math.sin(lat) * np.sin(dec) + (math.cos(lat) * np.cos(dec)) * cos_hour_angle
+    alt = np.degrees(np.arcsin(np.clip(sin_alt, -1.0, 1.0)))
+    with np.errstate(divide="ignore"):
+        airmass = np.where(alt > 0, 1 / np.sin(np.radians(alt)), np.inf)
+    return alt, airmass
+
+
+def best_airmass(alt, airmass, min_altitude=MIN_ALTITUDE):
+    """
+    Indeks waktu dengan altitude tertinggi, airmass di titik itu, dan mask visibilitas
+    """
+    visible = alt >= min_altitude
+    best = np.argmax(alt, axis=1)
+    rows = np.arange(alt.shape[0])
+    return best, airmass[rows, best], visible
+
+
+def exposure_times(profiles, targets, best_alt, sky_brightness, fwhm, snr_target):
+    """
+    Exposure time tiap target pada airmass terbaiknya, dikelompokkan per filter
+    """
+    filters = np.asarray(targets["filter"])
+    result = np.full(len(filters), np.nan)
+    zenith_distance = 90.0 - np.maximum(best_alt, 1.0)
+    for filter_name in np.unique(filters):
+        if filter_name not in profiles:
+            continue
+        mask = filters == filter_name
+        evaluated = etc_engine.evaluate(
+            profiles[filter_name], targets["magnitude"][mask], sky_brightness,
+            zenith_distance[mask], fwhm, snr_target=snr_target,
+        )
+        result[mask] = evaluated["exposure_time"]
+    return result
+
+
+def pack_schedule(visible, best, durations, priority=None, step_minutes=STEP_MINUTES):
+    """
+    Penjadwalan greedy: target diproses dari prioritas tertinggi lalu jendela visibilitas
+    terpendek (paling tidak fleksibel). Tiap target ditempatkan pada blok kosong yang
+    terlihat penuh selama durasinya dan paling dekat dengan waktu airmass terbaiknya.
+    Cek "terlihat/kosong selama durasi" memakai cumulative sum, vektor atas semua slot awal.
+    """
+    n_targets, n_steps = visible.shape
+    finite = np.isfinite(durations)
+    slots = np.ceil(np.where(finite, durations, 0.0) / (step_minutes * 60.0)).astype(int)
+    slots = np.where(finite, np.maximum(slots, 1), n_steps + 1)
+    cumulative = np.zeros((n_targets, n_steps + 1), dtype=np.int32)
+    np.cumsum(visible, axis=1, out=cumulative[:, 1:])
+    window = cumulative[:, -1]
+
+    priority = np.zeros(n_targets) if priority is None else np.asarray(priority, dtype=float)
+    order = np.lexsort((window, -priority))
+    occupied = np.zeros(n_steps, dtype=bool)
+    occupied_cumulative = np.zeros(n_steps + 1, dtype=np.int32)
+    pending = np.ones(n_targets, dtype=bool)
+    schedule = []
+
+    for index in order.tolist():
+        length = int(slots[index])
+        if length > window[index]:
+            continue
+        starts = np.arange(n_steps - length + 1)
+        fits = (cumulative[index, starts + length] - cumulative[index, starts]) == length
+        fits &= (occupied_cumulative[starts + length] - occupied_cumulative[starts]) == 0
+        if not fits.any():
+            continue
+        distance = np.where(fits, np.abs(starts + length / 2 - best[index]), np.inf)
+        start = int(np.argmin(distance))
+        occupied[start:start + length] = True
+        np.cumsum(occupied, out=occupied_cumulative[1:])
+        schedule.append((index, start, start + length))
+        pending[index] = False
+
+    schedule.sort(key=lambda item: item[1])
+    return schedule, pending
+
+
+def plan_night(profiles, targets, date, site=DEFAULT_SITE, min_altitude=MIN_ALTITUDE,
+               twilight=TWILIGHT_ALTITUDE, sky_brightness=20.0, fwhm=2.0, snr_target=100.0,
+               n_exposures=1, overhead=OVERHEAD, step_minutes=STEP_MINUTES):
+    """
+    Rencana satu malam untuk daftar target.
+    targets: dict kolom "id", "ra", "dec" (derajat), "magnitude", "filter", opsional "priority".
+    profiles: {filter: InstrumentProfile} untuk satu kombinasi teleskop + CCD.
+    """
+    times = night_grid(date, site, twilight, step_minutes)
+    if times.size == 0:
+        raise ValueError("Tidak ada waktu gelap pada tanggal dan lokasi ini")
+
+    alt, airmass = airmass_grid(targets["ra"], targets["dec"], times, site)
+    best, best_airmass_values, visible = best_airmass(alt, airmass, min_altitude)
+    rows = np.arange(alt.shape[0])
+    best_alt = alt[rows, best]
+
+    exposure = exposure_times(profiles, targets, best_alt, sky_brightness, fwhm, snr_target)
+    durations = exposure * n_exposures + overhead
+    durations = np.where(best_alt >= min_altitude, durations, np.inf)
+
+    schedule, pending = pack_schedule(visible, best, durations, targets.get("priority"), step_minutes)
+
+    def iso(t):
+        return datetime.datetime.fromtimestamp(float(t), datetime.timezone.utc).isoformat(timespec="seconds")
+
+    step_seconds = step_minutes * 60.0
+    scheduled = []
+    for index, start, stop in schedule:
+        scheduled.append({
+            "id": targets["id"][index],
+            "filter": str(targets["filter"][index]),
+            "start": iso(times[start]),
+            "end": iso(times[start] + (stop - start) * step_seconds),
+            "exposure_time": round(float(exposure[index]), 3),
+            "n_exposures": n_exposures,
+            "airmass": round(float(airmass[index, start]), 3),
+            "best_airmass": round(float(best_airmass_values[index]), 3),
+            "best_time": iso(times[best[index]]),
+        })
+
+    unscheduled = []
+    for index in np.flatnonzero(pending).tolist():
+        if str(targets["filter"][index]) not in profiles:
+            reason = f"Filter {targets['filter'][index]} tidak dikenal"
+        elif best_alt[index] < min_altitude:
+            reason = f"Altitude maksimum {best_alt[index]:.1f} derajat di bawah {min_altitude:g}"
+        elif not np.isfinite(exposure[index]):
+            reason = "Exposure time tidak bisa dihitung"
+        else:
+            reason = "Tidak cukup waktu"
+        unscheduled.append({"id": targets["id"][index], "reason": reason})
+
+    used = sum(stop - start for _, start, stop in schedule) * step_seconds
+    return {
+        "night_start": iso(times[0]),
+        "night_end": iso(times[-1] + step_seconds),
+        "dark_hours": round(times.size * step_seconds / 3600.0, 2),
+        "used_hours": round(used / 3600.0, 2),
+        "scheduled": scheduled,
+        "unscheduled": unscheduled,
+    }
+
+
+def parse_targets(raw_targets):
+    """
+    Daftar target JSON -> dict kolom; ra boleh derajat atau "hh:mm:ss", dec derajat atau "dd:mm:ss",
+    priority opsional (lebih besar dijadwalkan lebih dulu). id (default indeks) harus string atau
+    angka dan unik.
+    """
+    columns = {"id": [], "ra": [], "dec": [], "magnitude": [], "filter": [], "priority": []}
+    seen = set()
+    for index, target in enumerate(raw_targets):
+        target_id = target.get("id", index) if isinstance(target, dict) else index
+        if isinstance(target_id, bool) or not isinstance(target_id, (str, int, float)):
+            raise ValueError(f"Target {index} tidak valid: id harus berupa string atau angka")
+        if target_id in seen:
+            raise ValueError(f"Target {index} tidak valid: id {target_id!r} duplikat")
+        seen.add(target_id)
+        try:
+            columns["ra"].append(parse_angle(target["ra"], hours=True))
+            columns["dec"].append(parse_angle(target["dec"]))
+            columns["magnitude"].append(float(target["magnitude"]))
+            columns["filter"].append(str(target.get("filter", "V")))
+            columns["priority"].append(float(target.get("priority", 0)))
+            columns["id"].append(target_id)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Target {index} tidak valid: {e}") from None
+    return {
+        "id": columns["id"],
+        "ra": np.array(columns["ra"], dtype=float),
+        "dec": np.array(columns["dec"], dtype=float),
+        "magnitude": np.array(columns["magnitude"], dtype=float),
+        "filter": np.array(columns["filter"], dtype=str),
+        "priority": np.array(columns["priority"], dtype=float),
+    }
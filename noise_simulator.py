@@ -0,0 +1,285 @@
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+from collections import deque
+
+import numpy as np
+
+import aperture_model
+import etc_engine
+
+# Simulator Monte Carlo untuk memeriksa rumus SNR secara empiris.
+# Setiap frame: piksel bintang + sky + dark sebagai Poisson, ditambah read noise Gaussian,
+# lalu fotometri aperture (piksel pusat-di-dalam, sama seperti aperture_model) dengan
+# pengurangan sky. SNR terukur = rata-rata flux / simpangan baku flux antar frame,
+# dibandingkan dengan rumus jumlah variansi (etc_engine) dan rumus legacy
+# (calculate_snr_and_exposure_logic / calculate_snr, suku noise diakar dua kali).
+# Frame dibuat per chunk (memori tetap kecil) dengan seed turunan SeedSequence per chunk,
+# sehingga hasil sama untuk seed yang sama berapa pun jumlah worker process.
+
+SKY_MODES = ("known", "annulus")  # sky diketahui tepat, atau diestimasi dari annulus
+ANNULUS = (2.0, 3.0)  # radius dalam dan luar annulus sky, kelipatan radius aperture
+MAX_STAMP_RADIUS = 128  # piksel, radius luar aperture/annulus yang disimulasikan
+CHUNK_PIXELS = int(os.environ.get("ETC_SIMULATION_CHUNK_PIXELS", str(4_000_000)))  # piksel per chunk
+DEFAULT_WORKERS = int(os.environ.get("ETC_SIMULATION_WORKERS", str(os.cpu_count() or 1)))
+MAX_FRAMES = int(os.environ.get("ETC_SIMULATION_MAX_FRAMES", str(1_000_000)))  # batas dari API
+SIMULATION_TIMEOUT = float(os.environ.get("ETC_SIMULATION_TIMEOUT", "120"))  # detik, batas dari API
+HISTOGRAM_BINS = 400
+HISTOGRAM_SIGMA = 8.0  # rentang histogram flux, kelipatan sigma prediksi
+PERCENTILES = (5, 50, 95)
+
+_pool = None
+_pool_lock = threading.Lock()  # simulate dipanggil dari beberapa thread compute pool sekaligus
+
+
+def _get_pool(workers):
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._max_workers != workers:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            _shutdown()
+            # spawn: worker tidak mewarisi thread dan lock dari proses server
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def shutdown():
+    with _pool_lock:
+        _shutdown()
+
+
+def prepare(profile, magnitude, sky_brightness, zenith_distance, fwhm, exposure_time,
+            psf="gaussian", aperture_radius=1.5, sky="known", beta=aperture_model.MOFFAT_BETA):
+    """
+    Stamp yang disimulasikan (hanya piksel aperture dan annulus) beserta prediksi SNR rumus.
+    aperture_radius dalam kelipatan FWHM seperti etc_engine.evaluate.
+    """
+    if sky not in SKY_MODES:
+        raise ValueError(f"Mode sky {sky} tidak dikenal, pilih dari {', '.join(SKY_MODES)}")
+    if psf not in aperture_model.PSF_PROFILES:
+        raise ValueError(f"PSF {psf} tidak dikenal, pilih dari {', '.join(aperture_model.PSF_PROFILES)}")
+    if exposure_time <= 0:
+        raise ValueError("exposure_time harus lebih dari 0")
+
+    fwhm_pixels = fwhm / profile.pixel_scale
+    radius = aperture_radius * fwhm_pixels
+    outer = ANNULUS[1] * radius if sky == "annulus" else radius
+    if outer > MAX_STAMP_RADIUS:
+        raise ValueError(f"Aperture/annulus {outer:.1f} piksel melebihi {MAX_STAMP_RADIUS:g} piksel")
+
+    extinction = profile.extinction_coefficient * etc_engine.airmass_from_zenith(zenith_distance)
+    signal_star = float(etc_engine.calculate_signal(
+        magnitude, profile.zeropoint, extinction, profile.aperture_area, profile.quantum_efficiency
+    ))
+    # Sky per piksel dari sky brightness per arcsec²
+    signal_sky = float(etc_engine.calculate_signal(
+        sky_brightness, profile.zeropoint, 0.0, profile.aperture_area, profile.quantum_efficiency
+    )) * profile.pixel_scale ** 2
+
+    # Lattice stamp sendiri jika annulus lebih besar dari lattice tabel aperture
+    lattice_radius = max(float(math.ceil(outer)), aperture_model.TABLE_MAX_RADIUS)
+    _, _, distance2 = aperture_model._lattice(lattice_radius)
+    fluxes = aperture_model._pixel_fluxes(fwhm_pixels, psf, beta, lattice_radius)
+    n_aperture = max(int(np.searchsorted(distance2, radius ** 2, side="right")), 1)
+    # Piksel aperture ada di depan (lattice urut jarak), lalu piksel annulus
+    keep = np.zeros(distance2.size, dtype=bool)
+    keep[:n_aperture] = True
+    in_annulus = None
+    if sky == "annulus":
+        annulus = (distance2 >= (ANNULUS[0] * radius) ** 2) & (distance2 <= outer ** 2)
+        if not annulus.any():
+            raise ValueError("Annulus sky tidak berisi piksel")
+        keep |= annulus
+        in_annulus = annulus[keep]
+
+    background = (signal_sky + profile.dark_current) * exposure_time
+    stamp = {
+        "expected": signal_star * exposure_time * fluxes[keep] + background,
+        "n_aperture": n_aperture,
+        "annulus": in_annulus,
+        "background": background,
+        "read_noise": profile.read_noise,
+    }
+
+    star_in_aperture = signal_star * float(fluxes[:n_aperture].sum())
+    noise_args = (star_in_aperture, signal_sky, profile.read_noise, profile.dark_current, n_aperture, exposure_time)
+    breakdown = etc_engine.calculate_noise(*noise_args)
+    variance = float(breakdown["total_noise"]) ** 2
+    predicted = {
+        "variance_sum": float(breakdown["snr"]),
+        "legacy": float(etc_engine.calculate_snr_legacy(*noise_args)),
+    }
+    if in_annulus is not None:
+        # Error estimasi sky: variansi per piksel x n_aperture² / n_sky
+        n_sky = int(in_annulus.sum())
+        pixel_variance = background + profile.read_noise ** 2
+        variance += pixel_variance * n_aperture ** 2 / n_sky
+        predicted["variance_sum_sky_error"] = float(breakdown["signal"]) / math.sqrt(variance)
+    return stamp, {
+        "expected_flux": float(breakdown["signal"]),
+        "expected_sigma": math.sqrt(variance),
+        "aperture_pixels": n_aperture,
+        "sky_pixels": None if in_annulus is None else int(in_annulus.sum()),
+        "predicted": predicted,
+    }
+
+
+def simulate_chunk(stamp, seed, n_frames, bin_edges):
+    """
+    Satu chunk frame dengan generator dari seed (SeedSequence); hasil berupa statistik ringkas
+    (n, mean, M2, histogram) supaya yang dikirim antar proses tetap kecil
+    """
+    rng = np.random.Generator(np.random.PCG64(seed))
+    pixels = rng.poisson(stamp["expected"], size=(n_frames, stamp["expected"].size)).astype(float)
+    pixels += rng.normal(0.0, stamp["read_noise"], size=pixels.shape)
+
+    n_aperture = stamp["n_aperture"]
+    if stamp["annulus"] is None:
+        sky_level = stamp["background"]
+    else:
+        sky_level = pixels[:, stamp["annulus"]].mean(axis=1)
+    flux = pixels[:, :n_aperture].sum(axis=1) - n_aperture * sky_level
+
+    mean = float(flux.mean())
+    m2 = float(((flux - mean) ** 2).sum())
+    histogram = np.histogram(flux, bins=bin_edges)[0]
+    return n_frames, mean, m2, histogram
+
+
+def _combine(total, part):
+    # Gabungan mean/M2 dua kelompok (Chan et al.), urutan chunk tetap supaya hasil reproducible
+    n_a, mean_a, m2_a = total
+    n_b, mean_b, m2_b = part
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    return n, mean_a + delta * n_b / n, m2_a + m2_b + delta ** 2 * n_a * n_b / n
+
+
+def _chunk_sizes(n_frames, chunk_frames):
+    full, rest = divmod(n_frames, chunk_frames)
+    return [chunk_frames] * full + ([rest] if rest else [])
+
+
+def _percentiles(histogram, bin_edges):
+    cumulative = np.cumsum(histogram) / max(histogram.sum(), 1)
+    centers = (bin_edges[:-1] + bin_edges[1:]) / 2
+    return {str(p): float(np.interp(p / 100, cumulative, centers)) for p in PERCENTILES}
+
+
+def simulate(profile, magnitude, sky_brightness, zenith_distance, fwhm, exposure_time, n_frames=10000, seed=0,
+             psf="gaussian", aperture_radius=1.5, sky="known", workers=DEFAULT_WORKERS, chunk_frames=None):
+    """
+    Simulasi n_frames frame, dibagi per chunk (default sesuai CHUNK_PIXELS) dan dijalankan di
+    process pool (workers=0: di proses ini). Chunk yang sedang dikerjakan dibatasi 2 x workers.
+    """
+    if n_frames < 2:
+        raise ValueError("n_frames minimal 2")
+    stamp, info = prepare(profile, magnitude, sky_brightness, zenith_distance, fwhm, exposure_time,
+                          psf, aperture_radius, sky)
+    chunk_frames = chunk_frames or max(1, CHUNK_PIXELS // stamp["expected"].size)
+    sizes = _chunk_sizes(n_frames, chunk_frames)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    span = HISTOGRAM_SIGMA * info["expected_sigma"]
+    bin_edges = np.linspace(info["expected_flux"] - span, info["expected_flux"] + span, HISTOGRAM_BINS + 1)
+
+    total = (0, 0.0, 0.0)
+    histogram = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+    chunk_snr = []
+
+    def collect(result):
+        nonlocal total, histogram
+        n, mean, m2, counts = result
+        total = _combine(total, (n, mean, m2))
+        histogram += counts
+        if n > 1 and m2 > 0:
+            chunk_snr.append(mean / math.sqrt(m2 / (n - 1)))
+
+    if workers <= 0 or len(sizes) == 1:
+        for size, child in zip(sizes, seeds):
+            collect(simulate_chunk(stamp, child, size, bin_edges))
+    else:
+        pool = _get_pool(workers)
+        pending = deque()
+        for size, child in zip(sizes, seeds):
+            if len(pending) >= 2 * workers:
+                collect(pending.popleft().result())
+            pending.append(pool.submit(simulate_chunk, stamp, child, size, bin_edges))
+        while pending:
+            collect(pending.popleft().result())
+
+    n, mean, m2 = total
+    std = math.sqrt(m2 / (n - 1))
+    snr = mean / std if std > 0 else math.inf
+    measured = {
+        "mean_flux": mean,
+        "std_flux": std,
+        "snr": snr,
+        # Standard error SNR = mean/std (delta method, noise mendekati Gaussian)
+        "snr_error": snr * math.sqrt(1 / (2 * (n - 1)) + 1 / (n * snr ** 2)) if std > 0 else 0.0,
+        "flux_percentiles": _percentiles(histogram, bin_edges),
+    }
+    if len(chunk_snr) > 1:
+        measured["chunk_snr_percentiles"] = {
+            str(p): float(value) for p, value in zip(PERCENTILES, np.percentile(chunk_snr, PERCENTILES))
+        }
+    info["measured"] = measured
+    info["deviation"] = {name: snr / value - 1 for name, value in info["predicted"].items()}
+    return {
+        "frames": n, "chunks": len(sizes), "seed": seed, "sky": sky, "psf": psf,
+        "exposure_time": exposure_time, **info,
+    }
+
+
+def main(argv=None):
+    import instrument_profiles
+
+    parser = argparse.ArgumentParser(description="Simulasi Monte Carlo noise fotometri")
+    parser.add_argument("--config", default="instruments.json")
+    parser.add_argument("--calibration", default="calibration.json", help="hasil Perhitungan_Zeropoint.py (dilewati jika tidak ada)")
+    parser.add_argument("--telescope", required=True)
+    parser.add_argument("--ccd", required=True)
+    parser.add_argument("--filter", default="V")
+    parser.add_argument("--magnitude", type=float, required=True)
+    parser.add_argument("--sky-brightness", type=float, default=20.0)
+    parser.add_argument("--zenith-distance", type=float, default=30.0)
+    parser.add_argument("--fwhm", type=float, default=2.0, help="arcsec")
+    parser.add_argument("--exposure-time", type=float, required=True)
+    parser.add_argument("--frames", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--psf", default="gaussian", choices=aperture_model.PSF_PROFILES)
+    parser.add_argument("--aperture-radius", type=float, default=1.5, help="kelipatan FWHM")
+    parser.add_argument("--sky", default="known", choices=SKY_MODES)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    args = parser.parse_args(argv)
+
+    profiles = instrument_profiles.ProfileRegistry(args.config, calibration_path=args.calibration).profiles()
+    try:
+        profile = profiles[(args.telescope, args.ccd, args.filter)]
+    except KeyError:
+        parser.error(f"Kombinasi {args.telescope}, {args.ccd}, {args.filter} tidak ada")
+    try:
+        result = simulate(
+            profile, args.magnitude, args.sky_brightness, args.zenith_distance, args.fwhm, args.exposure_time,
+            n_frames=args.frames, seed=args.seed, psf=args.psf, aperture_radius=args.aperture_radius,
+            sky=args.sky, workers=args.workers,
+        )
+    finally:
+        shutdown()
+    json.dump(result, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@ import numpy as np
 import math
 import matplotlib.pyplot as plt
 
+import etc_solver
+
 # Ambil data dari main2_24_march.py
 telescope_data = {
     "aperture": 0.28,  # Celestron C11
@@ -28,7 +30,7 @@ def calculate_snr(magnitude, exposure_time):
     extinction = k * (1 / math.cos(math.radians(zenith_distance)))
     
     # Hitung flux bintang
-    flux_star = 10 ** (-0.4 * (magnitude - zeropoint))
+    flux_star = 10 ** (-0.4 * (np.asarray(magnitude, dtype=float) - zeropoint))
     aperture_area = math.pi * (telescope_data["aperture"] / 2) ** 2
     signal_star = flux_star * aperture_area * ccd_data["quantum_efficiency"]
     
@@ -39,25 +41,18 @@ def calculate_snr(magnitude, exposure_time):
     # Hitung noise components
     num_pixels = math.pi * (1.5 * fwhm) ** 2
     
-    noise_sky = math.sqrt(signal_sky * num_pixels * exposure_time)
-    noise_read = math.sqrt(num_pixels) * ccd_data["read_noise"]
-    noise_dark = math.sqrt(num_pixels * ccd_data["dark_current"] * exposure_time)
-    total_noise = math.sqrt((signal_star * exposure_time) + noise_sky + noise_read + noise_dark)
+    noise_sky = np.sqrt(signal_sky * num_pixels * exposure_time)
+    noise_read = np.sqrt(num_pixels) * ccd_data["read_noise"]
+    noise_dark = np.sqrt(num_pixels * ccd_data["dark_current"] * exposure_time)
+    total_noise = np.sqrt((signal_star * exposure_time) + noise_sky + noise_read + noise_dark)
     
     return (signal_star * exposure_time) / total_noise
 
 # Plot 1: SNR tetap = 200, magnitude vs exposure time
 magnitude_range = np.array([8, 9, 10, 11, 12, 13, 14, 15, 16])
-exposure_times_calculated = []
-
-for mag in magnitude_range:
-    exp_time = 1.0
-    while True:
-        snr = calculate_snr(mag, exp_time)
-        if snr >= 200 or exp_time > 3600:
-            exposure_times_calculated.append(exp_time)
-            break
-        exp_time += 1.0
+# Semua magnitude diselesaikan sekaligus oleh solver (maks. 3600 detik)
+solution = etc_solver.solve_for_snr(lambda t: calculate_snr(magnitude_range, t), 200)
+exposure_times_calculated = solution["exposure_time"].tolist()
 
 # Plot 2: Magnitude tetap = 11.5, exposure time vs SNR
 exposure_range = np.array([1, 5, 10, 30, 60, 120, 180, 240, 300])
@@ -0,0 +1,341 @@
+import argparse
+import glob
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from functools import partial
+
+import numpy as np
+
+from fits_photometry import header_value, open_image
+
+logger = logging.getLogger(__name__)
+
+# Estimasi sky background langsung dari frame FITS besar dengan memori konstan: data dibuka
+# dengan memmap lalu dibaca per pita TILE baris (satu pita dikonversi ke float sekaligus),
+# setiap tile TILE x TILE di-sigma-clip dan diringkas menjadi median, mode (3 median - 2 mean,
+# seperti MSKY apphot salgorithm=mode) dan standar deviasi (STDEV). Sky frame = median dari sky
+# semua tile, sehingga bintang terang/gradien di satu tile tidak menggeser hasil.
+# Sky dalam ADU/piksel dikonversi ke mag/arcsec² dengan zeropoint dan pixel scale profil
+# (kebalikan dari calculate_signal tanpa ekstingsi) lalu disimpan di riwayat per (site, filter)
+# yang dipakai kalkulator sebagai default sky_brightness.
+
+TILE = 512  # piksel per sisi tile
+SKY_CLIP = 3.0
+SKY_ITERATIONS = 5
+MIN_TILE_PIXELS = 100  # tile dengan piksel valid lebih sedikit diabaikan
+STATISTICS = ("mode", "median")
+DEFAULT_SITE = os.environ.get("ETC_SITE", "default")
+DEFAULT_HISTORY = os.environ.get("ETC_SKY_HISTORY", "sky_history.jsonl")
+HISTORY_WINDOW = 20  # jumlah pengukuran terakhir per (site, filter) untuk default
+FRAME_CHUNK = 8  # frame per task process pool
+
+
+def clipped_statistics(values, clip=SKY_CLIP, iterations=SKY_ITERATIONS):
+    """
+    Median, mean, mode dan standar deviasi setelah sigma clipping di sekitar median
+    (values 1 dimensi, nilai tidak finite dibuang)
+    """
+    # Satu sort per tile: setiap iterasi clipping hanya mempersempit rentang [lo, hi) lewat
+    # searchsorted, mean/std dari prefix sum (digeser ke median awal agar presisi terjaga)
+    values = np.sort(values)
+    values = values[np.searchsorted(values, -np.inf, "right"):np.searchsorted(values, np.inf, "left")]
+    empty = {"median": math.nan, "mean": math.nan, "mode": math.nan, "std": math.nan, "count": int(values.size)}
+    if values.size < MIN_TILE_PIXELS:
+        return empty
+    shift = values[values.size // 2]
+    centered = values - shift
+    prefix = np.concatenate(([0.0], np.cumsum(centered)))
+    prefix2 = np.concatenate(([0.0], np.cumsum(centered * centered)))
+
+    def summary(lo, hi):
+        count = hi - lo
+        median = (values[lo + (count - 1) // 2] + values[lo + count // 2]) / 2
+        mean = (prefix[hi] - prefix[lo]) / count
+        std = math.sqrt(max((prefix2[hi] - prefix2[lo]) / count - mean * mean, 0.0))
+        return float(median), float(mean + shift), std
+
+    lo, hi = 0, values.size
+    for _ in range(iterations):
+        median, mean, std = summary(lo, hi)
+        new_lo = int(np.searchsorted(values, median - clip * std, "left"))
+        new_hi = int(np.searchsorted(values, median + clip * std, "right"))
+        if (new_lo, new_hi) == (lo, hi) or new_hi - new_lo < MIN_TILE_PIXELS:
+            break
+        lo, hi = new_lo, new_hi
+    median, mean, std = summary(lo, hi)
+    # Estimator mode apphot; untuk distribusi simetris sama dengan median
+    mode = 3 * median - 2 * mean if mean > median else median
+    return {"median": median, "mean": mean, "mode": mode, "std": std, "count": hi - lo}
+
+
+def tile_statistics(data, scale, tile=TILE, bias=0.0, clip=SKY_CLIP, iterations=SKY_ITERATIONS):
+    """
+    Peta statistik per tile (array [baris tile, kolom tile]) dari image memmap.
+    Memori maksimum satu pita tile x lebar frame dalam float64.
+    """
+    rows, columns = data.shape
+    grid = (math.ceil(rows / tile), math.ceil(columns / tile))
+    maps = {name: np.full(grid, np.nan) for name in ("median", "mode", "std")}
+    maps["count"] = np.zeros(grid, dtype=np.int64)
+    bscale, bzero = scale
+    for i, top in enumerate(range(0, rows, tile)):
+        band = data[top:top + tile].astype(np.float64) * bscale + (bzero - bias)
+        for j, left in enumerate(range(0, columns, tile)):
+            stats = clipped_statistics(band[:, left:left + tile].ravel(), clip, iterations)
+            for name in maps:
+                maps[name][i, j] = stats[name]
+        del band
+    return maps
+
+
+def measure_frame(path, tile=TILE, bias=0.0, statistic="mode", exposure_time=None, gain=None):
+    """
+    Sky satu frame dalam ADU/piksel (median dari sky per tile) beserta peta tile dan keyword header
+    """
+    if statistic not in STATISTICS:
+        raise ValueError(f"statistic harus salah satu dari {', '.join(STATISTICS)}")
+    header, data, scale = open_image(path)
+    maps = tile_statistics(data, scale, tile=tile, bias=bias)
+    del data  # tutup memmap
+    valid = np.isfinite(maps[statistic])
+    if not valid.any():
+        raise ValueError(f"{path}: tidak ada tile dengan piksel sky yang cukup")
+    tiles = maps[statistic][valid]
+    return {
+        "image": os.path.basename(path),
+        "filter": header_value(header, "filter"),
+        "site": header_value(header, "site"),
+        "date": header_value(header, "date"),
+        "exposure_time": float(exposure_time or header_value(header, "exposure_time", 1.0)),
+        "gain": float(gain) if gain else header_value(header, "gain"),
+        "sky": float(np.median(tiles)),
+        "sky_std": float(np.median(maps["std"][valid])),
+        # Rentang sky antar tile: indikasi gradien (bulan, twilight) atau flat yang buruk
+        "sky_range": float(tiles.max() - tiles.min()),
+        "tiles": int(valid.sum()),
+        "tile_map": maps[statistic].tolist(),
+    }
+
+
+def _measure_chunk(paths, **options):
+    return [measure_frame(path, **options) for path in paths]
+
+
+def measure_frames(paths, workers=None, chunk_frames=FRAME_CHUNK, **options):
+    """
+    Sky banyak frame (satu malam) di process pool, chunk_frames frame per task, hasil berurutan sesuai paths
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+
+    workers = workers or os.cpu_count() or 1
+    chunks = [paths[i:i + chunk_frames] for i in range(0, len(paths), chunk_frames)]
+    if workers == 1 or len(chunks) == 1:
+        for chunk in chunks:
+            yield from _measure_chunk(chunk, **options)
+        return
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        for frames in pool.map(partial(_measure_chunk, **options), chunks):
+            yield from frames
+
+
+def sky_magnitude(sky, profile, exposure_time, gain=None):
+    """
+    Sky ADU/piksel -> mag/arcsec² dengan zeropoint, pixel scale, luas aperture dan QE profil
+    (kebalikan calculate_signal tanpa ekstingsi: sky brightness diukur di tempat, bukan di atas atmosfer)
+    """
+    gain = gain or profile.gain
+    electrons = np.asarray(sky, dtype=float) * gain / exposure_time / profile.pixel_scale ** 2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return profile.zeropoint - 2.5 * np.log10(
+            electrons / (profile.aperture_area * profile.quantum_efficiency)
+        )
+
+
+def frame_record(frame, profile, site=None):
+    """
+    Baris riwayat sky dari hasil measure_frame (sky dalam mag/arcsec² untuk profil frame tersebut)
+    """
+    gain = frame["gain"] or profile.gain
+    magnitude = float(sky_magnitude(frame["sky"], profile, frame["exposure_time"], gain))
+    # STDEV per piksel relatif terhadap sky, dalam magnitude (dm = 1.0857 * dF / F)
+    error = 2.5 / math.log(10) * frame["sky_std"] / frame["sky"] if frame["sky"] > 0 else math.nan
+    return {
+        "site": site or frame["site"] or DEFAULT_SITE,
+        "filter": profile.filter,
+        "telescope": profile.telescope,
+        "ccd": profile.ccd,
+        "image": frame["image"],
+        "date": frame["date"],
+        "exposure_time": frame["exposure_time"],
+        "sky_adu": frame["sky"],
+        "sky_std_adu": frame["sky_std"],
+        "sky_brightness": round(magnitude, 3) if math.isfinite(magnitude) else None,
+        "sky_scatter": round(error, 3) if math.isfinite(error) else None,
+        "measured_at": time.time(),
+    }
+
+
+class SkyHistory:
+    """
+    Riwayat sky brightness per (site, filter) dalam file JSON lines (append-only).
+    Default per filter = median HISTORY_WINDOW pengukuran terakhir. File dibaca ulang jika
+    berubah (dicek paling sering sekali per check_interval detik), jadi hasil CLI langsung terpakai.
+    """
+
+    def __init__(self, path, window=HISTORY_WINDOW, check_interval=1.0):
+        self.path = path
+        self.window = window
+        self.check_interval = check_interval
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._records = {}
+        self._stamp = None
+        self._checked = 0.0
+        self._reload()
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _reload(self):
+        # Hanya baris lengkap (diakhiri newline) yang dibaca: CLI bisa sedang menambah baris.
+        # Baris rusak dilewati; jika file gagal dibaca riwayat lama tetap dipakai.
+        records = {}
+        skipped = 0
+        stamp = self._file_stamp()
+        if stamp is not None:
+            try:
+                with open(self.path, "rb") as f:
+                    data = f.read()
+            except OSError:
+                logger.exception("Gagal membaca riwayat sky %s, riwayat lama tetap dipakai", self.path)
+                return
+            for line in data[:data.rfind(b"\n") + 1].splitlines():
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    key = (record["site"], record["filter"])
+                    if record.get("sky_brightness") is None:
+                        continue
+                    float(record["sky_brightness"])
+                except (ValueError, KeyError, TypeError):
+                    skipped += 1
+                    continue
+                records.setdefault(key, []).append(record)
+        if skipped:
+            logger.warning("%d baris riwayat sky tidak valid di %s dilewati", skipped, self.path)
+        self._records, self._stamp = records, stamp
+        self.generation += 1
+
+    def check(self):
+        """
+        Muat ulang jika file berubah; mengembalikan generation saat ini
+        """
+        now = time.monotonic()
+        if now - self._checked >= self.check_interval:
+            with self._lock:
+                self._checked = now
+                if self._file_stamp() != self._stamp:
+                    self._reload()
+        return self.generation
+
+    def add(self, records):
+        """
+        Tambahkan baris riwayat (frame_record) ke file dan ke memori
+        """
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+            self._reload()
+
+    def records(self, site, filter_name, limit=None):
+        self.check()
+        records = self._records.get((site, filter_name), [])
+        return records[-limit:] if limit else list(records)
+
+    def default(self, site, filter_name):
+        """
+        Sky brightness default (mag/arcsec²) untuk site dan filter, None jika belum ada pengukuran
+        """
+        recent = self.records(site, filter_name, self.window)
+        if not recent:
+            return None
+        return round(float(np.median([r["sky_brightness"] for r in recent])), 2)
+
+    def defaults(self, site):
+        """
+        Default sky brightness per filter untuk satu site
+        """
+        self.check()
+        filters = sorted({filter_name for (name, filter_name) in self._records if name == site})
+        return {filter_name: self.default(site, filter_name) for filter_name in filters}
+
+
+def main(argv=None):
+    import instrument_profiles
+
+    parser = argparse.ArgumentParser(description="Estimasi sky background frame FITS dan riwayat sky brightness")
+    parser.add_argument("frames", nargs="+", help="file FITS atau direktori")
+    parser.add_argument("--telescope", required=True)
+    parser.add_argument("--ccd", required=True)
+    parser.add_argument("--filter", help="default keyword FILTER di header")
+    parser.add_argument("--site", help="default keyword SITE/OBSERVAT di header, lalu ETC_SITE")
+    parser.add_argument("--config", default="instruments.json")
+    parser.add_argument("--calibration", default="calibration.json", help="hasil Perhitungan_Zeropoint.py (dilewati jika tidak ada)")
+    parser.add_argument("--tile", type=int, default=TILE)
+    parser.add_argument("--bias", type=float, default=0.0, help="level bias (ADU) jika frame belum dikoreksi")
+    parser.add_argument("--statistic", choices=STATISTICS, default="mode")
+    parser.add_argument("--exposure-time", type=float)
+    parser.add_argument("--gain", type=float)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--chunk-frames", type=int, default=FRAME_CHUNK)
+    parser.add_argument("--history", help=f"file riwayat JSON lines untuk ditambah (server memakai {DEFAULT_HISTORY})")
+    args = parser.parse_args(argv)
+
+    paths = []
+    for item in args.frames:
+        if os.path.isdir(item):
+            paths.extend(sorted(p for ext in ("*.fit", "*.fits", "*.fts") for p in glob.glob(os.path.join(item, ext))))
+        else:
+            paths.append(item)
+    if not paths:
+        parser.error("Tidak ada frame FITS")
+
+    profiles = instrument_profiles.ProfileRegistry(args.config, calibration_path=args.calibration).profiles()
+    frames = measure_frames(
+        paths, workers=args.workers, chunk_frames=args.chunk_frames, tile=args.tile, bias=args.bias,
+        statistic=args.statistic, exposure_time=args.exposure_time, gain=args.gain,
+    )
+    records = []
+    for frame in frames:
+        filter_name = args.filter or frame["filter"]
+        profile = profiles.get((args.telescope, args.ccd, filter_name))
+        if profile is None:
+            parser.error(f"Kombinasi {args.telescope}, {args.ccd}, {filter_name} tidak ada ({frame['image']})")
+        record = frame_record(frame, profile, args.site)
+        records.append(record)
+        print(
+            f"{record['image']}\t{record['filter']}\t{record['sky_adu']:.2f} ADU\t"
+            f"{record['sky_brightness']} ± {record['sky_scatter']} mag/arcsec²\t({frame['tiles']} tile)"
+        )
+    if args.history:
+        history = SkyHistory(args.history)
+        history.add(records)
+        for site in sorted({record["site"] for record in records}):
+            json.dump({"site": site, "defaults": history.defaults(site)}, sys.stdout)
+            sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import json
+import os
+import tempfile
+
+os.environ.setdefault("ETC_STORE", os.path.join(tempfile.mkdtemp(), "etc_store.sqlite3"))
+os.environ.setdefault("ETC_SKY_HISTORY", os.path.join(tempfile.mkdtemp(), "sky_history.jsonl"))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import etc_store
+import main2_24_march
+
+client = TestClient(main2_24_march.app)
+PLAN = {"telescope": "GSO", "ccd": "ZWO ASI 178MM", "date": "2026-05-01"}
+
+
+def target(target_id):
+    return {"id": target_id, "ra": "10:00:00", "dec": "-10:00:00", "magnitude": 14, "filter": "V"}
+
+
+@pytest.mark.parametrize("ids, detail", [
+    ([[1], "b"], "id harus berupa string atau angka"),
+    ([True, "b"], "id harus berupa string atau angka"),
+    (["a", "a"], "id 'a' duplikat"),
+])
+def test_plan_rejects_invalid_ids(ids, detail):
+    response = client.post("/api/v1/plan", json={**PLAN, "targets": [target(i) for i in ids]})
+    assert response.status_code == 400 and detail in response.json()["detail"]
+
+
+def test_plan_keeps_targets_by_id():
+    response = client.post("/api/v1/plan", json={**PLAN, "targets": [target("a"), target(7)]})
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("path", ["/api/v1/plan", "/api/v1/optimal_aperture", "/api/v1/stack"])
+def test_unknown_combination_message(path):
+    response = client.post(path, json={**PLAN, "ccd": "nope", "targets": [target("a")]})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Kombinasi GSO dan nope tidak valid."
+
+
+def test_metrics_one_header_per_family():
+    client.post("/calculate_exposure", data={
+        "telescope": "GSO", "ccd": "ZWO ASI 178MM", "snr": 100, "magnitude": 15, "filter": "V",
+        "sky_brightness": 20.5, "zenith_distance": 30, "fwhm": 2,
+    })
+    lines = client.get("/metrics").text.splitlines()
+    types = [line.split()[2] for line in lines if line.startswith("# TYPE")]
+    assert len(types) == len(set(types))
+    # Sampel satu family berurutan langsung setelah header-nya
+    seen = []
+    for line in lines:
+        if line.startswith("# TYPE"):
+            seen.append(line.split()[2])
+        elif line and not line.startswith("#"):
+            name = line.split("{")[0].split()[0]
+            assert any(name == family or name.startswith(family + "_") for family in seen[-1:]), line
+
+
+def test_batch_without_target_id_is_stored():
+    store = main2_24_march.store
+    before = store.stats()
+    body = "\n".join(json.dumps({
+        "id": target_id, "magnitude": 14, "filter": "V", "sky_brightness": 20.5, "zenith_distance": 20, "fwhm": 2,
+        "snr": 50,
+    }) for target_id in (None, "batch-a"))
+    response = client.post(
+        "/api/v1/batch", params={"telescope": "GSO", "ccd": "ZWO ASI 178MM"}, content=body,
+        headers={"content-type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    assert [json.loads(line).get("error") for line in response.text.splitlines()] == [None, None]
+    assert store.flush(10)
+    after = store.stats()
+    assert after["written"] - before["written"] == 2 and after["failed"] == before["failed"]
+
+
+def test_store_writer_survives_bad_batch(tmp_path):
+    store = etc_store.Store(str(tmp_path / "store.sqlite3"), name="test")
+    profile = main2_24_march.profiles.get("GSO", "ZWO ASI 178MM", "V")
+    row = {"magnitude": 14, "sky_brightness": 20.5, "airmass": 1.1, "fwhm": 2, "snr": 50, "exposure_time": 10}
+    store.record(profile, [{**row, "target": {"name": "x", "magnitude": "bukan angka"}}], "test")
+    assert store.flush(10)
+    store.record(profile, [row, row], "test")
+    assert store.flush(10)
+    assert store.stats() == {"written": 2, "dropped": 0, "failed": 1, "queued": 0}
+    # Batas antrean dihitung dalam baris
+    store.record(profile, [row] * (etc_store.QUEUE_SIZE + 1), "test")
+    assert store.stats()["dropped"] == etc_store.QUEUE_SIZE + 1
@@ -0,0 +1,88 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+import calibration
+import etc_engine
+import instrument_profiles
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG = os.path.join(ROOT, "instruments.json")
+
+
+def synthetic_measurements(profile, zeropoint, extinction, airmass, n_stars=20, seed=0):
+    # Flux ADU yang persis mengikuti model calibration untuk ZP dan k tertentu
+    rng = np.random.default_rng(seed)
+    airmass = np.repeat(np.asarray(airmass, dtype=float), n_stars)
+    catalog_mag = rng.uniform(10.0, 14.0, len(airmass))
+    exposure_time = np.full(len(airmass), 30.0)
+    electrons = etc_engine.calculate_signal(
+        catalog_mag, zeropoint, extinction * airmass, profile.aperture_area, profile.quantum_efficiency
+    ) * exposure_time
+    return {
+        "telescope": np.full(len(airmass), profile.telescope),
+        "ccd": np.full(len(airmass), profile.ccd),
+        "filter": np.full(len(airmass), profile.filter),
+        "catalog_mag": catalog_mag,
+        "flux": electrons / profile.gain,
+        "exposure_time": exposure_time,
+        "airmass": airmass,
+    }
+
+
+def test_config_gains_per_ccd():
+    profiles = instrument_profiles.compile_profiles(instrument_profiles.load_config(CONFIG))
+    gains = {ccd: profiles[("GSO", ccd, "V")].gain for ccd in ("ZWO ASI 178MM", "ZWO ASI 2600 MM Pro", "QHY 174 GPS")}
+    assert gains == {"ZWO ASI 178MM": 1.5, "ZWO ASI 2600 MM Pro": 1.0, "QHY 174 GPS": 2.0}
+
+
+def test_fit_recovers_zeropoint_and_extinction():
+    profiles = instrument_profiles.compile_profiles(instrument_profiles.load_config(CONFIG))
+    profile = profiles[("GSO", "QHY 174 GPS", "V")]
+    measurements = synthetic_measurements(profile, 21.3, 0.18, [1.0, 1.3, 1.7, 2.2])
+    measurements["flux"][5] *= 10  # outlier 2.5 mag, dibuang sigma clipping
+    # Noise terbatas (< 2 sigma) supaya hanya outlier yang terbuang
+    measurements["flux"] *= 1 + 1e-3 * np.random.default_rng(1).uniform(-1, 1, len(measurements["flux"]))
+
+    (result,) = calibration.calibrate(measurements, profiles)
+    assert result["zeropoint"] == pytest.approx(21.3, abs=0.01)
+    assert result["extinction"] == pytest.approx(0.18, abs=0.01)
+    assert not result["fixed_extinction"]
+    assert result["n_total"] == 80 and result["n_used"] == 79
+
+
+def test_fit_single_airmass_uses_config_extinction():
+    profiles = instrument_profiles.compile_profiles(instrument_profiles.load_config(CONFIG))
+    profile = profiles[("GSO", "ZWO ASI 178MM", "B")]
+    measurements = synthetic_measurements(profile, 20.0, profile.extinction_coefficient, [1.4])
+    (result,) = calibration.calibrate(measurements, profiles)
+    assert result["fixed_extinction"]
+    assert result["extinction"] == pytest.approx(profile.extinction_coefficient)
+    assert result["zeropoint"] == pytest.approx(20.0, abs=1e-3)
+
+
+def test_fit_unknown_combination():
+    profiles = instrument_profiles.compile_profiles(instrument_profiles.load_config(CONFIG))
+    measurements = synthetic_measurements(profiles[("GSO", "ZWO ASI 178MM", "V")], 20.0, 0.2, [1.0, 2.0])
+    measurements["ccd"][:] = "nope"
+    with pytest.raises(KeyError):
+        calibration.calibrate(measurements, profiles)
+
+
+def test_calibration_file_overrides_registry(tmp_path):
+    path = str(tmp_path / "calibration.json")
+    results = [{"telescope": "GSO", "ccd": "ZWO ASI 178MM", "filter": "V", "zeropoint": 21.0, "extinction": 0.25}]
+    assert calibration.write_calibration(results, path)["version"] == 1
+    assert calibration.write_calibration(results, path)["version"] == 2
+    with open(tmp_path / "calibration.v1.json", encoding="utf-8") as f:
+        assert json.load(f)["version"] == 1
+
+    registry = instrument_profiles.ProfileRegistry(CONFIG, calibration_path=path)
+    profile = registry.get("GSO", "ZWO ASI 178MM", "V")
+    assert (profile.zeropoint, profile.extinction_coefficient) == (21.0, 0.25)
+    assert registry.calibration_version == 2
+    # Zeropoint kalibrasi (airmass 0) digeser ke airmass acuan 1 untuk app LCO
+    shifted = instrument_profiles.ProfileRegistry(CONFIG, calibration_path=path, reference_airmass=1.0)
+    assert shifted.get("GSO", "ZWO ASI 178MM", "V").zeropoint == pytest.approx(21.0 - 0.25)
@@ -0,0 +1,87 @@
+import csv
+import json
+import os
+
+import pytest
+
+import etc_cli
+import instrument_profiles
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG = os.path.join(ROOT, "instruments.json")
+
+
+class Interrupted(Exception):
+    pass
+
+
+def write_catalog(path, n_rows=10):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "magnitude", "filter", "sky_brightness", "zenith_distance", "fwhm", "snr", "exposure_time"])
+        for i in range(n_rows):
+            # Baris ke-4 filter tidak dikenal: jadi baris error, bukan menghentikan chunk
+            filter_name = "Q" if i == 4 else "BVR"[i % 3]
+            writer.writerow([i, 12 + 0.5 * i, filter_name, 20.5, 10 + 3 * i, 2.0, "" if i % 2 else 50, 60 if i % 2 else ""])
+
+
+def read_output(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def test_resume_after_interruption(tmp_path):
+    profiles = instrument_profiles.ProfileRegistry(CONFIG).for_combination("GSO", "ZWO ASI 178MM")
+    catalog = str(tmp_path / "catalog.csv")
+    write_catalog(catalog)
+    reference = str(tmp_path / "reference.csv")
+    summary = etc_cli.run(catalog, reference, profiles, chunk_size=3, workers=1)
+    assert summary == {"chunks": 4, "rows": 10, "errors": 1}
+
+    output = str(tmp_path / "output.csv")
+
+    def stop_after_two(info):
+        if info["chunks"] == 2:
+            raise Interrupted
+
+    with pytest.raises(Interrupted):
+        etc_cli.run(catalog, output, profiles, chunk_size=3, workers=1, progress=stop_after_two)
+    with open(output + etc_cli.CHECKPOINT_SUFFIX, encoding="utf-8") as f:
+        assert json.load(f)["chunks"] == 2
+    # Sisa tulisan setengah jadi setelah checkpoint dipotong saat resume
+    with open(output, "ab") as f:
+        f.write(b"9,partial")
+
+    summary = etc_cli.run(catalog, output, profiles, chunk_size=3, workers=1, resume=True)
+    assert summary == {"chunks": 4, "rows": 10, "errors": 1}
+    with open(output, "rb") as f, open(reference, "rb") as g:
+        assert f.read() == g.read()
+    rows = read_output(output)
+    assert [row["id"] for row in rows] == [str(i) for i in range(10)]
+    assert rows[4]["error"] and not rows[3]["error"]
+
+    with pytest.raises(ValueError, match="chunk_size"):
+        etc_cli.run(catalog, output, profiles, chunk_size=4, workers=1, resume=True)
+
+
+def test_main_applies_calibration(tmp_path, capsys):
+    catalog = str(tmp_path / "catalog.csv")
+    write_catalog(catalog, n_rows=3)
+    calibration_path = str(tmp_path / "calibration.json")
+    with open(calibration_path, "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "zeropoint_airmass": 0.0, "results": [
+            {"telescope": "GSO", "ccd": "ZWO ASI 178MM", "filter": "B", "zeropoint": 20.0, "extinction": 0.3},
+        ]}, f)
+
+    exposure = {}
+    for name in ("missing.json", calibration_path):
+        output = str(tmp_path / "output.csv")
+        etc_cli.main([
+            catalog, output, "--telescope", "GSO", "--ccd", "ZWO ASI 178MM", "--config", CONFIG,
+            "--calibration", name, "--workers", "1", "--quiet",
+        ])
+        exposure[name] = [float(row["exposure_time"]) for row in read_output(output)]
+    assert json.loads(capsys.readouterr().out.splitlines()[-1]) == {"chunks": 1, "rows": 3, "errors": 0}
+    # Hanya filter B yang dikalibrasi (zeropoint lebih kecil: exposure lebih lama)
+    assert exposure[calibration_path][0] > exposure["missing.json"][0]
+    assert exposure[calibration_path][1:] == exposure["missing.json"][1:]
@@ -0,0 +1,111 @@
+import math
+import os
+import tempfile
+
+os.environ.setdefault("ETC_STORE", os.path.join(tempfile.mkdtemp(), "etc_store.sqlite3"))
+os.environ.setdefault("ETC_SKY_HISTORY", os.path.join(tempfile.mkdtemp(), "sky_history.jsonl"))
+
+import numpy as np
+import pytest
+
+import etc_engine
+import etc_solver
+import main2_24_march
+
+PROFILES = main2_24_march.profiles
+CASES = [
+    # (ccd, filter, snr, magnitude, sky_brightness, zenith_distance, fwhm)
+    ("ZWO ASI 178MM", "V", 100.0, 15.0, 20.5, 30.0, 2.0),
+    ("ZWO ASI 2600 MM Pro", "B", 10.0, 18.0, 21.0, 0.0, 3.5),
+    ("QHY 174 GPS", "R", 50.0, 12.0, 19.0, 60.0, 1.2),
+]
+
+
+def old_exposure_loop(signal_star, signal_sky, read_noise, dark_current, num_pixels, snr_target):
+    # Loop 1 detik sebelum etc_solver (calculate_exposure_time lama)
+    exposure_time = 1.0
+    while True:
+        signal = signal_star * exposure_time
+        total_noise = math.sqrt(
+            signal + signal_sky * num_pixels * exposure_time + dark_current * num_pixels * exposure_time
+            + read_noise * read_noise * num_pixels
+        )
+        if signal / total_noise >= snr_target:
+            return exposure_time
+        exposure_time += 1.0
+        if exposure_time > 3600:
+            raise ValueError("Exposure time terlalu lama")
+
+
+def old_legacy_loop(signal_star, signal_sky, read_noise, dark_current, num_pixels, snr_target):
+    # Loop 1 detik sebelum etc_solver (calculate_snr_and_exposure_logic lama)
+    exposure_time = 1.0
+    while True:
+        noise_sky = math.sqrt(signal_sky * num_pixels * exposure_time)
+        noise_read = math.sqrt(num_pixels) * read_noise
+        noise_dark = math.sqrt(num_pixels * dark_current * exposure_time)
+        snr = (signal_star * exposure_time) / math.sqrt((signal_star * exposure_time) + noise_sky + noise_read + noise_dark)
+        if snr >= snr_target or exposure_time > 3600:
+            return snr, exposure_time
+        exposure_time += 1.0
+
+
+@pytest.mark.parametrize("ccd, filter_name, snr, magnitude, sky_brightness, zenith_distance, fwhm", CASES)
+def test_engine_matches_exposure_handler(ccd, filter_name, snr, magnitude, sky_brightness, zenith_distance, fwhm):
+    profile = PROFILES.get("GSO", ccd, filter_name)
+    expected = main2_24_march.exposure_result(profile, snr, magnitude, sky_brightness, zenith_distance, fwhm)
+    result = etc_engine.evaluate(profile, magnitude, sky_brightness, zenith_distance, fwhm, snr_target=snr)
+    assert result["exposure_time"] == pytest.approx(expected["exposure_time"], rel=1e-9)
+    assert result["snr"] == pytest.approx(expected["snr"], rel=1e-9)
+
+
+def test_engine_vectorized_matches_scalar():
+    profile = PROFILES.get("GSO", "ZWO ASI 178MM", "V")
+    magnitude = np.array([12.0, 15.0, 18.0])
+    fwhm = np.array([1.5, 2.0, 3.0])
+    result = etc_engine.evaluate(profile, magnitude, 20.5, 30.0, fwhm, exposure_time=60.0)
+    for i in range(3):
+        single = etc_engine.evaluate(profile, magnitude[i], 20.5, 30.0, fwhm[i], exposure_time=60.0)
+        assert result["snr"][i] == pytest.approx(float(single["snr"]))
+    # SNR dari exposure time hasil mode exposure kembali ke SNR target
+    solved = etc_engine.evaluate(profile, magnitude, 20.5, 30.0, fwhm, snr_target=50.0)
+    assert np.allclose(
+        etc_engine.evaluate(profile, magnitude, 20.5, 30.0, fwhm, exposure_time=solved["exposure_time"])["snr"], 50.0
+    )
+
+
+@pytest.mark.parametrize("ccd, filter_name, snr, magnitude, sky_brightness, zenith_distance, fwhm", CASES)
+def test_solver_matches_old_loop(ccd, filter_name, snr, magnitude, sky_brightness, zenith_distance, fwhm):
+    profile = PROFILES.get("GSO", ccd, filter_name)
+    signals = etc_engine.evaluate(profile, magnitude, sky_brightness, zenith_distance, fwhm, snr_target=snr)
+    args = (
+        float(signals["signal_star"]), float(signals["signal_sky"]), profile.read_noise, profile.dark_current,
+        float(signals["num_pixels"]),
+    )
+    # Loop lama membulatkan ke atas per 1 detik, solver memberi waktu tepat di bawahnya
+    old = old_exposure_loop(*args, snr)
+    solved = main2_24_march.calculate_exposure_time(*args, snr)
+    assert old - 1 - etc_solver.TOLERANCE < solved <= old
+
+    old_snr, old_time = old_legacy_loop(*args, snr)
+    solution = etc_solver.solve_exposure_time(*args, snr, noise_model="legacy")
+    assert old_time - 1 - etc_solver.TOLERANCE < float(solution["exposure_time"]) <= old_time
+    assert float(solution["snr"]) == pytest.approx(snr, abs=1e-3)
+    assert solution["iterations"] < etc_solver.MAX_ITERATIONS
+
+
+def test_solver_unreachable_target():
+    args = (1e-3, 100.0, 10.0, 1.0, 50.0)
+    with pytest.raises(ValueError):
+        main2_24_march.calculate_exposure_time(*args, 100.0)
+    solution = etc_solver.solve_exposure_time(*args, 100.0, noise_model="legacy")
+    assert not solution["reachable"] and float(solution["exposure_time"]) == etc_solver.MAX_EXPOSURE_TIME
+
+
+def test_legacy_logic_sky_uses_zeropoint():
+    # Zeropoint, magnitude dan sky brightness digeser sama: signal bintang dan langit tidak berubah
+    # aperture_area, pixel_scale, read_noise, dark_current, snr_target, ekstingsi, airmass, QE
+    args = (0.05, 0.6, 3.0, 0.01, 100.0, 0.2, 1.3, 0.8)
+    base = main2_24_march.calculate_snr_and_exposure_logic(15.0, 22.0, 20.5, *args)
+    shifted = main2_24_march.calculate_snr_and_exposure_logic(16.0, 23.0, 21.5, *args)
+    assert shifted == pytest.approx(base)
@@ -0,0 +1,36 @@
+import os
+import tempfile
+
+os.environ.setdefault("ETC_STORE", os.path.join(tempfile.mkdtemp(), "etc_store.sqlite3"))
+os.environ.setdefault("ETC_SKY_HISTORY", os.path.join(tempfile.mkdtemp(), "sky_history.jsonl"))
+
+from fastapi.testclient import TestClient
+
+import etc_live
+import main2_24_march
+
+# Snapshot seperti yang dikirim halaman: semua field form termasuk radio calc-type ("on")
+BROWSER_SNAPSHOT = {
+    "mode": "exposure", "calc-type": "on", "telescope": "GSO", "ccd": "ZWO ASI 178MM", "filter": "V",
+    "snr": "100", "exposure_time": "", "magnitude": "15", "sky_brightness": "20.5", "zenith_distance": "30",
+    "fwhm": "2", "seq": 1,
+}
+
+
+def test_parse_update_ignores_unknown_fields():
+    update = etc_live.parse_update(BROWSER_SNAPSHOT)
+    assert "calc-type" not in update and "seq" not in update
+    assert update["telescope"] == "GSO" and update["magnitude"] == 15.0 and update["exposure_time"] is None
+
+
+def test_browser_snapshot_then_single_field_edit():
+    with TestClient(main2_24_march.app) as client, client.websocket_connect("/ws/live") as websocket:
+        websocket.send_json(BROWSER_SNAPSHOT)
+        reply = websocket.receive_json()
+        assert "error" not in reply
+        assert reply["seq"] == 1 and reply["changed"]["exposure_time"] > 0
+
+        websocket.send_json({"magnitude": "16", "seq": 2})
+        reply = websocket.receive_json()
+        assert "error" not in reply
+        assert reply["seq"] == 2 and "exposure_time" in reply["changed"]
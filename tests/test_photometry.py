@@ -0,0 +1,106 @@
+import math
+import os
+
+import numpy as np
+import pytest
+
+import calibration
+import fits_photometry
+import instrument_profiles
+import iraf_phot
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE = os.path.join(ROOT, "phot_output.txt")
+
+
+def phot_bytes(n_stars, apertures=(3.0,)):
+    # Header phot_output.txt dengan n_stars record sintetis (grup terakhir diulang per aperture)
+    with open(SAMPLE, "rb") as f:
+        lines = f.read().splitlines()
+    header = [line for line in lines if line.startswith(b"#")]
+    record = [line.split() for line in lines if line.strip() and not line.startswith(b"#")]
+    body = []
+    for star in range(1, n_stars + 1):
+        first = list(record[0])
+        first[3] = str(star).encode()
+        body.extend(b" ".join(tokens) for tokens in [first] + record[1:4])
+        for index, radius in enumerate(apertures):
+            tokens = list(record[4])
+            tokens[0], tokens[3] = f"{radius:.2f}".encode(), f"{1000.0 * star * radius:.1f}".encode()
+            body.append(b" ".join(tokens + ([b"\\"] if index < len(apertures) - 1 else [])))
+    return b"\n".join(header + body) + b"\n"
+
+
+def test_read_sample_phot():
+    metadata, records = iraf_phot.read_phot(SAMPLE)
+    keywords = metadata["keywords"]
+    assert keywords["ZMAG"] == 25.0 and keywords["FWHMPSF"] == 2.5
+    assert keywords["EMISSION"] is True and keywords["DATAMIN"] is None and keywords["EXPOSURE"] == ""
+    assert metadata["units"]["EPADU"] == "e-/adu"
+
+    (star,) = records
+    assert star["ID"] == 1 and star["FLUX"] == pytest.approx(249789.3) and star["MAG"] == pytest.approx(11.506)
+    assert math.isnan(star["XAIRMASS"]) and star["CIER"] == 107 and star["CERROR"] == "BigShift"
+    # BigShift hanya warning centering: ditolak mask default, diterima jika hanya PIER yang dicek
+    assert not iraf_phot.good_mask(records).any()
+    assert iraf_phot.good_mask(records, flags=("PIER",)).all()
+
+
+def test_chunks_and_apertures():
+    source = phot_bytes(5, apertures=(3.0, 5.0))
+    chunks = list(iraf_phot.iter_chunks(source, chunk_size=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+
+    _, records = iraf_phot.read_phot(source)
+    assert records["ID"].tolist() == [1, 2, 3, 4, 5]
+    assert records["FLUX"].shape == (5, 2) and records["RAPERT"][0].tolist() == [3.0, 5.0]
+    assert records["FLUX"][:, 1].tolist() == [5000.0, 10000.0, 15000.0, 20000.0, 25000.0]
+    assert iraf_phot.good_mask(records, flags=("PIER",)).shape == (5, 2)
+
+
+def test_invalid_phot():
+    source = phot_bytes(2)
+    with pytest.raises(ValueError, match="terpotong"):
+        iraf_phot.read_phot(source.rstrip(b"\n").rsplit(b"\n", 1)[0] + b"\n")
+    with pytest.raises(ValueError, match="sebelum header"):
+        iraf_phot.read_phot(b"aur_kw_008.fit 920.0 733.0 1\n")
+
+
+def test_measurements_from_phot():
+    # ITIME ada di record, XAIRMASS INDEF diganti argumen; bintang tanpa katalog dilewati
+    measurements = calibration.measurements_from_phot(
+        phot_bytes(3), {1: 12.0, 3: 13.0}, "GSO", "QHY 174 GPS", "V", airmass=1.2
+    )
+    assert measurements["catalog_mag"].tolist() == [12.0, 13.0]
+    assert measurements["flux"].tolist() == [3000.0, 9000.0]
+    assert measurements["airmass"].tolist() == [1.2, 1.2] and measurements["exposure_time"].tolist() == [1.0, 1.0]
+
+
+def write_fits(path, data, **cards):
+    cards = {"SIMPLE": "T", "BITPIX": -32, "NAXIS": 2, "NAXIS1": data.shape[1], "NAXIS2": data.shape[0], **cards}
+    header = "".join(f"{name:<8}= {value:>20}".ljust(80) for name, value in cards.items()) + "END".ljust(80)
+    header += " " * (-len(header) % fits_photometry.BLOCK_SIZE)
+    body = data.astype(">f4").tobytes()
+    body += b"\0" * (-len(body) % fits_photometry.BLOCK_SIZE)
+    with open(path, "wb") as f:
+        f.write(header.encode() + body)
+
+
+def test_saturation_limit(tmp_path):
+    # QHY 174 GPS: 12 bit, jadi batas profil (saturation_level / gain) dipotong di 4095 ADU
+    profile = instrument_profiles.ProfileRegistry(os.path.join(ROOT, "instruments.json")).get("GSO", "QHY 174 GPS", "V")
+    assert profile.saturation_level / profile.gain > 2 ** profile.adc_bits - 1
+    y, x = np.mgrid[:64, :64]
+    data = 100.0 + 5000.0 * np.exp(-((x - 31.0) ** 2 + (y - 31.0) ** 2) / 4.0)
+    coordinates = {"x": [32.0], "y": [32.0]}
+
+    def saturated(profile=None):
+        return bool(fits_photometry.measure_frame(path, coordinates, profile)["stars"]["flags"][0]
+                    & fits_photometry.FLAG_SATURATED)
+
+    path = str(tmp_path / "frame.fits")
+    write_fits(path, data, EXPTIME=10.0)
+    assert saturated(profile) and not saturated()
+    # SATURATE di header lebih diutamakan daripada batas profil
+    write_fits(path, data, EXPTIME=10.0, SATURATE=60000.0)
+    assert not saturated(profile)
@@ -0,0 +1,186 @@
+from functools import lru_cache
+
+import numpy as np
+
+import etc_engine
+
+# Model throughput spektral: transmisi filter x kurva QE CCD x transmisi atmosfer x SED sumber,
+# diintegrasikan pada grid panjang gelombang. Magnitude sumber dianggap magnitude AB di band
+# filter (normalisasi dengan transmisi filter saja), sehingga warna sumber hanya mengubah
+# seberapa banyak fotonnya jatuh di bagian band dengan QE/atmosfer tinggi atau rendah.
+# Integral dihitung sekali per (CCD, filter) untuk seluruh grid temperatur blackbody,
+# setelah itu request hanya melakukan interpolasi tabel (vektor).
+#
+# Zeropoint di config adalah hasil kalibrasi untuk bintang acuan (REFERENCE_TEMPERATURE);
+# efek warna masuk sebagai offset magnitude (color_offset), jadi sky dan engine tidak berubah.
+
+WAVELENGTH = np.arange(300.0, 1101.0, 1.0)  # nm
+TEMPERATURE_GRID = np.geomspace(2000.0, 50000.0, 161)  # K
+REFERENCE_TEMPERATURE = 9600.0  # K, bintang A0V (sistem Vega) untuk zeropoint config
+
+AB_FLUX = 3631e-26  # W/m²/Hz
+PLANCK = 6.62607015e-34  # J s
+HC_OVER_K = 1.438777e7  # hc/k dalam nm K
+
+# Pusat dan FWHM band (nm): Bessell (1990) untuk UBVRI, Fcent LCO / SDSS untuk ugriZY.
+# None berarti tanpa filter (Clear), band dibatasi kurva QE.
+BANDPASSES = {
+    "U": (366.0, 65.0), "B": (436.0, 89.0), "V": (545.0, 84.0), "R": (641.0, 158.0), "I": (798.0, 154.0),
+    "u": (354.0, 57.0), "g": (476.0, 137.0), "r": (623.0, 137.0), "i": (760.0, 153.0),
+    "Z": (853.0, 95.0), "Y": (975.0, 60.0),
+    "Clear": None,
+}
+FILTER_PEAK_TRANSMISSION = 0.9
+FILTER_EDGE_ORDER = 4  # tepi band: 1 / (1 + x^(2n)), FWHM tepat sama dengan lebar band
+
+# Kurva QE relatif (dikali quantum_efficiency puncak dari config) per CCD, (nm, QE relatif),
+# dibaca dari kurva QE pabrikan sensornya; kunci = nama CCD di instruments.json.
+# CCD tanpa kurva sendiri (mis. instrumen LCO) memakai "default" (CMOS/CCD back-illuminated umum).
+QE_CURVES = {
+    "default": (
+        (300, 0.25), (350, 0.45), (400, 0.70), (450, 0.88), (500, 0.97), (550, 1.00), (600, 0.97),
+        (650, 0.90), (700, 0.80), (800, 0.55), (900, 0.30), (1000, 0.10), (1100, 0.00),
+    ),
+    # Sony IMX178 (back-illuminated), puncak ~520 nm
+    "ZWO ASI 178MM": (
+        (300, 0.05), (350, 0.35), (400, 0.70), (450, 0.90), (500, 0.98), (525, 1.00), (550, 0.98),
+        (600, 0.88), (650, 0.75), (700, 0.62), (750, 0.50), (800, 0.38), (850, 0.27), (900, 0.18),
+        (950, 0.10), (1000, 0.05), (1100, 0.00),
+    ),
+    # Sony IMX571 (back-illuminated), respons biru dan NIR lebar, puncak ~520 nm
+    "ZWO ASI 2600 MM Pro": (
+        (300, 0.10), (350, 0.55), (400, 0.82), (450, 0.95), (500, 1.00), (550, 0.99), (600, 0.93),
+        (650, 0.84), (700, 0.74), (750, 0.62), (800, 0.50), (850, 0.38), (900, 0.26), (950, 0.15),
+        (1000, 0.07), (1100, 0.00),
+    ),
+    # Sony IMX174 (front-illuminated), puncak ~500 nm, turun cepat ke merah
+    "QHY 174 GPS": (
+        (300, 0.00), (350, 0.20), (400, 0.62), (450, 0.90), (500, 1.00), (550, 0.96), (600, 0.85),
+        (650, 0.70), (700, 0.55), (750, 0.42), (800, 0.30), (850, 0.20), (900, 0.12), (950, 0.06),
+        (1000, 0.02), (1100, 0.00),
+    ),
+    # Kodak/ON Semi KAF-8300 (front-illuminated, microlens), puncak ~540 nm, biru lemah
+    "ATIK 383L+": (
+        (300, 0.00), (350, 0.20), (400, 0.45), (450, 0.70), (500, 0.88), (540, 1.00), (600, 0.95),
+        (650, 0.85), (700, 0.70), (750, 0.52), (800, 0.38), (850, 0.27), (900, 0.17), (950, 0.09),
+        (1000, 0.04), (1100, 0.00),
+    ),
+}
+
+# Ekstingsi atmosfer (mag/airmass) = Rayleigh + aerosol, lambda dalam mikron
+RAYLEIGH = 0.0095
+RAYLEIGH_EXPONENT = 4.05
+AEROSOL = 0.05
+AEROSOL_EXPONENT = 1.3
+
+
+def filter_transmission(filter_name):
+    band = BANDPASSES[filter_name]
+    if band is None:
+        return np.ones_like(WAVELENGTH)
+    center, width = band
+    x = (WAVELENGTH - center) / (width / 2)
+    return FILTER_PEAK_TRANSMISSION / (1 + x ** (2 * FILTER_EDGE_ORDER))
+
+
+def qe_curve(ccd):
+    wavelength, qe = zip(*QE_CURVES.get(ccd, QE_CURVES["default"]))
+    return np.interp(WAVELENGTH, wavelength, qe)
+
+
+def atmospheric_extinction():
+    microns = WAVELENGTH / 1000
+    return RAYLEIGH * microns ** -RAYLEIGH_EXPONENT + AEROSOL * microns ** -AEROSOL_EXPONENT
+
+
+def blackbody(temperature):
+    """
+    Bentuk SED blackbody dalam f_nu (tanpa normalisasi), baris per temperatur
+    """
+    temperature = np.asarray(temperature, dtype=float)[..., None]
+    return WAVELENGTH ** -3 / np.expm1(HC_OVER_K / (WAVELENGTH * temperature))
+
+
+@lru_cache(maxsize=64)
+def sed_table(ccd, filter_name):
+    """
+    Tabel per temperatur TEMPERATURE_GRID untuk satu CCD dan filter:
+    zeropoint (foton/s/m² per QE puncak untuk magnitude 0, di atas atmosfer, dalam magnitude),
+    extinction (koefisien efektif mag/airmass untuk warna tersebut) dan efficiency (QE relatif rata-rata).
+    """
+    # Integral terhadap dnu/nu = dlambda/lambda; sumber dinormalisasi lewat transmisi filter saja
+    weight = filter_transmission(filter_name) / WAVELENGTH
+    qe = qe_curve(ccd)
+    atmosphere = 10 ** (-0.4 * atmospheric_extinction())
+    sed = blackbody(TEMPERATURE_GRID)
+    in_band = sed @ weight
+    above = sed @ (weight * qe) / in_band
+    through_airmass = sed @ (weight * qe * atmosphere) / in_band
+
+    band_rate = AB_FLUX / PLANCK * np.sum(weight) * (WAVELENGTH[1] - WAVELENGTH[0])
+    table = {
+        "zeropoint": 2.5 * np.log10(band_rate * above),
+        "extinction": -2.5 * np.log10(through_airmass / above),
+        "efficiency": above,
+    }
+    for values in table.values():
+        values.setflags(write=False)
+    return table
+
+
+def validate(filter_name, temperature):
+    """
+    ValueError jika filter tidak punya kurva transmisi atau temperatur di luar grid tabel
+    """
+    if filter_name not in BANDPASSES:
+        raise ValueError(f"Filter {filter_name} tidak punya kurva transmisi, pilih dari {', '.join(BANDPASSES)}")
+    temperature = np.asarray(temperature, dtype=float)
+    if not np.all((temperature >= TEMPERATURE_GRID[0]) & (temperature <= TEMPERATURE_GRID[-1])):
+        raise ValueError(f"Temperatur harus di antara {TEMPERATURE_GRID[0]:g} dan {TEMPERATURE_GRID[-1]:g} K")
+
+
+def lookup(profile, temperature):
+    """
+    Nilai tabel untuk array temperatur (interpolasi di log T), tanpa integrasi ulang
+    """
+    validate(profile.filter, temperature)
+    temperature = np.asarray(temperature, dtype=float)
+    table = sed_table(profile.ccd, profile.filter)
+    log_grid, log_temperature = np.log(TEMPERATURE_GRID), np.log(temperature)
+    return {name: np.interp(log_temperature, log_grid, values) for name, values in table.items()}
+
+
+def color_offset(profile, temperature, zenith_distance):
+    """
+    Offset magnitude (ditambahkan ke magnitude input) untuk sumber bertemperatur tertentu
+    relatif terhadap bintang acuan: beda zeropoint efektif dan beda ekstingsi efektif x airmass
+    """
+    values = lookup(profile, temperature)
+    reference = lookup(profile, REFERENCE_TEMPERATURE)
+    airmass = etc_engine.airmass_from_zenith(zenith_distance)
+    return (
+        reference["zeropoint"] - values["zeropoint"]
+        + (values["extinction"] - reference["extinction"]) * airmass
+    )
+
+
+def describe(profile, temperature, zenith_distance=0.0):
+    """
+    Ringkasan throughput untuk satu sumber: laju foton/elektron dari model spektral
+    dibandingkan dengan zeropoint config
+    """
+    values = lookup(profile, temperature)
+    airmass = etc_engine.airmass_from_zenith(zenith_distance)
+    electrons = etc_engine.calculate_signal(
+        0.0, values["zeropoint"], values["extinction"] * airmass, profile.aperture_area, profile.quantum_efficiency
+    )
+    return {
+        "temperature": float(temperature),
+        "zeropoint": float(values["zeropoint"]),
+        "config_zeropoint": profile.zeropoint,
+        "extinction": float(values["extinction"]),
+        "config_extinction": profile.extinction_coefficient,
+        "efficiency": float(values["efficiency"]) * profile.quantum_efficiency,
+        "electron_rate_mag0": float(electrons),
+        "color_offset": float(color_offset(profile, temperature, zenith_distance)),
+    }